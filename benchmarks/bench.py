@@ -0,0 +1,394 @@
+"""
+Benchmarks of rendering hot paths. Only standard library is used.
+
+    python benchmarks/bench.py                        # run all workloads
+    python benchmarks/bench.py log gradient           # run workloads whose name contains `log` or `gradient`
+    python benchmarks/bench.py --save baseline.json   # save results
+    python benchmarks/bench.py --compare baseline.json
+
+Each workload builds `Iro` and paints it, as applications do. Reported values are
+ - ops/s: runs of the workload per second (best of repeats)
+ - nodes/s, ns/node: throughput and latency per node. nodes are texts, styles, lists and `Iro`s in the tree
+ - peak KiB: peak of memory allocated in one run, measured by `tracemalloc`
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+from colorsys import hls_to_rgb
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def count_nodes(values) -> int:
+    """
+    Number of texts, styles, lists and `Iro`s in `values`, including separators.
+    """
+    from iro import Iro
+
+    count = 0
+    stack = list(values)
+    while stack:
+        value = stack.pop()
+        count += 1
+        if isinstance(value, Iro):
+            stack.extend(value.values)
+            if isinstance(value.sep, Iro):
+                stack.append(value.sep)
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return count
+
+
+def flat(scale: int):
+    from iro import Iro, FGColor, Style
+
+    texts = ["text {} ".format(i) for i in range(1000 * scale)]
+
+    def build():
+        values = []
+        for i, text in enumerate(texts):
+            values.append(text)
+            if i % 10 == 0:
+                # built each run, so painted results cached in children are not reused
+                values.append(Iro(FGColor.RED, Style.BOLD, "styled"))
+        return values
+
+    def run():
+        return Iro(*build()).str
+
+    return run, count_nodes(build()) + 1
+
+
+def deep(scale: int):
+    from iro import Iro, FGColor, BGColor, Style
+
+    styles = [FGColor.RED, Style.UNDERLINE, BGColor.BLUE, Style.BOLD, FGColor.GREEN, Style.OFF_BOLD]
+    depth = 200 * scale
+
+    def run():
+        node = Iro("leaf")
+        for i in range(depth):
+            node = Iro(styles[i % len(styles)], "[{}]".format(i), node, "[/{}]".format(i))
+        return node.str
+
+    return run, 4 * depth + 1
+
+
+def sep(scale: int):
+    from iro import Iro, FGColor, Style
+
+    words = ["word{}".format(i) for i in range(1000 * scale)]
+
+    def run():
+        return Iro(Style.BOLD, *words, sep=Iro(FGColor.BLUE, ", ")).str
+
+    # separator is painted between each word
+    return run, 2 + len(words) + 2 * (len(words) - 1)
+
+
+def sequential(scale: int):
+    from iro import Iro, FGColor, Style
+
+    values = []
+    for i in range(500 * scale):
+        values.extend((FGColor.RED if i % 2 else FGColor.GREEN, "item {}".format(i), Style.UNDERLINE if i % 3 else
+                       Style.OFF_UNDERLINE))
+
+    def run():
+        return Iro(*values, collect_styles_first=False).str
+
+    return run, count_nodes(values) + 1
+
+
+def log(scale: int):
+    from iro import Iro, FGColor, Style
+
+    levels = [(FGColor.BLUE, "DEBUG"), (FGColor.GREEN, "INFO"), (FGColor.YELLOW, "WARNING"),
+              (FGColor.RED, "ERROR")]
+    lines = 10000 * scale
+
+    def run():
+        return "\n".join(Iro(Style.DIM, "2024-01-01 00:00:00 ", Iro(color, Style.BOLD, "[{}]".format(level)),
+                             " request {} done".format(i)).str
+                         for i, (color, level) in ((i, levels[i % len(levels)]) for i in range(lines)))
+
+    return run, 7 * lines
+
+
+def log_bytes(scale: int):
+    from iro import Iro, FGColor, Style
+
+    levels = [(FGColor.BLUE, "DEBUG"), (FGColor.GREEN, "INFO"), (FGColor.YELLOW, "WARNING"),
+              (FGColor.RED, "ERROR")]
+    lines = 10000 * scale
+    buffer = bytearray()
+
+    def run():
+        # encoded into a buffer reused over runs, as writers into sockets do
+        buffer.clear()
+        for i in range(lines):
+            color, level = levels[i % len(levels)]
+            Iro(Style.DIM, "2024-01-01 00:00:00 ", Iro(color, Style.BOLD, "[{}]".format(level)),
+                " request {} done\n".format(i)).paint_into(buffer)
+        return buffer
+
+    return run, 7 * lines
+
+
+def html(scale: int):
+    import io
+
+    from iro import Iro, FGColor, HtmlWriter, Style
+
+    levels = [(FGColor.BLUE, "DEBUG"), (FGColor.GREEN, "INFO"), (FGColor.YELLOW, "WARNING"),
+              (FGColor.RED, "ERROR")]
+    lines = [Iro(Style.DIM, "2024-01-01 00:00:00 ", Iro(color, Style.BOLD, "[{}]".format(level)),
+                 " request {} done\n".format(i)) for i, (color, level) in
+             ((i, levels[i % len(levels)]) for i in range(10000 * scale))]
+
+    def run():
+        fp = io.StringIO()
+        with HtmlWriter(fp) as writer:
+            for line in lines:
+                writer.write(line)
+        return fp
+
+    return run, 7 * len(lines)
+
+
+def table(scale: int):
+    from iro import Iro, FGColor, Style
+
+    rows = [(str(i), "user{}".format(i % 7), "{:.1f}".format(i % 100 / 3), "running" if i % 3 else "sleeping")
+            for i in range(10000 * scale)]
+    column_styles = [[FGColor.CYAN], [Style.DIM], [FGColor.YELLOW], [Style.BOLD]]
+
+    def run():
+        return Iro.paint_many(rows, sep=" ", column_styles=column_styles)
+
+    # each cell is a list of style and text
+    return run, len(rows) * (1 + 3 * len(column_styles))
+
+
+def layout(scale: int):
+    from iro import Iro, FGColor, Style, StyledText
+
+    rows = [Iro([FGColor.CYAN, str(i)], " ", [Style.DIM, "user{}".format(i % 7)], " ",
+                [Style.BOLD, "command --with arguments {}".format(i)]) for i in range(2000 * scale)]
+
+    def run():
+        return [StyledText.from_iro(row).truncate(30).ljust(30).paint() for row in rows]
+
+    # each row is 3 lists of style and text, 2 texts and `Iro`
+    return run, 10 * len(rows)
+
+
+def builder(scale: int):
+    from iro import FGColor, IroBuilder
+
+    parts = [(FGColor.RED if i % 3 else FGColor.BLUE, "piece {} ".format(i)) for i in range(1000 * scale)]
+
+    def run():
+        output = IroBuilder(collect_styles_first=False)
+        for style, text in parts:
+            output = output + style + text
+        return output.str
+
+    # builder made for each addition, a style and a text for each part
+    return run, 3 * len(parts) + 1
+
+
+def gradient(scale: int):
+    from iro import Iro, ColorRGB
+
+    length = 1000 * scale
+    colors = [tuple(round(c * 255) for c in hls_to_rgb(i / length, 0.6, 1)) for i in range(length)]
+
+    def run():
+        return Iro(*([ColorRGB(*color), "#"] for color in colors), disable_rgb=False).str
+
+    return run, 3 * length + 1
+
+
+def gradient_api(scale: int):
+    from iro import gradient as paint_gradient
+
+    text = "#" * (1000 * scale)
+    stops = [tuple(round(c * 255) for c in hls_to_rgb(h / 6, 0.6, 1)) for h in range(7)]
+
+    def run():
+        return paint_gradient(text, *stops).str
+
+    # same output as `gradient`, with a color and a text for each run of the same color
+    return run, 3 * len(text) + 1
+
+
+def heatmap(scale: int):
+    from iro import Profile, colormap
+
+    grid = [[(x * y) % 17 for x in range(100)] for y in range(50 * scale)]
+
+    def run():
+        return colormap(grid, "#0000ff", "#ffffff", "#ff0000", profile=Profile.COLOR256).paint(
+            profile=Profile.COLOR256)
+
+    return run, 3 * 100 * len(grid) + 1
+
+
+def rgb_to_256(scale: int):
+    from iro import ColorRGB
+
+    # more colors than the conversion cache holds
+    colors = [ColorRGB(r, g, b) for r in range(0, 256, 8) for g in range(0, 256, 8) for b in range(0, 256, 8)] * scale
+
+    def run():
+        for color in colors:
+            color.to_close_c256()
+
+    return run, len(colors)
+
+
+def rgb_to_256_bulk(scale: int):
+    from iro import ColorRGB
+
+    packed = bytes(c for r in range(0, 256, 8) for g in range(0, 256, 8) for b in range(0, 256, 8)
+                   for c in (r, g, b)) * scale
+
+    def run():
+        return ColorRGB.close_c256_indices(packed)
+
+    return run, len(packed) // 3
+
+
+def diff_sequence(scale: int):
+    from iro import FGColor, BGColor, Style
+    from iro.styles import StyleState
+
+    styles = [FGColor.RED, Style.BOLD, BGColor.BLUE, Style.UNDERLINE, FGColor.GREEN, Style.OFF_BOLD, Style.ITALIC,
+              Style.OFF_UNDERLINE, BGColor.YELLOW, Style.DIM]
+    states = [StyleState.EMPTY]
+    for i in range(100 * scale):
+        states.append(states[-1].copy_with(styles[i * 7 % len(styles)]))
+
+    def run():
+        StyleState.clear_diff_cache()
+        for before in states[::4]:
+            for after in states[::4]:
+                before.diff_sequence(after)
+
+    return run, len(states[::4]) ** 2
+
+
+WORKLOADS = {
+    "flat": flat,
+    "deep": deep,
+    "sep": sep,
+    "sequential": sequential,
+    "log": log,
+    "log_bytes": log_bytes,
+    "html": html,
+    "table": table,
+    "layout": layout,
+    "builder": builder,
+    "gradient": gradient,
+    "gradient_api": gradient_api,
+    "heatmap": heatmap,
+    "rgb_to_256": rgb_to_256,
+    "rgb_to_256_bulk": rgb_to_256_bulk,
+    "diff_sequence": diff_sequence,
+}
+
+
+def measure(workload, scale: int, repeat: int) -> dict:
+    run, nodes = workload(scale)
+    run()  # warm up
+
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange() if repeat > 1 else (1, None)
+    best = min(timer.repeat(repeat, number)) / number
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "nodes": nodes,
+        "seconds": best,
+        "ops_per_sec": 1 / best,
+        "nodes_per_sec": nodes / best,
+        "ns_per_node": best / nodes * 1e9,
+        "peak_bytes": peak,
+    }
+
+
+def environment() -> dict:
+    import iro
+
+    return {
+        "iro": iro.__version__,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+    }
+
+
+def report(results: dict, baseline=None):
+    header = "{:<16} {:>10} {:>12} {:>9} {:>10}".format("workload", "ops/s", "nodes/s", "ns/node", "peak KiB")
+    if baseline is not None:
+        header += " {:>9}".format("vs base")
+    print(header)
+    for name, result in results.items():
+        line = "{:<16} {:>10.1f} {:>12.0f} {:>9.1f} {:>10.1f}".format(
+            name, result["ops_per_sec"], result["nodes_per_sec"], result["ns_per_node"],
+            result["peak_bytes"] / 1024)
+        if baseline is not None:
+            base = baseline["results"].get(name)
+            # > 1 is faster than baseline. per node, since scale may differ
+            line += " {:>8.2f}x".format(base["ns_per_node"] / result["ns_per_node"]) if base else " {:>9}".format("-")
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of iro rendering.")
+    parser.add_argument("workloads", nargs="*", help="run only workloads whose name contains any of these")
+    parser.add_argument("--repeat", type=int, default=5, help="number of repeats. the best is reported")
+    parser.add_argument("--scale", type=int, default=1, help="multiplier of workload sizes")
+    parser.add_argument("--quick", action="store_true", help="run each workload once, to check they work")
+    parser.add_argument("--save", metavar="PATH", help="save results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="compare results with JSON saved by --save")
+    parser.add_argument("--installed", action="store_true",
+                        help="benchmark installed iro instead of the one in this repository")
+    args = parser.parse_args(argv)
+
+    if not args.installed:
+        sys.path.insert(0, os.path.join(ROOT, "src"))
+    repeat = 1 if args.quick else args.repeat
+
+    names = [name for name in WORKLOADS if not args.workloads or any(w in name for w in args.workloads)]
+    if not names:
+        parser.error("no workload matches. choose from: {}".format(", ".join(WORKLOADS)))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {name: measure(WORKLOADS[name], args.scale, repeat) for name in names}
+    report(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"environment": environment(), "scale": args.scale, "results": results}, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
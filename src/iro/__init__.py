@@ -13,17 +13,14 @@
     :license: MIT.
 """
 
-import locale
+import importlib
 
 from .__about__ import __version__
-from .iro import Iro
-from .styles import FGColor, BGColor, ColorRGB, Color256, Font, IroElement, Style
-
-locale.setlocale(locale.LC_ALL, '')
 
 __all__ = [
     "__version__",
     "Iro",
+    "IroBuilder",
     "FGColor",
     "BGColor",
     "Style",
@@ -31,4 +28,67 @@ __all__ = [
     "Color256",
     "Font",
     "IroElement",
+    "Placeholder",
+    "Template",
+    "Profile",
+    "detect_profile",
+    "RenderStats",
+    "enable_stats",
+    "disable_stats",
+    "stats_enabled",
+    "IroFormatter",
+    "IroQueueHandler",
+    "Live",
+    "parse_ansi",
+    "StyledText",
+    "display_width",
+    "gradient",
+    "colormap",
+    "HtmlWriter",
+    "to_html",
 ]
+
+# submodules are imported on first access, to keep `import iro` cheap for short-lived scripts.
+# for the same reason, submodules import `typing` only under `TYPE_CHECKING`, which is `True` only for type checkers
+_LAZY_ATTRIBUTES = {
+    "Iro": ".iro",
+    "IroBuilder": ".builder",
+    "FGColor": ".styles",
+    "BGColor": ".styles",
+    "Style": ".styles",
+    "ColorRGB": ".styles",
+    "Color256": ".styles",
+    "Font": ".styles",
+    "IroElement": ".styles",
+    "Placeholder": ".template",
+    "Template": ".template",
+    "Profile": ".profile",
+    "detect_profile": ".profile",
+    "RenderStats": ".stats",
+    "enable_stats": ".stats",
+    "disable_stats": ".stats",
+    "stats_enabled": ".stats",
+    "IroFormatter": ".log",
+    "IroQueueHandler": ".log",
+    "Live": ".live",
+    "parse_ansi": ".ansi",
+    "StyledText": ".layout",
+    "display_width": ".layout",
+    "gradient": ".gradient",
+    "colormap": ".gradient",
+    "HtmlWriter": ".html",
+    "to_html": ".html",
+}
+
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError("module {} has no attribute {}".format(repr(__name__), repr(name)))
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+from functools import lru_cache
+
+from .styles import BGColor, Color256, ColorRGB, FGColor, Font, Style, StyleState
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, List, Tuple, Union
+
+# styles applied by each parameter, following the sequences `Iro` paints
+_SGR_STYLES: Dict[int, Tuple[Style, ...]] = {
+    0: (Style.RESET,),
+    1: (Style.BOLD,),
+    2: (Style.DIM,),
+    3: (Style.ITALIC,),
+    4: (Style.UNDERLINE,),
+    5: (Style.SLOW_BLINK,),
+    6: (Style.RAPID_BLINK,),
+    7: (Style.INVERT,),
+    8: (Style.HIDE,),
+    9: (Style.STRIKE,),
+    21: (Style.DOUBLY_UNDERLINE,),
+    22: (Style.OFF_INTENSITY,),
+    23: (Style.OFF_ITALIC,),
+    24: (Style.OFF_UNDERLINE, Style.OFF_DOUBLY_UNDERLINE),
+    25: (Style.OFF_BLINK,),
+    27: (Style.OFF_INVERT,),
+    28: (Style.OFF_HIDE,),
+    29: (Style.OFF_STRIKE,),
+    39: (Style.OFF_FG_COLOR,),
+    49: (Style.OFF_BG_COLOR,),
+    53: (Style.OVERLINE,),
+    55: (Style.OFF_OVERLINE,),
+}
+_SGR_STYLES.update({color.value: (color,) for color in FGColor})
+_SGR_STYLES.update({color.value: (color,) for color in BGColor})
+# fonts from `Font(0)` (`10`) to `Font(10)` (`20`). `Style.GOTHIC` is painted as `20` too, and parsed as `Font(10)`
+_SGR_STYLES.update({10 + i: (Style.OFF_GOTHIC, Font(i)) for i in range(11)})
+
+# longest SGR sequence searched at once, such as `\033[38;2;255;255;255m`
+_MAX_SGR_LENGTH = 64
+
+
+def _color(parameters: Tuple[int, ...]) -> Union[Color256, ColorRGB]:
+    # colors are interned, so equal colors parsed twice are the same object and so are their states
+    if parameters[1] == 5:
+        return Color256(parameters[2], parameters[0] == 48)
+    return ColorRGB(*parameters[2:5], parameters[0] == 48)
+
+
+@lru_cache(maxsize=4096)
+def _apply_sgr(state: StyleState, parameters: str) -> StyleState:
+    """
+    Get the state after the SGR sequence of given parameters, like `1;31` of `\\033[1;31m`.
+    Unknown parameters, and sequences with sub parameters or private parameters are ignored.
+    """
+    if not parameters:
+        return StyleState.EMPTY
+    if not parameters.replace(';', '').isdigit():
+        return state
+    values = [int(value) if value else 0 for value in parameters.split(';')]
+    i = 0
+    while i < len(values):
+        value = values[i]
+        if value in (38, 48) and i + 1 < len(values):
+            length = 3 if values[i + 1] == 5 else 5 if values[i + 1] == 2 else 0
+            if length and i + length <= len(values) and all(0 <= v <= 255 for v in values[i + 2:i + length]):
+                state = state.copy_with(_color(tuple(values[i:i + length])))
+            i += length or 2
+            continue
+        for style in _SGR_STYLES.get(value, ()):
+            state = state.copy_with(style)
+        i += 1
+    return state
+
+
+def _parse(text: str, state: StyleState) -> Tuple[List[Tuple[str, StyleState]], StyleState]:
+    """
+    Split `text` into texts and their styles in one pass over the pieces split at `\\033`.
+    Adjacent texts of the same styles are joined, and escape sequences other than SGR are removed.
+    :return: texts with styles, and the styles at the end of `text`
+    """
+    runs = []
+    # texts not added to `runs` yet, and their styles
+    texts = []
+    texts_state = state
+    pieces = text.split('\033')
+    if pieces[0]:
+        texts.append(pieces[0])
+    in_osc = False
+    for piece in pieces[1:]:
+        # each piece starts with an escape sequence
+        kind = piece[:1]
+        if in_osc and kind == '\\':  # ST terminating OSC
+            start = 1
+        elif kind == '[':  # CSI: parameter bytes, intermediate bytes and final byte
+            end = piece.find('m', 1, _MAX_SGR_LENGTH)
+            parameters = piece[1:end] if end >= 0 else None
+            if parameters is not None and (not parameters or parameters.replace(';', '').isdigit()):
+                state = _apply_sgr(state, parameters)
+            else:  # other than SGR `Iro` paints
+                end = 1
+                length = len(piece)
+                while end < length and '0' <= piece[end] <= '?':
+                    end += 1
+                while end < length and ' ' <= piece[end] <= '/':
+                    end += 1
+                if end < length and piece[end] == 'm':
+                    state = _apply_sgr(state, piece[1:end])
+            start = end + 1
+        elif kind == ']':  # OSC, such as hyperlinks. terminated by BEL or ST
+            bell = piece.find('\a')
+            start = bell + 1 if bell >= 0 else len(piece)
+        else:  # other escape sequences: intermediate bytes and final byte
+            start = 0
+            while start < len(piece) and ' ' <= piece[start] <= '/':
+                start += 1
+            start += 1
+        in_osc = kind == ']' and start == len(piece)
+
+        if start < len(piece):
+            if state is not texts_state and state != texts_state:
+                if texts:
+                    runs.append((''.join(texts), texts_state))
+                    texts = []
+                texts_state = state
+            texts.append(piece[start:] if start else piece)
+
+    if texts:
+        runs.append((''.join(texts), texts_state))
+    return runs, state
+
+
+def parse_ansi(text: str, state: StyleState = StyleState.EMPTY) -> List[Tuple[str, StyleState]]:
+    """
+    Split text with escape sequences, such as painted by `Iro` or the output of other programs, into texts and
+    the styles they are shown with. Escape sequences other than SGR are removed.
+    :param text: text with escape sequences
+    :param state: styles at the start of `text`
+    :return: list of text and its styles. adjacent texts of the same styles are joined
+    """
+    return _parse(text, state)[0]
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import io
+from itertools import islice
+
+from .iro import Iro
+from .profile import Profile
+from .styles import IroElement
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import IO, Any, Iterable, Iterator, List, Union
+
+    from .styles import StyleState
+
+    Part = Union["_Rope", "_Slice"]
+
+
+class _Slice:
+    """
+    First `stop` values of `values`. Lists are shared by builders which only append to them,
+    so the values before `stop` never change.
+    """
+    __slots__ = ('values', 'stop')
+
+    def __init__(self, values: List, stop: int):
+        self.values = values
+        self.stop = stop
+
+    def __iter__(self) -> Iterator:
+        return islice(self.values, self.stop)
+
+    def __len__(self) -> int:
+        return self.stop
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        if index < 0:
+            index += self.stop
+        if not 0 <= index < self.stop:
+            raise IndexError('index out of range')
+        return self.values[index]
+
+    def __repr__(self):
+        return repr(tuple(self))
+
+
+class _Rope:
+    """
+    Immutable concatenation of two parts, shared with other ropes instead of being copied.
+    Iterated without flattening and without recursion, so it is used as the values of `Iro` as it is.
+    """
+    __slots__ = ('left', 'right', 'length')
+
+    def __init__(self, left: Part, right: Part):
+        self.left = left
+        self.right = right
+        self.length = len(left) + len(right)
+
+    def __iter__(self) -> Iterator:
+        stack: List[Part] = [self]
+        while stack:
+            part = stack.pop()
+            if isinstance(part, _Rope):
+                stack.append(part.right)
+                stack.append(part.left)
+            else:
+                yield from islice(part.values, part.stop)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('index out of range')
+        part = self
+        while isinstance(part, _Rope):
+            if index < len(part.left):
+                part = part.left
+            else:
+                index -= len(part.left)
+                part = part.right
+        return part.values[index]
+
+    def __repr__(self):
+        return repr(tuple(self))
+
+
+def _concat(left: Union[Part, None], right: Union[Part, None]) -> Union[Part, None]:
+    if not left:
+        return right or None
+    if not right:
+        return left
+    return _Rope(left, right)
+
+
+def _shared_values(value: Union[str, Iro, IroElement, "IroBuilder"]) -> Union[Part, None]:
+    """
+    Values of `Iro` and `IroBuilder`, or `value` itself otherwise, as a part shared without copying if possible.
+    """
+    if isinstance(value, IroBuilder):
+        return value._parts()
+    if isinstance(value, Iro):
+        values = value._values
+        if isinstance(values, (_Rope, _Slice)):
+            return values
+        return _Slice(list(values), len(values)) if values else None
+    return _Slice([value], 1)
+
+
+def _add(left: Union[str, Iro, "IroBuilder"], right: Union[str, Iro, "IroBuilder"], disable_rgb: bool) -> Iro:
+    """
+    Get `Iro` of the values of both, for `Iro() + other`. Values of `Iro` made by `+` are shared, so chains of `+`
+    take constant time for each.
+    """
+    iro = Iro(disable_rgb=disable_rgb)
+    iro._values = _concat(_shared_values(left), _shared_values(right)) or ()
+    return iro
+
+
+class IroBuilder:
+    """
+    Values of `Iro` built piece by piece, such as a large output.
+    `append`, `extend` and `+` take amortized constant time. Values are shared between builders instead of being
+    copied, so `builder + value` leaves `builder` as it is, and both can be extended further.
+    Painted same as `Iro(*values, ...)` walking the shared parts, without flattening them.
+    """
+    __slots__ = ('_head', '_tail', '_stop', '_options', '_iro')
+
+    def __init__(self, *values: Any, disable_rgb: bool = True, sep: Union[str, Iro] = "",
+                 collect_styles_first: bool = True, coalesce: bool = False, minimize: bool = False):
+        """
+        :param values: first values
+        :param disable_rgb: same as `Iro`
+        :param sep: same as `Iro`
+        :param collect_styles_first: same as `Iro`
+        :param coalesce: same as `Iro`
+        :param minimize: same as `Iro`
+        """
+        # values before `_tail`, shared with other builders
+        self._head: Union[Part, None] = None
+        # the first `_stop` values of `_tail` belong to this builder. the rest belong to other builders sharing it
+        self._tail: List = list(values)
+        self._stop = len(self._tail)
+        self._options = dict(disable_rgb=disable_rgb, sep=sep, collect_styles_first=collect_styles_first,
+                             coalesce=coalesce, minimize=minimize)
+        self._iro: Union[Iro, None] = None
+
+    def _parts(self) -> Union[Part, None]:
+        return _concat(self._head, _Slice(self._tail, self._stop) if self._stop else None)
+
+    def _writable_tail(self) -> List:
+        if len(self._tail) != self._stop:
+            # other builders appended to the list. the values are kept shared, and a new list is started
+            self._head = self._parts()
+            self._tail = []
+            self._stop = 0
+        self._iro = None
+        return self._tail
+
+    def _copy(self) -> "IroBuilder":
+        builder = IroBuilder.__new__(IroBuilder)
+        builder._head = self._head
+        builder._tail = self._tail
+        builder._stop = self._stop
+        builder._options = self._options
+        builder._iro = self._iro
+        return builder
+
+    def append(self, value: Any) -> "IroBuilder":
+        """
+        Add `value` at the end.
+        :param value: value of `Iro`. `Iro` is kept as a child, without copying it
+        :return: this builder
+        """
+        self._writable_tail().append(value)
+        self._stop += 1
+        return self
+
+    def extend(self, values: Union[Iterable, "IroBuilder"]) -> "IroBuilder":
+        """
+        Add `values` at the end. Values of `IroBuilder` are shared without copying.
+        :param values: values of `Iro`, or `IroBuilder`
+        :return: this builder
+        """
+        if isinstance(values, IroBuilder):
+            parts = values._parts()
+            if parts:
+                self._head = _concat(self._parts(), parts)
+                self._tail = []
+                self._stop = 0
+                self._iro = None
+            return self
+        tail = self._writable_tail()
+        tail.extend(values)
+        self._stop = len(tail)
+        return self
+
+    def build(self) -> Iro:
+        """
+        Get `Iro` painting the values, sharing them with this builder without copying.
+        Values of the `Iro` can not be modified, but can be replaced by setting `values`.
+        Same `Iro` is returned until this builder is modified, so the painted result is cached.
+        """
+        if self._iro is None:
+            iro = Iro(**self._options)
+            iro._values = self._parts() or ()
+            self._iro = iro
+        return self._iro
+
+    def paint(self, given_style: Union[StyleState, None] = None, profile: Profile = Profile.TRUECOLOR) -> str:
+        """
+        Same as `Iro().paint` of the values.
+        """
+        return self.build().paint(given_style, profile=profile)
+
+    def iter_paint(self, given_style: Union[StyleState, None] = None,
+                   profile: Profile = Profile.TRUECOLOR) -> Iterator[str]:
+        """
+        Same as `Iro().iter_paint` of the values.
+        """
+        return self.build().iter_paint(given_style, profile=profile)
+
+    def write_to(self, fp: IO[str], buffer_size: int = io.DEFAULT_BUFFER_SIZE,
+                 given_style: Union[StyleState, None] = None, profile: Profile = Profile.TRUECOLOR) -> int:
+        """
+        Same as `Iro().write_to` of the values.
+        """
+        return self.build().write_to(fp, buffer_size, given_style, profile=profile)
+
+    def paint_into(self, buffer: Union[bytearray, memoryview], offset: Union[int, None] = None,
+                   given_style: Union[StyleState, None] = None, profile: Profile = Profile.TRUECOLOR,
+                   encoding: str = 'utf-8') -> int:
+        """
+        Same as `Iro().paint_into` of the values.
+        """
+        return self.build().paint_into(buffer, offset, given_style, profile, encoding)
+
+    def __add__(self, other: Union[str, Iro, IroElement, "IroBuilder"]) -> "IroBuilder":
+        if isinstance(other, IroBuilder):
+            return self._copy().extend(other)
+        if isinstance(other, (str, Iro, IroElement)):
+            return self._copy().append(other)
+        return NotImplemented
+
+    def __radd__(self, other: Union[str, Iro, IroElement]) -> "IroBuilder":
+        if isinstance(other, (str, Iro, IroElement)):
+            builder = self._copy()
+            builder._head = _concat(_Slice([other], 1), self._parts())
+            builder._tail = []
+            builder._stop = 0
+            builder._iro = None
+            return builder
+        return NotImplemented
+
+    def __iadd__(self, other: Union[str, Iro, IroElement, "IroBuilder"]) -> "IroBuilder":
+        if isinstance(other, IroBuilder):
+            return self.extend(other)
+        if isinstance(other, (str, Iro, IroElement)):
+            return self.append(other)
+        return NotImplemented
+
+    def __iter__(self) -> Iterator:
+        return iter(self._parts() or ())
+
+    def __len__(self) -> int:
+        return len(self._head or ()) + self._stop
+
+    @property
+    def text(self) -> str:
+        return self.str
+
+    @property
+    def str(self) -> str:
+        return str(self)
+
+    def __str__(self):
+        return self.paint()
+
+    def __repr__(self):
+        return 'IroBuilder(values={}, {})'.format(
+            repr(list(self)), ', '.join('{}={}'.format(key, repr(value)) for key, value in self._options.items()))
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+from .iro import Iro
+from .profile import Profile, _close_color16_index, _to_color16
+from .styles import Color256, ColorRGB, Style
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Dict, Iterable, List, Sequence, Tuple, Union
+
+    from .styles import IroElement
+
+    ColorLike = Union[ColorRGB, str, Sequence[int]]
+
+# colors of fewer cells than this are interpolated without NumPy, since converting into arrays costs more
+_NUMPY_MIN_CELLS = 1024
+
+_numpy: Any = None
+
+
+def _import_numpy() -> Any:
+    """
+    Get `numpy` if it is installed, otherwise `False`. Imported on first use, since importing it takes time.
+    """
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy
+
+
+def _to_rgb(color: ColorLike) -> Tuple[int, int, int]:
+    if isinstance(color, str):
+        color = ColorRGB.from_color_code(color)
+    elif not isinstance(color, ColorRGB):
+        color = ColorRGB(*color)
+    return color.r, color.g, color.b
+
+
+def _interpolate(stops: List[Tuple[int, int, int]], positions: Sequence[float]) -> List[int]:
+    """
+    Get the colors at `positions` between 0 and 1 of the gradient through evenly placed `stops`,
+    as packed `0xRRGGBB` integers.
+    """
+    last = len(stops) - 1
+    if not last:
+        r, g, b = stops[0]
+        return [r << 16 | g << 8 | b] * len(positions)
+
+    numpy = _import_numpy() if len(positions) >= _NUMPY_MIN_CELLS else False
+    if numpy:
+        scaled = numpy.asarray(positions, dtype=numpy.float64) * last
+        index = numpy.minimum(scaled.astype(numpy.intp), last - 1)
+        fraction = (scaled - index)[:, None]
+        colors = numpy.asarray(stops, dtype=numpy.float64)
+        rgb = numpy.rint(colors[index] + (colors[index + 1] - colors[index]) * fraction).astype(numpy.int64)
+        return (rgb[:, 0] << 16 | rgb[:, 1] << 8 | rgb[:, 2]).tolist()
+
+    # same operations as NumPy above, so both give the same colors
+    steps = [tuple(float(b - a) for a, b in zip(stops[i], stops[i + 1])) for i in range(last)]
+    starts = [tuple(float(c) for c in stop) for stop in stops]
+    result = []
+    for position in positions:
+        scaled = position * last
+        index = min(int(scaled), last - 1)
+        fraction = scaled - index
+        (r, g, b), (dr, dg, db) = starts[index], steps[index]
+        result.append(round(r + dr * fraction) << 16 | round(g + dg * fraction) << 8 | round(b + db * fraction))
+    return result
+
+
+def _quantize(colors: List[int], profile: Profile, bg: bool) -> Tuple[List[int], Dict[int, IroElement]]:
+    """
+    Convert packed colors into the colors `profile` supports at once. Each distinct color is converted only once.
+    :return: key of the converted color of each color, and the element of each key
+    """
+    elements: Dict[int, IroElement] = {}
+    if profile is Profile.TRUECOLOR:
+        for color in dict.fromkeys(colors):
+            elements[color] = ColorRGB(color >> 16, color >> 8 & 0xff, color & 0xff, bg)
+        return colors, elements
+
+    distinct = list(dict.fromkeys(colors))
+    if profile is Profile.COLOR16:
+        indices = [_close_color16_index((color >> 16, color >> 8 & 0xff, color & 0xff)) for color in distinct]
+    else:
+        indices = ColorRGB.close_c256_indices(b''.join(color.to_bytes(3, 'big') for color in distinct))
+    converted = dict(zip(distinct, indices))
+    for index in dict.fromkeys(indices):
+        elements[index] = _to_color16(index, bg) if profile is Profile.COLOR16 else Color256(index, bg)
+    return [converted[color] for color in colors], elements
+
+
+def _paint_cells(rows: List[Sequence[str]], positions: List[float], stops: Iterable[ColorLike], bg: bool,
+                 profile: Profile) -> Iro:
+    """
+    Paint cells of `rows` with the colors at `positions` given for each cell in order.
+    Adjacent cells of the same color in a row are joined into one text, and colors are changed in order without
+    closing the previous one, so one sequence is painted for each change of the color.
+    """
+    stops = [_to_rgb(stop) for stop in stops]
+    if not stops:
+        raise ValueError('at least one color is required.')
+    if profile is Profile.NONE:
+        return Iro('\n'.join(''.join(row) for row in rows))
+
+    keys, elements = _quantize(_interpolate(stops, positions), profile, bg)
+    # color is closed before newlines, not to fill the rest of the line with the background color
+    close = Style.OFF_BG_COLOR if bg else Style.OFF_FG_COLOR
+    values: List[Union[str, IroElement]] = []
+    cell = 0
+    for row_number, row in enumerate(rows):
+        if row_number:
+            values.append(close)
+            values.append('\n')
+        start = 0
+        for column in range(1, len(row) + 1):
+            if column == len(row) or keys[cell + column] != keys[cell + start]:
+                values.append(elements[keys[cell + start]])
+                values.append(''.join(row[start:column]))
+                start = column
+        cell += len(row)
+    return Iro(*values, collect_styles_first=False)
+
+
+def gradient(text: str, *stops: ColorLike, bg: bool = False, profile: Profile = Profile.TRUECOLOR) -> Iro:
+    """
+    Paint `text` with colors changing from left to right through `stops`. Lines of `text` share the colors of each
+    column, so the gradient is aligned through the lines.
+    Colors are interpolated at once (with NumPy if it is installed), converted into the colors `profile` supports at
+    once, and adjacent characters of the same color are painted as one text, so no redundant sequence is painted.
+    :param text: text to be painted
+    :param stops: colors placed evenly from the first column to the last. `ColorRGB`, `"#rrggbb"` or `(r, g, b)`
+    :param bg: whether to paint the background or not
+    :param profile: colors to be used. colors are converted in advance, so paint the result with the same profile
+    :return: `Iro` painting `text`
+    """
+    lines = text.split('\n')
+    width = max(map(len, lines))
+    scale = 1 / (width - 1) if width > 1 else 0
+    positions = [column * scale for line in lines for column in range(len(line))]
+    return _paint_cells(lines, positions, stops, bg, profile)
+
+
+def colormap(values: Iterable[Iterable[float]], *stops: ColorLike, vmin: Union[float, None] = None,
+             vmax: Union[float, None] = None, cell: str = '  ', bg: bool = True,
+             profile: Profile = Profile.TRUECOLOR) -> Iro:
+    """
+    Paint a grid of numbers as a heatmap, each number as `cell` of the color for the number.
+    Colors are computed for the whole grid at once, same as `gradient`.
+    :param values: rows of numbers. give a list of one row for a sparkline
+    :param stops: colors placed evenly from `vmin` to `vmax`. `ColorRGB`, `"#rrggbb"` or `(r, g, b)`
+    :param vmin: number painted with the first color. smaller numbers are painted with it too. min of `values` if
+        not given
+    :param vmax: number painted with the last color. larger numbers are painted with it too. max of `values` if not
+        given
+    :param cell: text painted for each number
+    :param bg: whether to paint the background or not
+    :param profile: colors to be used. colors are converted in advance, so paint the result with the same profile
+    :return: `Iro` painting the rows
+    """
+    rows = [list(row) for row in values]
+    numbers = [number for row in rows for number in row]
+    if vmin is None:
+        vmin = min(numbers, default=0)
+    if vmax is None:
+        vmax = max(numbers, default=0)
+    scale = 1 / (vmax - vmin) if vmax > vmin else 0
+    positions = [min(max((number - vmin) * scale, 0.0), 1.0) for number in numbers]
+    return _paint_cells([[cell] * len(row) for row in rows], positions, stops, bg, profile)
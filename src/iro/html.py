@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import io
+import re
+from html import escape
+
+from .ansi import _parse
+from .iro import Iro
+from .styles import BGColor, Color256, ColorRGB, FGColor, StyleState, _Blink, _Intensity
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import IO, Dict, Iterable, List, Tuple, Union
+
+# CSS identifier, which is put in `class="..."`, selectors and `@keyframes` as it is
+_CLASS_PREFIX = re.compile(r'-?[_a-zA-Z][_a-zA-Z0-9-]*')
+# seconds of each blink
+_BLINK_DURATIONS = {_Blink.SLOW: '1s', _Blink.RAPID: '.4s'}
+
+
+def _css_color(color: Union[FGColor, BGColor, Color256, ColorRGB]) -> str:
+    if isinstance(color, ColorRGB):
+        rgb = (color.r, color.g, color.b)
+    elif isinstance(color, Color256):
+        rgb = Color256.color_map[color.color]
+    else:
+        value = color.value % 10 + (8 if color.value >= 90 else 0)
+        rgb = Color256.color_map[value]
+    return '#{:02x}{:02x}{:02x}'.format(*rgb)
+
+
+def _declarations(state: StyleState, class_prefix: str) -> str:
+    """
+    Get CSS declarations showing texts of `state`. Fonts are not shown.
+    """
+    declarations = []
+    fg = _css_color(state.FG_COLOR) if state.FG_COLOR is not None else None
+    bg = _css_color(state.BG_COLOR) if state.BG_COLOR is not None else None
+    if state.INVERT:
+        # default colors of the page are used for unset colors
+        fg, bg = bg or 'Canvas', fg or 'CanvasText'
+    if state.HIDE:
+        fg = 'transparent'
+    elif state.INTENSITY is not None and state.INTENSITY is not _Intensity.BOLD:
+        # only the text is faded, not the background
+        fg = 'color-mix(in srgb,{} 50%,transparent)'.format(fg or 'currentColor')
+    if fg:
+        declarations.append('color:' + fg)
+    if bg:
+        declarations.append('background-color:' + bg)
+
+    if state.INTENSITY is not None and state.INTENSITY is not _Intensity.DIM:
+        declarations.append('font-weight:bold')
+    if state.ITALIC:
+        declarations.append('font-style:italic')
+
+    lines = []
+    if state.UNDERLINE or state.DOUBLY_UNDERLINE:
+        lines.append('underline')
+    if state.OVERLINE:
+        lines.append('overline')
+    if state.STRIKE:
+        lines.append('line-through')
+    if lines:
+        declarations.append('text-decoration:' + ' '.join(lines))
+        if state.DOUBLY_UNDERLINE and not state.UNDERLINE:
+            declarations.append('text-decoration-style:double')
+
+    if state.BLINK is not None:
+        declarations.append('animation:{}-blink {} step-end infinite'.format(class_prefix,
+                                                                              _BLINK_DURATIONS[state.BLINK]))
+    return ';'.join(declarations)
+
+
+class HtmlWriter:
+    """
+    Writer of `Iro` and texts with escape sequences into `fp` as HTML, such as logs to be viewed in browsers.
+    Texts are put in `<span>`s of CSS classes, one class for each distinct style. The rule of each class is written
+    once in `<style>` before the first text of the class, so HTML is written chunk by chunk in bounded memory, and
+    it is much smaller than HTML with inline styles.
+    Written content is put in `<pre>`, which is started by the first write and ended by `close`.
+    """
+
+    def __init__(self, fp: IO[str], class_prefix: str = 'iro', buffer_size: int = io.DEFAULT_BUFFER_SIZE):
+        """
+        :param fp: output
+        :param class_prefix: class of `<pre>`, and prefix of the classes of the styles. must be a CSS identifier
+        :param buffer_size: number of characters to be written at once
+        """
+        if not isinstance(class_prefix, str) or not _CLASS_PREFIX.fullmatch(class_prefix):
+            raise ValueError('class_prefix must be a CSS identifier such as "iro". got {}'.format(repr(class_prefix)))
+        self.fp = fp
+        self.class_prefix = class_prefix
+        self.buffer_size = buffer_size
+
+        # class of each style, and of each declarations not to make two classes of same declarations.
+        # `''` for no declarations
+        self._classes: Dict[StyleState, str] = {StyleState.EMPTY: ''}
+        self._declaration_classes: Dict[str, str] = {'': ''}
+        self._blink_written = False
+        # class of the `<span>` not closed yet
+        self._class = ''
+        # styles at the end of the texts with escape sequences written so far
+        self._state = StyleState.EMPTY
+        self._started = False
+        self._closed = False
+
+    def write(self, content: Union[Iro, str]) -> int:
+        """
+        Write `Iro`, or text with escape sequences such as the output of other programs.
+        Styles of texts continue from the previous text, and `Iro` is written from no styles, same as a terminal
+        showing them in order.
+        :param content: `Iro` or text
+        :return: number of written characters
+        """
+        if self._closed:
+            raise ValueError('HtmlWriter is already closed.')
+        if isinstance(content, Iro):
+            segments: Iterable[Tuple[str, StyleState]] = content.iter_segments()
+            # painted `Iro` resets the terminal at the end
+            self._state = StyleState.EMPTY
+        else:
+            segments, self._state = _parse(content, self._state)
+        return self._write_segments(segments)
+
+    def close(self) -> int:
+        """
+        End `<pre>`.
+        :return: number of written characters
+        """
+        if self._closed:
+            return 0
+        out = []
+        self._start(out)
+        if self._class:
+            out.append('</span>')
+        out.append('</pre>')
+        self._closed = True
+        return self._flush(out)
+
+    def __enter__(self) -> "HtmlWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _start(self, out: List[str]):
+        if not self._started:
+            self._started = True
+            out.append('<pre class="{}">'.format(self.class_prefix))
+
+    def _flush(self, out: List[str]) -> int:
+        text = ''.join(out)
+        out.clear()
+        if text:
+            self.fp.write(text)
+        return len(text)
+
+    def _write_segments(self, segments: Iterable[Tuple[str, StyleState]]) -> int:
+        out: List[str] = []
+        self._start(out)
+        buffered = sum(map(len, out))
+        written = 0
+        classes = self._classes
+        for text, state in segments:
+            class_name = classes.get(state)
+            if class_name is None:
+                start = len(out)
+                class_name = self._new_class(state, out)
+                buffered += sum(map(len, out[start:]))
+            if class_name != self._class:
+                if self._class:
+                    out.append('</span>')
+                    buffered += 7
+                if class_name:
+                    out.append('<span class="{}">'.format(class_name))
+                    buffered += len(out[-1])
+                self._class = class_name
+            text = escape(text, False)
+            out.append(text)
+            buffered += len(text)
+            if buffered >= self.buffer_size:
+                written += self._flush(out)
+                buffered = 0
+        return written + self._flush(out)
+
+    def _new_class(self, state: StyleState, out: List[str]) -> str:
+        declarations = _declarations(state, self.class_prefix)
+        class_name = self._declaration_classes.get(declarations)
+        if class_name is None:
+            class_name = '{}-{}'.format(self.class_prefix, len(self._declaration_classes))
+            self._declaration_classes[declarations] = class_name
+            if self._class:
+                # `<style>` is put outside `<span>`s
+                out.append('</span>')
+                self._class = ''
+            rules = '.{}{{{}}}'.format(class_name, declarations)
+            if state.BLINK is not None and not self._blink_written:
+                self._blink_written = True
+                rules += '@keyframes {}-blink{{50%{{opacity:0}}}}'.format(self.class_prefix)
+            out.append('<style>{}</style>'.format(rules))
+        self._classes[state] = class_name
+        return class_name
+
+
+def to_html(content: Union[Iro, str], class_prefix: str = 'iro') -> str:
+    """
+    Get HTML of `Iro` or text with escape sequences, same as written by `HtmlWriter`.
+    :param content: `Iro` or text
+    :param class_prefix: class of `<pre>`, and prefix of the classes of the styles. must be a CSS identifier
+    :return: `<pre>` with `<style>`s and `<span>`s
+    """
+    fp = io.StringIO()
+    with HtmlWriter(fp, class_prefix) as writer:
+        writer.write(content)
+    return fp.getvalue()
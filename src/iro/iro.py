@@ -1,89 +1,1003 @@
-from typing import Iterable, List, Literal, Any, Union
+from __future__ import annotations
 
+import codecs
+import io
+import weakref
+
+from .ansi import parse_ansi
+from .profile import Profile
 from .styles import IroElement, ColorRGB, Style, StyleState
+from .template import Placeholder, Template
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+    from typing import IO, Any, Dict, Generator, Iterable, Iterator, List, Sequence, Tuple, Union
+
+_RENDER_CACHE_SIZE = 8
+# results of nested `Iro` are cached only up to these sizes, since each cached result copies the painted subtree and
+# nested chains would keep copies growing quadratically with the depth. results of the root are always cached
+_CACHED_CHILD_PIECES = 64
+_CACHED_CHILD_CHARS = 4096
+# number of pieces `Iro.iter_paint` takes at once
+_STREAM_BATCH_SIZE = 64
+# number of pieces `Iro.paint_into` encodes at once. encoding joined pieces is faster than encoding each piece
+_BYTES_BATCH_SIZE = 256
+# top-level values of `Iro.paint_parallel` are split into this many parts per worker, to balance the workers
+_PARALLEL_PARTS_PER_WORKER = 4
+
+
+class _IroValues(list):
+    """
+    `list` of `Iro.values` which notifies the owner `Iro` on every modification.
+    """
+    __slots__ = ('_owner',)
+
+    def __init__(self, owner: "Iro", values: Iterable):
+        super().__init__(values)
+        self._owner = owner
+
+    def __reduce__(self):
+        # pickled as `list`, since the owner is set only by `Iro`
+        return list, (list(self),)
+
+
+class _ParentRef(weakref.ref):
+    """
+    Weak reference to an `Iro` containing a child, removed from `parents` of the child when the `Iro` is collected.
+    """
+    __slots__ = ('parents', 'key')
+
+    def __new__(cls, parent: "Iro", parents: Dict[int, "_ParentRef"]):
+        return super().__new__(cls, parent, _drop_parent)
+
+    def __init__(self, parent: "Iro", parents: Dict[int, "_ParentRef"]):
+        super().__init__(parent, _drop_parent)
+        self.parents = parents
+        self.key = id(parent)
+
+
+def _drop_parent(ref: _ParentRef):
+    if ref.parents.get(ref.key) is ref:
+        del ref.parents[ref.key]
+
+
+def _notify_owner(name: str):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._owner.invalidate()
+        return result
+
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__',
+              'append', 'extend', 'insert', 'remove', 'pop', 'clear', 'sort', 'reverse'):
+    setattr(_IroValues, _name, _notify_owner(_name))
+
+
+class _Frame:
+    """
+    Painting state of one depth of the tree, kept on the explicit stack of `Iro._render`.
+    """
+    __slots__ = ('owner', 'items', 'depth', 'current_style', 'found_visible', 'last_child_style_state', 'resume',
+                 'item', 'cache_key', 'start')
+
+    def __init__(self, owner: "Iro", depth: int, current_style: StyleState):
+        self.owner = owner
+        self.items: Iterator = iter(())
+        self.depth = depth
+        self.current_style = current_style
+        self.found_visible = False
+        self.last_child_style_state: Union[StyleState, None] = None
+        # what to do with the style returned by the child frame
+        self.resume = None
+        # item waiting to be painted after `sep`
+        self.item = None
+        self.cache_key = None
+        self.start = 0
+
+
+# `item` of `Iro._render_text` frame is not waiting
+_NO_ITEM = object()
+# child frame of `item` has been painted
+_RESUME_ITEM = object()
+# child frame of `sep` has been painted. `_Frame.item` is still waiting to be painted
+_RESUME_SEP = object()
+
+
+def _enter(owner: "Iro", value: Any, values: Iterable, given_style: Union[StyleState, None], depth: int,
+           result: List[str], store: bool, profile: Profile) -> Union[_Frame, StyleState]:
+    """
+    Start painting `value`. If `value` is `Iro` with cached result, the result is used and last style is returned.
+    Otherwise, new frame to paint `values` is returned.
+    """
+    cache_key = None
+    if isinstance(value, Iro):
+        owner = value
+        values = value._values
+        if value._is_cacheable():
+            cache_key = (given_style or StyleState.EMPTY, depth == 0, profile)
+            cached = value._cache.get(cache_key)
+            if cached is not None:
+                result.append(cached[0])
+                return cached[1]
+            if not store:
+                cache_key = None
+
+    if cache_key is not None:
+        start = len(result)
+    if depth == 0 and values and values[0] is Style.RESET:
+        # the terminal is reset before painting, so painting starts from the empty state
+        result.append(Style.RESET.open)
+        given_style = None
+
+    current_style = given_style or StyleState.EMPTY
+    frame = _Frame(owner, depth, current_style)
+    if cache_key is not None:
+        frame.cache_key = cache_key
+        frame.start = start
+
+    if owner._collect_styles_first:
+        convert = None if profile is Profile.TRUECOLOR else profile.convert
+        for item in values:
+            if isinstance(item, IroElement):
+                current_style = current_style.copy_with(convert(item) if convert else item)
+        result.append((given_style or StyleState.EMPTY).diff_sequence(current_style, owner._coalesce,
+                                                                      owner._minimize))
+        frame.current_style = current_style
+
+    frame.items = iter(values)
+    return frame
+
+
+def _small_enough(result: List[str], start: int) -> bool:
+    """
+    Whether the pieces painted from `start` are small enough to be cached as a nested result.
+    """
+    return len(result) - start <= _CACHED_CHILD_PIECES and \
+        sum(map(len, result[start:])) <= _CACHED_CHILD_CHARS
+
+
+def _render_frames(root: _Frame, result: List[str], store: bool, batch_size: int, profile: Profile,
+                   reset_root: bool = True) -> Generator[None, None, StyleState]:
+    """
+    Paint the tree from `root` frame into `result` walking with explicit stack. See `Iro._render`.
+    If `reset_root` is False, the terminal is not reset after the items of the root frame.
+    :return: styles left at the end
+    """
+    stack = [root]
+    returned: Union[StyleState, None] = None
+    convert = None if profile is Profile.TRUECOLOR else profile.convert
+
+    while True:
+        frame = stack[-1]
+        owner = frame.owner
+        sep = owner._sep
+        collect_styles_first = owner._collect_styles_first
+        coalesce = owner._coalesce
+        minimize = owner._minimize
+        current_style = frame.current_style
+        item = frame.item
+        entered = None
+        resume = frame.resume
+        frame.resume = None
+
+        if resume is _RESUME_ITEM:
+            frame.last_child_style_state = returned
+            frame.found_visible = True
+        elif resume is _RESUME_SEP:
+            result.append(returned.diff_sequence(current_style, coalesce, minimize))
+            if isinstance(item, str):
+                result.append(item)
+                frame.found_visible = True
+            else:
+                entered = _enter(owner, item, item, current_style, frame.depth + 1, result, store, profile)
+                if isinstance(entered, _Frame):
+                    frame.resume = _RESUME_ITEM
+                else:
+                    frame.last_child_style_state = entered
+                    frame.found_visible = True
+                    entered = None
+
+        if entered is None:
+            for item in frame.items:
+                if isinstance(item, IroElement):
+                    if not collect_styles_first:
+                        next_style = current_style.copy_with(convert(item) if convert else item)
+                        # styles left by the last child are changed together
+                        before = frame.last_child_style_state or current_style
+                        frame.last_child_style_state = None
+                        result.append(before.diff_sequence(next_style, coalesce, minimize))
+                        current_style = frame.current_style = next_style
+                    continue
+
+                if frame.last_child_style_state:
+                    result.append(
+                        frame.last_child_style_state.diff_sequence(current_style, coalesce, minimize))
+                    frame.last_child_style_state = None
+
+                if frame.found_visible and sep:
+                    if isinstance(sep, Iro):
+                        entered = _enter(owner, sep, sep, current_style, frame.depth + 1, result, store, profile)
+                        if isinstance(entered, _Frame):
+                            frame.item = item
+                            frame.resume = _RESUME_SEP
+                            break
+                        result.append(entered.diff_sequence(current_style, coalesce, minimize))
+                        entered = None
+                    else:
+                        result.append(sep)
+
+                if isinstance(item, str):
+                    result.append(item)
+                else:
+                    entered = _enter(owner, item, item, current_style, frame.depth + 1, result, store, profile)
+                    if isinstance(entered, _Frame):
+                        frame.resume = _RESUME_ITEM
+                        break
+                    frame.last_child_style_state = entered
+                    entered = None
+                frame.found_visible = True
+
+                if batch_size and len(result) >= batch_size:
+                    yield
+
+        if entered is not None:
+            stack.append(entered)
+            continue
+
+        # every item of the frame is painted
+        if frame.depth == 0 and reset_root:
+            result.append(Style.RESET.open)
+        returned = frame.last_child_style_state or current_style
+        if frame.cache_key is not None and (frame.depth == 0 or _small_enough(result, frame.start)):
+            frame.owner._store_cache(frame.cache_key, ''.join(result[frame.start:]), returned)
+        stack.pop()
+        if not stack:
+            return returned
+        if batch_size and len(result) >= batch_size:
+            yield
+
+
+def _paint_part(part: "Iro", current_style: StyleState, found_visible: bool,
+                profile: Profile) -> Tuple[str, StyleState]:
+    """
+    Paint the values of `part` as a part of the top-level values of `Iro.paint_parallel`, starting from the state of
+    the root frame before them. Run in the workers.
+    :return: painted text, and the styles left at the end
+    """
+    frame = _Frame(part, 0, current_style)
+    frame.found_visible = found_visible
+    frame.items = iter(part._values)
+    result: List[str] = []
+    # without `batch_size`, painting finishes at the first `next`
+    try:
+        next(_render_frames(frame, result, True, 0, profile, False))
+    except StopIteration as stop:
+        return ''.join(result), stop.value
+
+
+def _paint_flat_row(row: Sequence, sep: str, coalesce: bool, minimize: bool, profile: Profile,
+                    diffs: Dict[Tuple[StyleState, StyleState], str]) -> Union[str, None]:
+    """
+    Paint `row` same as `Iro(*row, sep=sep, coalesce=coalesce, minimize=minimize)` without building `Iro`,
+    if `row` consists only of texts, styles and lists of texts and styles. Otherwise, `None` is returned.
+    `diffs` keeps the sequences between styles, shared by the rows.
+    """
+    text_only = profile is Profile.NONE
+    convert = None if profile is Profile.TRUECOLOR else profile.convert
+
+    def diff_sequence(before: StyleState, after: StyleState) -> str:
+        sequence = diffs.get((before, after))
+        if sequence is None:
+            sequence = diffs[before, after] = before.diff_sequence(after, coalesce, minimize)
+        return sequence
+
+    style = StyleState.EMPTY
+    for item in row:
+        if isinstance(item, IroElement):
+            style = style.copy_with(convert(item) if convert else item)
+
+    result = []
+    if not text_only:
+        if row and row[0] is Style.RESET:
+            result.append(Style.RESET.open)
+        result.append(diff_sequence(StyleState.EMPTY, style))
+
+    found_visible = False
+    last_cell_style = None
+    for item in row:
+        if isinstance(item, IroElement):
+            continue
+        if last_cell_style is not None:
+            result.append(diff_sequence(last_cell_style, style))
+            last_cell_style = None
+        if found_visible and sep:
+            result.append(sep)
+        found_visible = True
+        if isinstance(item, str):
+            result.append(item)
+            continue
+        if not isinstance(item, (list, tuple)):
+            return None
+
+        cell_style = style
+        for value in item:
+            if isinstance(value, IroElement):
+                cell_style = cell_style.copy_with(convert(value) if convert else value)
+            elif not isinstance(value, str):
+                return None
+        if not text_only:
+            result.append(diff_sequence(style, cell_style))
+            last_cell_style = cell_style
+        cell_visible = False
+        for value in item:
+            if isinstance(value, str):
+                if cell_visible and sep:
+                    result.append(sep)
+                cell_visible = True
+                result.append(value)
+
+    if not text_only:
+        result.append(Style.RESET.open)
+    return ''.join(result)
+
+
+def _column_layout(column_styles: List[Tuple[IroElement, ...]], length: int, sep: str, coalesce: bool,
+                   minimize: bool, profile: Profile) -> Tuple[List[str], str]:
+    """
+    Get the pieces painted before each text and at the end, of the row of `length` texts styled by `column_styles`.
+    Painting the row is the same as `_paint_flat_row` of `[[*styles, text] for styles, text in ...]`.
+    """
+    if profile is Profile.NONE:
+        return [''] + [sep] * (length - 1), ''
+    convert = None if profile is Profile.TRUECOLOR else profile.convert
+
+    prefixes = []
+    last_cell_style = None
+    for i in range(length):
+        prefix = []
+        if last_cell_style is not None:
+            prefix.append(last_cell_style.diff_sequence(StyleState.EMPTY, coalesce, minimize))
+            last_cell_style = None
+        if i and sep:
+            prefix.append(sep)
+        if i < len(column_styles):
+            cell_style = StyleState.EMPTY
+            for style in column_styles[i]:
+                cell_style = cell_style.copy_with(convert(style) if convert else style)
+            prefix.append(StyleState.EMPTY.diff_sequence(cell_style, coalesce, minimize))
+            last_cell_style = cell_style
+        prefixes.append(''.join(prefix))
+    return prefixes, Style.RESET.open
 
 
 class Iro:
     def __init__(self, *values: Any, disable_rgb: bool = True,
-                 sep: Union[str, "Iro"] = "", collect_styles_first: bool = True):
+                 sep: Union[str, "Iro"] = "", collect_styles_first: bool = True, coalesce: bool = False,
+                 minimize: bool = False):
         """
 
         :param values: texts to colorize
-        :param disable_rgb: whether to disable RGB color or not
+        :param disable_rgb: kept for compatibility. not applied when painting, since it is `True` by default and
+            every `ColorRGB` would be painted as `Color256`. give `profile=Profile.COLOR256` to paint methods instead
         :param sep: separator between texts. if isinstance of str, it will be used as separator. if isinstance of Iterable[str], it will be used as separator for each depth.
         :param collect_first: whether to collect styles at first or not
+        :param coalesce: whether to combine sequences of each style change into one or not
+        :param minimize: whether to choose shorter one of closing styles and resetting then reopening styles or not
         """
+        # rendered results keyed by (given style, whether it is the root). see `invalidate`
+        self._cache = {}
+        self._cacheable: Union[bool, None] = None
+        # weak references to `Iro`s containing this keyed by their ids, found by `_is_cacheable`.
+        # made on first use, since `WeakSet` takes time to make and to be tracked by the GC. each reference removes
+        # itself when the parent is collected
+        self._parents: Union[Dict[int, _ParentRef], None] = None
 
+        # set without the properties, since nothing is cached yet
         self.disable_rgb: bool = disable_rgb
-        self.sep = sep
-        self.collect_styles_first = collect_styles_first
-        self.values = list(values)
+        self._sep = sep
+        self._collect_styles_first = collect_styles_first
+        self._coalesce = coalesce
+        self._minimize = minimize
+        self._values = _IroValues(self, values)
+
+    def __getstate__(self):
+        # caches are not pickled, and parents are found again by `_is_cacheable`
+        state = self.__dict__.copy()
+        del state['_cache'], state['_cacheable'], state['_parents']
+        state['_values'] = list(self._values)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache = {}
+        self._cacheable = None
+        self._parents = None
+        self._values = _IroValues(self, state['_values'])
+
+    @classmethod
+    def from_ansi(cls, text: str, **options) -> "Iro":
+        """
+        Make `Iro` from text with escape sequences, such as painted by `Iro` or the output of other programs.
+        Each text is painted with its styles applied on the styles around the `Iro`, so it can be put inside other
+        `Iro` without breaking their styles. Escape sequences other than SGR are removed.
+        :param text: text with escape sequences
+        :param options: options of `Iro`
+        :return: `Iro` painting same texts with same styles
+        """
+        return cls(*((*state.to_elements(), segment) if not state.is_empty else segment
+                     for segment, state in parse_ansi(text)), **options)
+
+    @property
+    def values(self) -> List:
+        return self._values
+
+    @values.setter
+    def values(self, values: Iterable):
+        self._values = _IroValues(self, values)
+        self.invalidate()
+
+    @property
+    def sep(self) -> Union[str, "Iro"]:
+        return self._sep
+
+    @sep.setter
+    def sep(self, sep: Union[str, "Iro"]):
+        self._sep = sep
+        self.invalidate()
+
+    @property
+    def collect_styles_first(self) -> bool:
+        return self._collect_styles_first
+
+    @collect_styles_first.setter
+    def collect_styles_first(self, collect_styles_first: bool):
+        self._collect_styles_first = collect_styles_first
+        self.invalidate()
+
+    @property
+    def coalesce(self) -> bool:
+        return self._coalesce
+
+    @coalesce.setter
+    def coalesce(self, coalesce: bool):
+        self._coalesce = coalesce
+        self.invalidate()
+
+    @property
+    def minimize(self) -> bool:
+        return self._minimize
+
+    @minimize.setter
+    def minimize(self, minimize: bool):
+        self._minimize = minimize
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Drop the cached render results of this `Iro` and of every `Iro` which contains it.
+        Modifications through `values`, `sep`, `collect_styles_first`, `coalesce` and `minimize` call this automatically.
+        Call it by yourself after modifying a `list` nested inside `values`.
+        """
+        stack = [self]
+        seen = set()
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            node._cache.clear()
+            node._cacheable = None
+            if node._parents:
+                for parent in node._parents.values():
+                    parent = parent()
+                    if parent is not None:
+                        stack.append(parent)
 
-    def paint(self, given_style=None, depth: int = 0) -> str:
+    def _is_cacheable(self) -> bool:
+        """
+        Whether the rendered result can be reused until `invalidate` is called.
+        Values nested in mutable containers (`list`, `dict`, generators, ...) can change without notice,
+        so `Iro` which holds them (directly or through child `Iro`) is rendered every time.
+        `Placeholder` is also not cached to be kept apart by `compile`.
+        """
+        if self._cacheable is not None:
+            return self._cacheable
+
+        # post-order walk through child `Iro`s whose cacheability is not known yet
+        stack = [(self, None)]
+        while stack:
+            node, children = stack.pop()
+            if children is not None:
+                node._cacheable = node._cacheable is not False and all(child._cacheable for child in children)
+                continue
+
+            cacheable = True
+            children = []
+            containers = [node._values]
+            if isinstance(node._sep, (Iro, Placeholder)):
+                containers.append((node._sep,))
+            while containers:
+                for item in containers.pop():
+                    if isinstance(item, Placeholder):
+                        cacheable = False
+                    elif isinstance(item, (str, IroElement)):
+                        continue
+                    elif isinstance(item, Iro):
+                        parents = item._parents
+                        if parents is None:
+                            parents = item._parents = {}
+                        if id(node) not in parents:
+                            parents[id(node)] = _ParentRef(node, parents)
+                        children.append(item)
+                    elif isinstance(item, tuple):
+                        containers.append(item)
+                    else:
+                        cacheable = False
+            # `False` here only tells the result of the items of the node. fixed up after visiting children
+            node._cacheable = None if cacheable else False
+            stack.append((node, children))
+            stack.extend((child, None) for child in children if child._cacheable is None)
+        return self._cacheable
+
+    def paint(self, given_style=None, depth: int = 0, profile: Profile = Profile.TRUECOLOR) -> str:
         """
         Paint texts with given styles.
         :param given_style: given styles
         :param depth: depth of recursion
+        :param profile: colors to be used. unsupported colors are converted to the closest supported color
         :return: painted text
         """
-        result, _ = self._paint(self.values, given_style, depth)
-        return result
+        result: List[str] = []
+        for _ in self._render(given_style, depth, result, True, 0, profile):
+            pass
+        return ''.join(result)
+
+    def iter_paint(self, given_style: Union[StyleState, None] = None, depth: int = 0,
+                   profile: Profile = Profile.TRUECOLOR) -> Iterator[str]:
+        """
+        Paint texts with given styles, yielding sequences and texts in order.
+        Cached results are used, but new results are not cached to keep memory usage bounded.
+        :param given_style: given styles
+        :param depth: depth of recursion
+        :param profile: colors to be used. unsupported colors are converted to the closest supported color
+        :return: iterator of painted pieces
+        """
+        pieces: List[str] = []
+        for _ in self._render(given_style, depth, pieces, False, _STREAM_BATCH_SIZE, profile):
+            yield from pieces
+            pieces.clear()
+        yield from pieces
+
+    def write_to(self, fp: IO[str], buffer_size: int = io.DEFAULT_BUFFER_SIZE,
+                 given_style: Union[StyleState, None] = None, depth: int = 0,
+                 profile: Profile = Profile.TRUECOLOR) -> int:
+        """
+        Paint texts with given styles into `fp`.
+        Painted pieces are written each time they reach `buffer_size` characters.
+        :param fp: file-like object to write into
+        :param buffer_size: number of characters to be written at once
+        :param given_style: given styles
+        :param depth: depth of recursion
+        :param profile: colors to be used. pass `detect_profile(fp)` to write only texts into files and pipes
+        :return: number of written characters
+        """
+        written = 0
+        buffered = 0
+        buffer: List[str] = []
+        for piece in self.iter_paint(given_style, depth, profile):
+            buffer.append(piece)
+            buffered += len(piece)
+            if buffered >= buffer_size:
+                fp.write(''.join(buffer))
+                written += buffered
+                buffered = 0
+                buffer.clear()
+        if buffer:
+            fp.write(''.join(buffer))
+            written += buffered
+        return written
 
-    def _paint(self, values: Iterable, given_style: Union[StyleState, None] = None, depth: int = 0) -> (
-            str, StyleState):
-        current_style = given_style.copy() if given_style else StyleState()
+    def paint_into(self, buffer: Union[bytearray, memoryview], offset: Union[int, None] = None,
+                   given_style: Union[StyleState, None] = None, profile: Profile = Profile.TRUECOLOR,
+                   encoding: str = 'utf-8') -> int:
+        """
+        Paint texts with given styles into `buffer` as encoded bytes, without making `str` or `bytes` of the whole.
+        Painted pieces are encoded and written every `_BYTES_BATCH_SIZE` pieces, so `buffer` can be reused over renders
+        to save allocations. Encoded result is cached with the painted result, so painting unchanged `Iro` again only
+        copies the bytes.
+        :param buffer: `bytearray` to append to, or writable bytes-like object such as `memoryview` to write into
+        :param offset: position in `buffer` to write from. if not given, appended to the end of `bytearray`, or
+            written from the start of other objects
+        :param given_style: given styles
+        :param profile: colors to be used. unsupported colors are converted to the closest supported color
+        :param encoding: encoding of painted text
+        :return: number of written bytes
+        """
+        cache_key = None
+        cached = None
+        if profile is not Profile.NONE and self._is_cacheable():
+            # kept apart from the painted results by `encoding`
+            cache_key = (given_style or StyleState.EMPTY, True, profile, encoding)
+            cached = self._cache.get(cache_key)
 
-        result: List = []
+        append = offset is None and isinstance(buffer, bytearray)
+        view = None if append else memoryview(buffer).cast('B')
+        start = end = len(buffer) if append else offset or 0
+        # other encodings may have BOM or states, which incremental encoder writes only once.
+        # UTF-8 is encoded without it, since it is slower
+        encoder = None if encoding == 'utf-8' or codecs.lookup(encoding).name == 'utf-8' else \
+            codecs.getincrementalencoder(encoding)()
+        pieces: List[str] = []
+        painting = self._render(given_style, 0, pieces, False, _BYTES_BATCH_SIZE, profile) if cached is None else None
+        try:
+            while True:
+                if cached is not None:
+                    chunk = cached[0]
+                else:
+                    # `painting` itself is returned when painting is finished
+                    finished = next(painting, painting) is painting
+                    text = ''.join(pieces)
+                    pieces.clear()
+                    chunk = text.encode() if encoder is None else encoder.encode(text, finished)
 
-        if self.collect_styles_first:
-            for item in values:
-                if isinstance(item, IroElement):
-                    current_style = current_style.copy_with(item)
+                if append:
+                    buffer += chunk
+                else:
+                    if end + len(chunk) > len(view):
+                        raise ValueError('buffer of {} bytes is too small to write {} or more bytes from {}.'.format(
+                            len(view), end + len(chunk) - start, start))
+                    view[end:end + len(chunk)] = chunk
+                end += len(chunk)
+                if cached is not None or finished:
+                    break
+
+            if cache_key is not None and cached is None:
+                self._store_cache(cache_key, bytes(buffer[start:end] if append else view[start:end]), None)
+        finally:
+            if view is not None:
+                view.release()
+        return end - start
+
+    async def write_to_async(self, writer: Any, buffer_size: int = io.DEFAULT_BUFFER_SIZE,
+                             given_style: Union[StyleState, None] = None, depth: int = 0,
+                             profile: Profile = Profile.TRUECOLOR, encoding: str = 'utf-8') -> int:
+        """
+        Paint texts with given styles into `writer` such as `asyncio.StreamWriter`, without blocking the event loop.
+        Each time painted pieces reach `buffer_size` characters, they are written and `writer.drain()` is awaited,
+        then control is given back to the event loop before painting the next pieces.
+        :param writer: object with `write(bytes)` and `async drain()`
+        :param buffer_size: number of characters to be written at once
+        :param given_style: given styles
+        :param depth: depth of recursion
+        :param profile: colors to be used. unsupported colors are converted to the closest supported color
+        :param encoding: encoding of painted text
+        :return: number of written bytes
+        """
+        import asyncio
+
+        written = 0
+        buffered = 0
+        buffer: List[str] = []
+        for piece in self.iter_paint(given_style, depth, profile):
+            buffer.append(piece)
+            buffered += len(piece)
+            if buffered >= buffer_size:
+                data = ''.join(buffer).encode(encoding)
+                writer.write(data)
+                written += len(data)
+                buffered = 0
+                buffer.clear()
+                await writer.drain()
+                # `drain` returns at once unless the buffer of the transport is full
+                await asyncio.sleep(0)
+        if buffer:
+            data = ''.join(buffer).encode(encoding)
+            writer.write(data)
+            written += len(data)
+            await writer.drain()
+        return written
+
+    def compile(self, given_style: Union[StyleState, None] = None, depth: int = 0,
+                profile: Profile = Profile.TRUECOLOR) -> Template:
+        """
+        Compile into `Template`, which renders the same text as `paint` with `Placeholder`s substituted.
+        :param given_style: given styles
+        :param depth: depth of recursion
+        :param profile: colors to be used. unsupported colors are converted to the closest supported color
+        :return: compiled template
+        """
+        result: List[str] = []
+        for _ in self._render(given_style, depth, result, True, 0, profile):
+            pass
+        return Template(result)
 
-            result.append((given_style or StyleState()).diff_sequence(current_style))
+    def paint_parallel(self, workers: Union[int, None] = None, given_style: Union[StyleState, None] = None,
+                       profile: Profile = Profile.TRUECOLOR, executor: Union[Executor, None] = None) -> str:
+        """
+        Paint texts with given styles same as `paint`, painting parts of the top-level values in parallel.
+        Parts start at texts or child `Iro`s, and the styles at the start of each part are found by applying only the
+        top-level styles before it. Painted parts are joined with the sequences from the styles left by each part to
+        the styles at the start of the next part, so the result is the same as `paint`.
+        Values are pickled to the worker processes, so they must be picklable. For large documents only, since
+        starting and sending to the workers costs more than painting small ones.
+        :param workers: number of workers. number of CPUs if not given. with `1`, painted same as `paint`
+        :param given_style: given styles
+        :param profile: colors to be used. unsupported colors are converted to the closest supported color
+        :param executor: `concurrent.futures.Executor` painting the parts, to reuse the workers over calls.
+            if not given, `ProcessPoolExecutor` is made for the call, or `ThreadPoolExecutor` on Python without GIL
+        :return: painted text
+        """
+        import os
+        import sys
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        result: List[str] = []
+        if workers < 2 or profile is Profile.NONE:
+            for _ in self._render(given_style, 0, result, True, 0, profile):
+                pass
+            return ''.join(result)
+
+        # cacheability of every child is found before the workers share them
+        self._is_cacheable()
+        root = _enter(self, self, self._values, given_style, 0, result, True, profile)
+        if not isinstance(root, _Frame):
+            return ''.join(result)
 
+        values = self._values
+        if not isinstance(values, list):
+            # values shared with `IroBuilder` are not indexed quickly
+            values = list(values)
+        size = max(-(-len(values) // (workers * _PARALLEL_PARTS_PER_WORKER)), 1)
+        starts = [0]
+        for start in range(size, len(values), size):
+            start = max(start, starts[-1] + 1)
+            while start < len(values) and isinstance(values[start], IroElement):
+                start += 1
+            if start < len(values):
+                starts.append(start)
+        if len(starts) < 2:
+            for _ in _render_frames(root, result, True, 0, profile):
+                pass
+            return ''.join(result)
+
+        # state of the root frame at the start of each part
+        convert = None if profile is Profile.TRUECOLOR else profile.convert
+        current_style = root.current_style
         found_visible = False
-        last_child_style_state: Union[StyleState, None] = None
+        states = [(current_style, found_visible)]
+        for before, start in zip(starts, starts[1:]):
+            for i in range(before, start):
+                item = values[i]
+                if not isinstance(item, IroElement):
+                    found_visible = True
+                elif not self._collect_styles_first:
+                    current_style = current_style.copy_with(convert(item) if convert else item)
+            states.append((current_style, found_visible))
 
-        for i, item in enumerate(values):
-            if depth == 0 and i == 0 and item is Style.RESET:
-                result.append(Style.RESET.open)
+        parts = [Iro(*values[start:end], sep=self._sep, collect_styles_first=self._collect_styles_first,
+                     coalesce=self._coalesce, minimize=self._minimize)
+                 for start, end in zip(starts, starts[1:] + [len(values)])]
+        arguments = (parts, [state for state, _ in states], [found for _, found in states], [profile] * len(parts))
+        if executor is not None:
+            painted = list(executor.map(_paint_part, *arguments))
+        else:
+            is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+            pool = ThreadPoolExecutor if is_gil_enabled and not is_gil_enabled() else ProcessPoolExecutor
+            with pool(max_workers=workers) as executor:
+                painted = list(executor.map(_paint_part, *arguments))
 
-            if isinstance(item, IroElement):
-                if not self.collect_styles_first:
-                    next_style = current_style.copy_with(item)
-                    result.append(current_style.diff_sequence(next_style))
-                    current_style = next_style
+        returned = None
+        for (text, left_style), (current_style, _) in zip(painted, states):
+            if returned is not None:
+                result.append(returned.diff_sequence(current_style, self._coalesce, self._minimize))
+            result.append(text)
+            returned = left_style
+        result.append(Style.RESET.open)
+        if root.cache_key is not None:
+            self._store_cache(root.cache_key, ''.join(result[root.start:]), returned)
+        return ''.join(result)
+
+    @staticmethod
+    def paint_many(rows: Iterable[Union[Iterable, "Iro"]], row_sep: str = "\n", sep: str = "",
+                   column_styles: Union[Sequence[Iterable[IroElement]], None] = None, coalesce: bool = False,
+                   minimize: bool = False, profile: Profile = Profile.TRUECOLOR) -> str:
+        """
+        Paint many rows at once. Same as joining `Iro(*row, sep=sep, ...).paint(profile=profile)` of each row
+        with `row_sep`. See `iter_paint_many`.
+        :param rows: values of each row, or `Iro`
+        :param row_sep: separator between rows
+        :param sep: separator between texts in a row
+        :param column_styles: styles of each column. see `iter_paint_many`
+        :param coalesce: whether to combine sequences of each style change into one or not
+        :param minimize: whether to choose shorter one of closing styles and resetting then reopening styles or not
+        :param profile: colors to be used. unsupported colors are converted to the closest supported color
+        :return: painted text
+        """
+        return row_sep.join(Iro.iter_paint_many(rows, sep, column_styles, coalesce, minimize, profile))
+
+    @staticmethod
+    def iter_paint_many(rows: Iterable[Union[Iterable, "Iro"]], sep: str = "",
+                        column_styles: Union[Sequence[Iterable[IroElement]], None] = None, coalesce: bool = False,
+                        minimize: bool = False, profile: Profile = Profile.TRUECOLOR) -> Iterator[str]:
+        """
+        Paint rows one by one. Each row is painted same as `Iro(*row, sep=sep, ...).paint(profile=profile)`.
+        Rows of texts, styles and lists of texts and styles are painted without building `Iro`,
+        and the sequences between styles are computed once for all rows.
+        Other rows are painted with `Iro`. Rows which are `Iro` are painted as they are.
+        :param rows: values of each row, or `Iro`
+        :param sep: separator between texts in a row
+        :param column_styles: styles of each column. if given, each value of a row is painted as `[*styles, value]`
+        :param coalesce: whether to combine sequences of each style change into one or not
+        :param minimize: whether to choose shorter one of closing styles and resetting then reopening styles or not
+        :param profile: colors to be used. unsupported colors are converted to the closest supported color
+        :return: iterator of painted rows
+        """
+        if column_styles is not None:
+            column_styles = [tuple(styles) for styles in column_styles]
+        diffs: Dict[Tuple[StyleState, StyleState], str] = {}
+        # sequences around each text of rows of only texts, for each number of columns
+        layouts: Dict[int, Tuple[List[str], str]] = {}
+        for row in rows:
+            if isinstance(row, Iro):
+                yield row.paint(profile=profile)
                 continue
+            row = list(row)
+            if column_styles is not None:
+                if isinstance(sep, str) and all(isinstance(value, str) for value in row):
+                    layout = layouts.get(len(row))
+                    if layout is None:
+                        layout = layouts[len(row)] = _column_layout(column_styles[:len(row)], len(row), sep,
+                                                                    coalesce, minimize, profile)
+                    prefixes, end = layout
+                    yield ''.join([piece for pair in zip(prefixes, row) for piece in pair]) + end
+                    continue
+                row = [[*styles, value] for styles, value in zip(column_styles, row)] + row[len(column_styles):]
+            painted = None
+            if isinstance(sep, str):
+                painted = _paint_flat_row(row, sep, coalesce, minimize, profile, diffs)
+            if painted is None:
+                painted = Iro(*row, sep=sep, coalesce=coalesce, minimize=minimize).paint(profile=profile)
+            yield painted
+
+    def _render(self, given_style: Union[StyleState, None], depth: int, result: List[str], store: bool,
+                batch_size: int, profile: Profile) -> Generator[None, None, StyleState]:
+        """
+        Paint into `result` walking the tree with explicit stack, so depth of the tree is not limited.
+        Each time `result` gets `batch_size` pieces (if not 0), this yields to let the caller consume them.
+        If `store` is True, painted results of cacheable `Iro` are stored. Not to be used with `batch_size`.
+        Styles are converted to the ones `profile` supports. With `Profile.NONE`, only texts are painted.
+        """
+        if profile is Profile.NONE:
+            yield from self._render_text(result, batch_size)
+            return given_style or StyleState.EMPTY
 
-            if last_child_style_state:
-                result.append(last_child_style_state.diff_sequence(current_style))
-                last_child_style_state = None
+        entered = _enter(self, self, self._values, given_style, depth, result, store, profile)
+        if not isinstance(entered, _Frame):
+            return entered
+        return (yield from _render_frames(entered, result, store, batch_size, profile))
 
-            if found_visible and self.sep:
-                if isinstance(self.sep, Iro):
-                    child_paint_result, _last_child_style_state = self._paint_child(self.sep, current_style, depth)
-                    result.append(child_paint_result)
-                    result.append(_last_child_style_state.diff_sequence(current_style))
+    def _render_text(self, result: List[str], batch_size: int) -> Generator[None, None, None]:
+        """
+        Paint only texts into `result`, skipping every style. Same as `_render` but without tracking any style.
+        """
+        # [owner, items, found_visible, item waiting to be painted after `sep`]
+        stack = [[self, iter(self._values), False, _NO_ITEM]]
+        while stack:
+            frame = stack[-1]
+            owner, items, _, item = frame
+            sep = owner._sep
+            child = None
+
+            if item is not _NO_ITEM:
+                frame[3] = _NO_ITEM
+                if isinstance(item, str):
+                    result.append(item)
                 else:
-                    result.append(self.sep)
+                    child = item
 
-            if isinstance(item, str):
-                result.append(item)
+            if child is None:
+                for item in items:
+                    if isinstance(item, IroElement):
+                        continue
+                    if frame[2] and sep:
+                        if isinstance(sep, Iro):
+                            frame[3] = item
+                            child = sep
+                            break
+                        result.append(sep)
+                    frame[2] = True
+                    if isinstance(item, str):
+                        result.append(item)
+                    else:
+                        child = item
+                        break
+                    if batch_size and len(result) >= batch_size:
+                        yield
+
+            if child is None:
+                stack.pop()
+            elif isinstance(child, Iro):
+                stack.append([child, iter(child._values), False, _NO_ITEM])
             else:
-                child_paint_result, last_child_style_state = self._paint_child(item, current_style, depth)
-                result.append(child_paint_result)
-            found_visible = True
+                stack.append([owner, iter(child), False, _NO_ITEM])
 
-        if depth == 0:
-            result.append(Style.RESET.open)
+    def iter_segments(self, given_style: Union[StyleState, None] = None,
+                      profile: Profile = Profile.TRUECOLOR) -> Iterator[Tuple[str, StyleState]]:
+        """
+        Walk the tree yielding each text with the styles it is painted with, without painting any sequence.
+        Texts are yielded in the same order as `paint`, separators included, and empty texts are skipped.
+        :param given_style: given styles
+        :param profile: colors to be used. with `Profile.NONE`, every text is yielded with the empty state
+        :return: iterator of text and its styles
+        """
+        text_only = profile is Profile.NONE
+        convert = None if text_only or profile is Profile.TRUECOLOR else profile.convert
 
-        return ''.join(result), last_child_style_state or current_style
+        def frame(owner: Iro, values: Iterable, style: StyleState) -> list:
+            if owner._collect_styles_first and not text_only:
+                for value in values:
+                    if isinstance(value, IroElement):
+                        style = style.copy_with(convert(value) if convert else value)
+            # [owner, items, found_visible, item waiting to be painted after `sep`, current style]
+            return [owner, iter(values), False, _NO_ITEM, style]
 
-    def _paint_child(self, value: Any, current_style: StyleState, current_depth: int) -> (str, StyleState):
-        if isinstance(value, Iro):
-            return value._paint(value.values, current_style, current_depth + 1)
-        return self._paint(value, current_style, current_depth + 1)
+        if self._values and self._values[0] is Style.RESET:
+            given_style = None
+        stack = [frame(self, self._values, given_style or StyleState.EMPTY)]
+        while stack:
+            current = stack[-1]
+            owner, items, _, item, style = current
+            sep = owner._sep
+            child = None
+
+            if item is not _NO_ITEM:
+                current[3] = _NO_ITEM
+                if isinstance(item, str):
+                    if item:
+                        yield item, style
+                else:
+                    child = item
+
+            if child is None:
+                for item in items:
+                    if isinstance(item, IroElement):
+                        if not owner._collect_styles_first and not text_only:
+                            style = current[4] = style.copy_with(convert(item) if convert else item)
+                        continue
+                    if current[2] and sep:
+                        if isinstance(sep, Iro):
+                            current[3] = item
+                            child = sep
+                            break
+                        yield sep, style
+                    current[2] = True
+                    if isinstance(item, str):
+                        if item:
+                            yield item, style
+                    else:
+                        child = item
+                        break
+
+            if child is None:
+                stack.pop()
+            elif isinstance(child, Iro):
+                stack.append(frame(child, child._values, style))
+            else:
+                stack.append(frame(owner, child, style))
+
+    def _store_cache(self, key, painted: str, last_style_state: StyleState):
+        if len(self._cache) >= _RENDER_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = (painted, last_style_state)
 
     @staticmethod
     def open_styles(styles: Iterable[IroElement], disable_rgb: bool):
@@ -106,18 +1020,26 @@ class Iro:
         return ''.join(result)
 
     def __add__(self, other):
+        """
+        Get `Iro` of the values of both. Values are shared instead of being copied, so chains of `+` take constant
+        time for each.
+        """
+        from .builder import IroBuilder, _add
+
         if isinstance(other, str):
-            return self.values + [other]
+            return _add(self, other, self.disable_rgb)
         elif isinstance(other, Iro):
-            return Iro(self.values + other.values, disable_rgb=self.disable_rgb or other.disable_rgb)
-        raise TypeError("Iro only can be added to `str` or `Iro`.")
+            return _add(self, other, self.disable_rgb or other.disable_rgb)
+        elif isinstance(other, IroBuilder):
+            return _add(self, other, self.disable_rgb)
+        raise TypeError("Iro only can be added to `str`, `Iro` or `IroBuilder`.")
 
     def __radd__(self, other):
+        from .builder import _add
+
         if isinstance(other, str):
-            return [other] + self.values
-        elif isinstance(other, Iro):
-            return Iro(other.values + self.values, disable_rgb=self.disable_rgb or other.disable_rgb)
-        raise TypeError("Iro only can be added to `str` or `Iro`.")
+            return _add(other, self, self.disable_rgb)
+        raise TypeError("Iro only can be added to `str`, `Iro` or `IroBuilder`.")
 
     @property
     def text(self) -> str:
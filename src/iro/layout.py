@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from functools import lru_cache
+
+from .ansi import _parse
+from .iro import Iro
+from .profile import Profile
+from .styles import StyleState
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Iterable, Iterator, List, Tuple, Union
+
+    Segment = Tuple[str, StyleState]
+
+_TOKEN = re.compile(r'\s+|\S+')
+# combining marks and format characters such as zero width space take no column
+_ZERO_WIDTH_CATEGORIES = frozenset(('Mn', 'Me', 'Cf'))
+# widths of texts up to this length are cached
+_CACHED_WIDTH_LENGTH = 256
+
+
+@lru_cache(maxsize=4096)
+def _char_width(char: str) -> int:
+    if unicodedata.combining(char) or unicodedata.category(char) in _ZERO_WIDTH_CATEGORIES:
+        return 0
+    return 2 if unicodedata.east_asian_width(char) in 'WF' else 1
+
+
+def _measure(text: str) -> int:
+    if text.isascii():
+        return len(text)
+    return sum(map(_char_width, text))
+
+
+_measure_cached = lru_cache(maxsize=8192)(_measure)
+
+
+def display_width(text: str) -> int:
+    """
+    Get the number of columns `text` takes on the terminal. East Asian wide and fullwidth characters take 2 columns.
+    Results of short texts are cached, so measuring the same text again costs a dict lookup. Long texts are not
+    cached not to keep them alive.
+    :param text: text without escape sequences
+    :return: number of columns
+    """
+    if len(text) <= _CACHED_WIDTH_LENGTH:
+        return _measure_cached(text)
+    return _measure(text)
+
+
+def _cut(text: str, width: int) -> Tuple[str, int]:
+    """
+    Get the longest head of `text` which fits in `width` columns, and its width.
+    """
+    if width <= 0:
+        return '', 0
+    if text.isascii():
+        return text[:width], min(len(text), width)
+    used = 0
+    for i, char in enumerate(text):
+        char_width = _char_width(char)
+        if used + char_width > width:
+            return text[:i], used
+        used += char_width
+    return text, used
+
+
+class StyledText:
+    """
+    Text made of segments, each of which is a text and the `StyleState` it is shown with.
+    It is measured, wrapped, padded and truncated without painting or parsing escape sequences, and painted once at
+    the end with balanced styles. Methods return new `StyledText`, and the width is computed once.
+    """
+    __slots__ = ('_segments', '_width')
+
+    def __init__(self, segments: Iterable[Segment] = ()):
+        """
+        :param segments: texts and their styles. empty texts are dropped and adjacent texts of the same styles are
+            joined
+        """
+        merged: List[Segment] = []
+        last_text = ''
+        last_state = None
+        for text, state in segments:
+            if not text:
+                continue
+            if state is last_state or (last_text and state == last_state):
+                last_text += text
+                continue
+            if last_text:
+                merged.append((last_text, last_state))
+            last_text, last_state = text, state
+        if last_text:
+            merged.append((last_text, last_state))
+        self._segments: Tuple[Segment, ...] = tuple(merged)
+        self._width: Union[int, None] = None
+
+    @classmethod
+    def from_iro(cls, iro: Iro, profile: Profile = Profile.TRUECOLOR) -> "StyledText":
+        """
+        Make `StyledText` from the segments of `iro`, without painting it.
+        :param iro: `Iro` to be laid out
+        :param profile: colors to be used. unsupported colors are converted to the closest supported color
+        """
+        return cls(iro.iter_segments(profile=profile))
+
+    @classmethod
+    def from_ansi(cls, text: str) -> "StyledText":
+        """
+        Make `StyledText` from text with escape sequences, such as the output of other programs.
+        :param text: text with escape sequences
+        """
+        return cls(_parse(text, StyleState.EMPTY)[0])
+
+    @property
+    def segments(self) -> Tuple[Segment, ...]:
+        return self._segments
+
+    @property
+    def plain(self) -> str:
+        return ''.join(text for text, _ in self._segments)
+
+    @property
+    def width(self) -> int:
+        """
+        Number of columns on the terminal. Only for a single line.
+        """
+        if self._width is None:
+            self._width = sum(display_width(text) for text, _ in self._segments)
+        return self._width
+
+    def splitlines(self) -> List["StyledText"]:
+        """
+        Split at newlines, keeping the styles of each line.
+        """
+        lines = []
+        line: List[Segment] = []
+        for text, state in self._segments:
+            if '\n' not in text:
+                line.append((text, state))
+                continue
+            *heads, tail = text.split('\n')
+            for head in heads:
+                line.append((head, state))
+                lines.append(StyledText(line))
+                line = []
+            line.append((tail, state))
+        lines.append(StyledText(line))
+        return lines
+
+    def truncate(self, width: int, placeholder: str = '…') -> "StyledText":
+        """
+        Cut off the end to fit in `width` columns. Only for a single line.
+        :param width: max number of columns
+        :param placeholder: text put at the end in place of the cut off text, with the styles of the last text
+        :return: `self` if it fits. otherwise, truncated text
+        """
+        if self.width <= width:
+            return self
+        placeholder, placeholder_width = _cut(placeholder, width)
+        room = width - placeholder_width
+        segments: List[Segment] = []
+        state = StyleState.EMPTY
+        for text, state in self._segments:
+            text_width = display_width(text)
+            if text_width > room:
+                segments.append((_cut(text, room)[0], state))
+                break
+            segments.append((text, state))
+            room -= text_width
+        segments.append((placeholder, state))
+        return StyledText(segments)
+
+    def ljust(self, width: int, fillchar: str = ' ') -> "StyledText":
+        """
+        Pad the end with `fillchar` to `width` columns, like `str.ljust`. Padding has no styles.
+        """
+        return self._pad(width, fillchar, '<')
+
+    def rjust(self, width: int, fillchar: str = ' ') -> "StyledText":
+        """
+        Pad the start with `fillchar` to `width` columns, like `str.rjust`. Padding has no styles.
+        """
+        return self._pad(width, fillchar, '>')
+
+    def center(self, width: int, fillchar: str = ' ') -> "StyledText":
+        """
+        Pad both sides with `fillchar` to `width` columns, like `str.center`. Padding has no styles.
+        Odd padding puts the extra `fillchar` on the same side as `str.center` does.
+        """
+        return self._pad(width, fillchar, '^')
+
+    def _pad(self, width: int, fillchar: str, align: str) -> "StyledText":
+        if not isinstance(fillchar, str):
+            raise TypeError('fillchar must be str. got {}'.format(type(fillchar).__name__))
+        if len(fillchar) != 1:
+            raise TypeError('fillchar must be exactly one character long. got {}'.format(repr(fillchar)))
+        fill_width = display_width(fillchar)
+        if not fill_width:
+            raise ValueError('fillchar must take at least one column. got {}'.format(repr(fillchar)))
+        count = (width - self.width) // fill_width
+        if count <= 0:
+            return self
+        if align == '<':
+            start = 0
+        elif align == '>':
+            start = count
+        else:
+            # same as `str.center`
+            start = count // 2 + (count & width & 1)
+        return StyledText(((fillchar * start, StyleState.EMPTY), *self._segments,
+                           (fillchar * (count - start), StyleState.EMPTY)))
+
+    def wrap(self, width: int) -> List["StyledText"]:
+        """
+        Wrap into lines of at most `width` columns, breaking at whitespaces like `textwrap.wrap`.
+        Words longer than `width` are broken. Newlines start new lines, and whitespaces around wrapped lines are
+        dropped except the indent of each line before wrapping. Styles are kept across the lines.
+        :param width: max number of columns of each line
+        :return: wrapped lines
+        """
+        if width < 1:
+            raise ValueError('width must be positive. got {}'.format(width))
+        lines = []
+        for line in self.splitlines():
+            lines.extend(StyledText(segments) for segments in _wrap_line(line._segments, width))
+        return lines
+
+    def paint(self, coalesce: bool = False, minimize: bool = False, profile: Profile = Profile.TRUECOLOR) -> str:
+        """
+        Paint the segments. Styles are closed at the end, so painted texts can be joined or put side by side.
+        :param coalesce: whether to combine sequences of each style change into one or not
+        :param minimize: whether to choose shorter one of closing styles and resetting then reopening styles or not
+        :param profile: colors to be used. unsupported colors are converted to the closest supported color
+        :return: painted text
+        """
+        if profile is Profile.NONE:
+            return self.plain
+        converted = {}
+        result = []
+        before = StyleState.EMPTY
+        for text, state in self._segments:
+            if profile is not Profile.TRUECOLOR:
+                after = converted.get(state)
+                if after is None:
+                    after = converted[state] = _convert_state(state, profile)
+                state = after
+            result.append(before.diff_sequence(state, coalesce, minimize))
+            result.append(text)
+            before = state
+        result.append(before.diff_sequence(StyleState.EMPTY, coalesce, minimize))
+        return ''.join(result)
+
+    def to_iro(self, **options) -> Iro:
+        """
+        Make `Iro` painting the segments, to be put inside other `Iro`.
+        :param options: options of `Iro`
+        """
+        return Iro(*((*state.to_elements(), text) if not state.is_empty else text for text, state in self._segments),
+                   **options)
+
+    def __add__(self, other: Union["StyledText", str]) -> "StyledText":
+        if isinstance(other, str):
+            return StyledText((*self._segments, (other, StyleState.EMPTY)))
+        if isinstance(other, StyledText):
+            return StyledText((*self._segments, *other._segments))
+        return NotImplemented
+
+    def __radd__(self, other: str) -> "StyledText":
+        if isinstance(other, str):
+            return StyledText(((other, StyleState.EMPTY), *self._segments))
+        return NotImplemented
+
+    def __iter__(self) -> Iterator[Segment]:
+        return iter(self._segments)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, StyledText):
+            return NotImplemented
+        return self._segments == other._segments
+
+    def __hash__(self) -> int:
+        return hash(self._segments)
+
+    def __str__(self):
+        return self.paint()
+
+    def __repr__(self):
+        return 'StyledText(segments={})'.format(repr(self._segments))
+
+
+def _convert_state(state: StyleState, profile: Profile) -> StyleState:
+    converted = StyleState.EMPTY
+    for element in state.to_elements():
+        converted = converted.copy_with(profile.convert(element))
+    return converted
+
+
+def _wrap_line(segments: Tuple[Segment, ...], width: int) -> List[List[Segment]]:
+    lines: List[List[Segment]] = []
+    line: List[Segment] = []
+    line_width = 0
+    # whitespaces after the line and the word being read, waiting to be put
+    spaces: List[Segment] = []
+    spaces_width = 0
+    word: List[Segment] = []
+    word_width = 0
+
+    def put_word():
+        nonlocal line, line_width, spaces, spaces_width, word, word_width
+        if line_width + spaces_width + word_width <= width:
+            line.extend(spaces)
+            line.extend(word)
+            line_width += spaces_width + word_width
+        else:
+            if word_width > width and line_width + spaces_width + _char_width(word[0][0][0]) <= width:
+                # word longer than a line is started on the line as `textwrap` does
+                line.extend(spaces)
+                line_width += spaces_width
+            elif line:
+                lines.append(line)
+                line, line_width = [], 0
+            for text, state in word:
+                while text:
+                    head, head_width = _cut(text, width - line_width)
+                    if not head:
+                        if line:
+                            lines.append(line)
+                            line, line_width = [], 0
+                            continue
+                        # character wider than `width` takes the line by itself
+                        head, head_width = text[0], _char_width(text[0])
+                    line.append((head, state))
+                    line_width += head_width
+                    text = text[len(head):]
+        spaces, spaces_width = [], 0
+        word, word_width = [], 0
+
+    for text, state in segments:
+        for token in _TOKEN.findall(text):
+            if token[0].isspace():
+                if word:
+                    put_word()
+                # indent of the first line is kept
+                if line or not lines:
+                    spaces.append((token, state))
+                    spaces_width += display_width(token)
+            else:
+                word.append((token, state))
+                word_width += display_width(token)
+    if word:
+        put_word()
+    lines.append(line)
+    return lines
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import sys
+import time
+
+from .ansi import _parse
+from .iro import Iro
+from .layout import _char_width
+from .profile import Profile, detect_profile
+from .styles import StyleState
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import IO, Callable, List, Tuple, Union
+
+    # character with the combining marks after it, and its styles. second column of wide character is `''`
+    Cell = Tuple[str, StyleState]
+
+# unchanged cells between changed ones up to this are rewritten instead of moving the cursor over them
+_MAX_REWRITE_GAP = 4
+_ERASE_LINE = '\033[K'
+_HIDE_CURSOR = '\033[?25l'
+_SHOW_CURSOR = '\033[?25h'
+
+
+def _cells(line: str, state: StyleState) -> Tuple[List[Cell], StyleState]:
+    """
+    Split painted line into cells.
+    :return: cells and the styles at the end of the line
+    """
+    cells = []
+    runs, state = _parse(line, state)
+    for text, style in runs:
+        for char in text:
+            width = _char_width(char)
+            if not width and cells:
+                # combining mark is written with the character before it
+                last = len(cells) - 1 if cells[-1][0] else len(cells) - 2
+                cells[last] = (cells[last][0] + char, cells[last][1])
+                continue
+            cells.append((char, style))
+            if width == 2:
+                cells.append(('', style))
+    return cells, state
+
+
+class Live:
+    """
+    Region of lines redrawn in place, for spinners, progress bars and dashboards.
+    The cells of the previous frame are kept, and only the changed cells are written with cursor movements and
+    the shortest style changes. Frames are drawn at most `max_fps` times per second.
+    The cursor is expected to be at the start of an empty line when the region is drawn first.
+    """
+
+    def __init__(self, fp: Union[IO[str], None] = None, max_fps: float = 20, profile: Union[Profile, None] = None,
+                 interactive: Union[bool, None] = None, hide_cursor: bool = True,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param fp: output. `sys.stdout` if not given
+        :param max_fps: max number of frames drawn per second. `0` for no limit
+        :param profile: colors to be used. detected from `fp` if not given
+        :param interactive: whether `fp` is a terminal which moves cursor or not. if not, only the last frame is
+            written on `close`. detected from `fp` if not given
+        :param hide_cursor: whether to hide the cursor while the region is live or not
+        :param clock: function returning the current time in seconds
+        """
+        self.fp = fp if fp is not None else sys.stdout
+        self.interval = 1 / max_fps if max_fps else 0
+        if profile is None:
+            profile = detect_profile(self.fp)
+        self.profile = profile
+        if interactive is None:
+            isatty = getattr(self.fp, 'isatty', None)
+            interactive = bool(isatty and isatty())
+        self.interactive = interactive
+        self.hide_cursor = hide_cursor
+        self.clock = clock
+
+        self._pending: Union[Iro, str, None] = None
+        self._last_drawn: Union[float, None] = None
+        self._started = False
+        self._closed = False
+        # cells, and (painted line, styles at the start) of each line of the last frame
+        self._rows: List[List[Cell]] = []
+        self._keys: List[Tuple[str, StyleState]] = []
+        self._end_styles: List[StyleState] = []
+        # state of the terminal. cursor is at `_row` line of the region and `_column`
+        self._height = 1
+        self._row = 0
+        self._column = 0
+        self._style = StyleState.EMPTY
+
+    def update(self, content: Union[Iro, str], force: bool = False) -> bool:
+        """
+        Set the content of the region. It is drawn now if `1 / max_fps` seconds have passed since the last frame.
+        Otherwise, it is drawn by the next `update`, `refresh` or `close`.
+        :param content: content of the region. may contain newlines
+        :param force: whether to draw now regardless of `max_fps` or not
+        :return: whether the content is drawn or not
+        """
+        if self._closed:
+            raise ValueError('Live is already closed.')
+        self._pending = content
+        return self.refresh(force)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Draw the content waiting to be drawn, if `1 / max_fps` seconds have passed since the last frame.
+        :param force: whether to draw now regardless of `max_fps` or not
+        :return: whether the content is drawn or not
+        """
+        if self._pending is None or not self.interactive:
+            return False
+        now = self.clock()
+        if not force and self._last_drawn is not None and now - self._last_drawn < self.interval:
+            return False
+        content, self._pending = self._pending, None
+        self._last_drawn = now
+        self._write(self._draw(content))
+        return True
+
+    def close(self):
+        """
+        Draw the content waiting to be drawn, and move the cursor below the region.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if not self.interactive:
+            if self._pending is not None:
+                self._write(self._paint(self._pending) + '\n')
+            return
+
+        out = []
+        if self._pending is not None:
+            out.append(self._draw(self._pending))
+            self._pending = None
+        if not self._started:
+            # no frame is drawn, so the cursor is still at the start of the empty line
+            return
+        self._move(self._height - 1, self._column, out)
+        self._set_style(StyleState.EMPTY, out)
+        out.append('\r\n')
+        if self.hide_cursor:
+            out.append(_SHOW_CURSOR)
+        self._write(''.join(out))
+
+    def __enter__(self) -> "Live":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _paint(self, content: Union[Iro, str]) -> str:
+        if isinstance(content, Iro):
+            return content.paint(profile=self.profile)
+        return content
+
+    def _write(self, text: str):
+        if text:
+            self.fp.write(text)
+            flush = getattr(self.fp, 'flush', None)
+            if flush is not None:
+                flush()
+
+    def _draw(self, content: Union[Iro, str]) -> str:
+        """
+        Get the output to change the region from the last frame into `content`.
+        """
+        out = []
+        if not self._started:
+            self._started = True
+            if self.hide_cursor:
+                out.append(_HIDE_CURSOR)
+
+        rows, keys, end_styles = [], [], []
+        state = StyleState.EMPTY
+        for r, line in enumerate(self._paint(content).split('\n')):
+            key = (line, state)
+            if r < len(self._keys) and self._keys[r] == key:  # same line as the last frame
+                rows.append(self._rows[r])
+                state = self._end_styles[r]
+            else:
+                cells, state = _cells(line, state)
+                rows.append(cells)
+                self._draw_row(r, self._rows[r] if r < len(self._rows) else [], cells, out)
+            keys.append(key)
+            end_styles.append(state)
+
+        # lines of the last frame not in this frame are cleared
+        for r in range(len(rows), len(self._rows)):
+            if self._rows[r]:
+                self._draw_row(r, self._rows[r], [], out)
+
+        self._rows, self._keys, self._end_styles = rows, keys, end_styles
+        return ''.join(out)
+
+    def _draw_row(self, r: int, before: List[Cell], after: List[Cell], out: List[str]):
+        # ranges of changed cells, merging close ones
+        changes: List[List[int]] = []
+        for i, cell in enumerate(after):
+            if i < len(before) and before[i] == cell:
+                continue
+            if changes and i - changes[-1][1] <= _MAX_REWRITE_GAP:
+                changes[-1][1] = i + 1
+            else:
+                changes.append([i, i + 1])
+
+        for start, end in changes:
+            # wide characters are written from their first column
+            if after[start][0] == '' or (start < len(before) and before[start][0] == ''):
+                start -= 1
+            self._move(r, start, out)
+            for char, style in after[start:end]:
+                if char:
+                    self._set_style(style, out)
+                    out.append(char)
+                    self._column += _char_width(char[0])
+
+        if len(before) > len(after):
+            self._move(r, len(after), out)
+            self._set_style(StyleState.EMPTY, out)
+            out.append(_ERASE_LINE)
+
+    def _move(self, row: int, column: int, out: List[str]):
+        if row >= self._height:
+            # new lines are made by newline, which scrolls the terminal at the bottom
+            self._move(self._height - 1, self._column, out)
+            self._set_style(StyleState.EMPTY, out)
+            out.append('\r\n' * (row - self._height + 1))
+            self._height = row + 1
+            self._row, self._column = row, 0
+        elif row < self._row:
+            out.append('\033[{}A'.format(self._row - row))
+            self._row = row
+        elif row > self._row:
+            out.append('\033[{}B'.format(row - self._row))
+            self._row = row
+
+        if column != self._column:
+            out.append('\r' if column == 0 else '\033[{}G'.format(column + 1))
+            self._column = column
+
+    def _set_style(self, style: StyleState, out: List[str]):
+        if style != self._style:
+            out.append(self._style.diff_sequence(style, True, True))
+            self._style = style
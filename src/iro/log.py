@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import copy
+import logging
+import re
+import string
+from logging.handlers import QueueHandler
+
+from .iro import Iro
+from .profile import Profile
+from .styles import BGColor, FGColor, IroElement, Style
+from .template import Placeholder
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Callable, Dict, Iterable, List, Mapping, Tuple, Union
+
+DEFAULT_LEVEL_STYLES: Dict[int, Tuple[IroElement, ...]] = {
+    logging.DEBUG: (Style.DIM,),
+    logging.INFO: (FGColor.GREEN,),
+    logging.WARNING: (FGColor.YELLOW,),
+    logging.ERROR: (FGColor.RED,),
+    logging.CRITICAL: (Style.BOLD, FGColor.BRIGHT_WHITE, BGColor.RED),
+}
+
+_BASIC_FORMATS = {
+    '%': logging.BASIC_FORMAT,
+    '{': '{levelname}:{name}:{message}',
+    '$': '${levelname}:${name}:${message}',
+}
+# `%%` is matched first, so `%%(name)s` is `%` followed by a literal text as `%` formatting does
+_PERCENT_FIELD = re.compile(r'%%|%\((?P<name>\w+)\)[#0+ -]*(\*|\d+)?(\.(\*|\d+))?[diouxefgcrsa%]', re.I)
+
+
+def _parse_percent(fmt: str) -> List[Union[str, Tuple[str, Callable[[Mapping[str, Any]], str]]]]:
+    pieces = []
+    position = 0
+    for match in _PERCENT_FIELD.finditer(fmt):
+        pieces.append(fmt[position:match.start()])
+        if match.group('name') is None:
+            pieces.append('%')
+        else:
+            pieces.append((match.group('name'), match.group(0).__mod__))
+        position = match.end()
+    pieces.append(fmt[position:])
+    return pieces
+
+
+def _parse_str_format(fmt: str) -> List[Union[str, Tuple[str, Callable[[Mapping[str, Any]], str]]]]:
+    pieces = []
+    for literal, field_name, format_spec, conversion in string.Formatter().parse(fmt):
+        pieces.append(literal)
+        if field_name is not None:
+            field = '{' + field_name + ('!' + conversion if conversion else '') + (
+                ':' + format_spec if format_spec else '') + '}'
+            pieces.append((re.split(r'[.\[]', field_name, 1)[0], field.format_map))
+    return pieces
+
+
+def _parse_template(fmt: str) -> List[Union[str, Tuple[str, Callable[[Mapping[str, Any]], str]]]]:
+    pieces = []
+    position = 0
+    for match in string.Template.pattern.finditer(fmt):
+        pieces.append(fmt[position:match.start()])
+        name = match.group('named') or match.group('braced')
+        if name is None:  # `$$`, or `$` not followed by a name
+            pieces.append('$')
+        else:
+            pieces.append((name, lambda values, name=name: str(values[name])))
+        position = match.end()
+    pieces.append(fmt[position:])
+    return pieces
+
+
+_PARSERS = {'%': _parse_percent, '{': _parse_str_format, '$': _parse_template}
+
+
+class IroFormatter(logging.Formatter):
+    """
+    `logging.Formatter` painting fields of the format with styles.
+    The format is compiled into `Template` once for each level, so formatting a record only fills the fields,
+    without building `Iro` or `StyleState`.
+    """
+
+    def __init__(self, fmt: Union[str, None] = None, datefmt: Union[str, None] = None, style: str = '%',
+                 validate: bool = True, *, level_styles: Union[Mapping[int, Iterable[IroElement]], None] = None,
+                 level_fields: Iterable[str] = ('levelname',),
+                 field_styles: Union[Mapping[str, Iterable[IroElement]], None] = None,
+                 profile: Profile = Profile.TRUECOLOR):
+        """
+        :param fmt: same as `logging.Formatter`. `logging.BASIC_FORMAT` if not given
+        :param datefmt: same as `logging.Formatter`
+        :param style: same as `logging.Formatter`
+        :param validate: same as `logging.Formatter`
+        :param level_styles: styles of each level. levels not given use the styles of the closest lower level.
+            `DEFAULT_LEVEL_STYLES` if not given
+        :param level_fields: names of fields painted with `level_styles`
+        :param field_styles: styles of each field. applied inside `level_styles`
+        :param profile: colors to be used. unsupported colors are converted to the closest supported color
+        """
+        if style not in _PARSERS:
+            raise ValueError('Style must be one of: {}'.format(','.join(_PARSERS)))
+        if fmt is None:
+            fmt = _BASIC_FORMATS[style]
+        super().__init__(fmt, datefmt, style, validate)
+
+        if level_styles is None:
+            level_styles = DEFAULT_LEVEL_STYLES
+        self._level_styles = {level: tuple(styles) for level, styles in level_styles.items()}
+        self._level_fields = frozenset(level_fields)
+        self._field_styles = {name: tuple(styles) for name, styles in (field_styles or {}).items()}
+        self._profile = profile
+
+        self._pieces = _PARSERS[style](fmt)
+        self._fields: List[Callable[[Mapping[str, Any]], str]] = [piece[1] for piece in self._pieces
+                                                                  if isinstance(piece, tuple)]
+        # compiled parts and (index of part, index of field) for each level
+        self._compiled: Dict[int, Tuple[List[str], List[Tuple[int, int]]]] = {}
+
+    def _compile(self, levelno: int) -> Tuple[List[str], List[Tuple[int, int]]]:
+        levels = [level for level in self._level_styles if level <= levelno]
+        level_styles = self._level_styles[max(levels)] if levels else ()
+
+        values = []
+        fields = 0
+        for piece in self._pieces:
+            if isinstance(piece, str):
+                if piece:
+                    values.append(piece)
+                continue
+            name = piece[0]
+            field = [Placeholder(str(fields))]
+            fields += 1
+            if name in self._field_styles:
+                field = [*self._field_styles[name], field]
+            if name in self._level_fields:
+                field = [*level_styles, field]
+            values.append(field)
+        template = Iro(*values).compile(profile=self._profile)
+        return template._parts, [(index, int(name)) for index, name in template._slots]
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        compiled = self._compiled.get(record.levelno)
+        if compiled is None:
+            compiled = self._compiled[record.levelno] = self._compile(record.levelno)
+
+        template_parts, slots = compiled
+        values = record.__dict__
+        parts = template_parts.copy()
+        fields = self._fields
+        try:
+            for index, field in slots:
+                parts[index] = fields[field](values)
+        except KeyError as e:
+            raise ValueError('Formatting field not found in record: %s' % e)
+        return ''.join(parts)
+
+
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+class IroQueueHandler(QueueHandler):
+    """
+    `logging.handlers.QueueHandler` which leaves formatting to the handlers of `logging.handlers.QueueListener`.
+    Only the message is merged with the arguments at the call site, and records are painted in the thread of the
+    listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            # traceback can not be passed to other processes
+            if not record.exc_text:
+                record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
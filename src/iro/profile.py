@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import os
+import sys
+import weakref
+from enum import Enum
+
+from .styles import BGColor, Color256, ColorRGB, FGColor, IroElement, _color_distance
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, IO, Union
+
+
+class Profile(Enum):
+    """
+    Colors the output supports. Colors not supported are converted into the closest supported color.
+    """
+    TRUECOLOR = 'truecolor'
+    COLOR256 = '256'
+    COLOR16 = '16'
+    NONE = 'none'
+
+    def convert(self, element: IroElement) -> IroElement:
+        """
+        Get the element to be rendered with this profile.
+        :param element: element to convert
+        :return: `element` itself if supported. otherwise, the closest supported element
+        """
+        converted = _CONVERTED[self].get(element)
+        if converted is None:
+            converted = self._convert(element)
+            if len(_CONVERTED[self]) >= _CONVERTED_CACHE_SIZE:
+                _CONVERTED[self].clear()
+            _CONVERTED[self][element] = converted
+        return converted
+
+    def _convert(self, element: IroElement) -> IroElement:
+        if self is Profile.COLOR256:
+            if isinstance(element, ColorRGB):
+                return element.to_close_c256()
+        elif self is Profile.COLOR16:
+            if isinstance(element, ColorRGB):
+                return _to_color16(_close_color16_index((element.r, element.g, element.b)), element.bg)
+            if isinstance(element, Color256):
+                return _to_color16(_close_color16_index(Color256.color_map[element.color]), element.bg)
+        return element
+
+
+_CONVERTED_CACHE_SIZE = 4096
+_CONVERTED: Dict[Profile, Dict[IroElement, IroElement]] = {profile: {} for profile in Profile}
+_FG_COLORS = {color.value: color for color in FGColor}
+_BG_COLORS = {color.value: color for color in BGColor}
+
+
+def _close_color16_index(rgb) -> int:
+    color_map = Color256.color_map
+    return min(range(16), key=lambda i: _color_distance(color_map[i], *rgb))
+
+
+def _to_color16(index: int, bg: bool) -> Union[FGColor, BGColor]:
+    value = 30 + index if index < 8 else 90 + index - 8
+    if bg:
+        return _BG_COLORS[value + 10]
+    return _FG_COLORS[value]
+
+
+_detected = weakref.WeakKeyDictionary()
+
+
+def detect_profile(stream: Union[IO[str], None] = None) -> Profile:
+    """
+    Detect the profile of given stream from `NO_COLOR`, `TERM` and `COLORTERM`. The result is kept for each stream.
+    Streams which are not a terminal get `Profile.NONE`.
+    :param stream: output stream. `sys.stdout` if not given
+    :return: detected profile
+    """
+    if stream is None:
+        stream = sys.stdout
+    try:
+        return _detected[stream]
+    except (KeyError, TypeError):
+        pass
+
+    profile = _detect_profile(stream)
+    try:
+        _detected[stream] = profile
+    except TypeError:  # not weak referenceable
+        pass
+    return profile
+
+
+def _detect_profile(stream: IO[str]) -> Profile:
+    if os.environ.get('NO_COLOR'):
+        return Profile.NONE
+    isatty = getattr(stream, 'isatty', None)
+    try:
+        if isatty is None or not isatty():
+            return Profile.NONE
+    except ValueError:  # closed
+        return Profile.NONE
+
+    term = os.environ.get('TERM', '').lower()
+    if term == 'dumb':
+        return Profile.NONE
+    if os.environ.get('COLORTERM', '').lower() in ('truecolor', '24bit'):
+        return Profile.TRUECOLOR
+    if '256color' in term:
+        return Profile.COLOR256
+    if sys.platform == 'win32' and 'WT_SESSION' in os.environ:  # Windows Terminal
+        return Profile.TRUECOLOR
+    return Profile.COLOR16
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import re
+import time
+
+from . import iro as _iro
+from .iro import Iro, _Frame
+from .styles import StyleState
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Callable, Dict, Iterator, Tuple, Union
+
+_ESCAPE_SEQUENCE = re.compile('\033\\[[0-9;]*m')
+
+
+class RenderStats:
+    """
+    Counters of rendering, collected while instrumentation is enabled with `enable_stats`.
+    Characters are counted instead of bytes. Escape sequences are ASCII, so they are the same in UTF-8.
+    `nodes`, `cache_hits` and `cache_misses` are not counted with `Profile.NONE`, which skips styles.
+    """
+    __slots__ = ('renders', 'nodes', 'copy_with_calls', 'diff_sequence_calls', 'cache_hits', 'cache_misses',
+                 'escape_chars', 'text_chars', 'seconds')
+
+    def __init__(self):
+        self.renders = 0
+        self.nodes = 0
+        self.copy_with_calls = 0
+        self.diff_sequence_calls = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.escape_chars = 0
+        self.text_chars = 0
+        self.seconds = 0.0
+
+    @property
+    def cache_hit_rate(self) -> float:
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> Dict[str, Union[int, float]]:
+        result = {name: getattr(self, name) for name in self.__slots__}
+        result['cache_hit_rate'] = self.cache_hit_rate
+        return result
+
+    def reset(self):
+        self.__init__()
+
+    def copy(self) -> "RenderStats":
+        stats = RenderStats()
+        for name in self.__slots__:
+            setattr(stats, name, getattr(self, name))
+        return stats
+
+    def __sub__(self, other: "RenderStats") -> "RenderStats":
+        stats = RenderStats()
+        for name in self.__slots__:
+            setattr(stats, name, getattr(self, name) - getattr(other, name))
+        return stats
+
+    def __repr__(self):
+        return 'RenderStats({})'.format(', '.join('{}={}'.format(name, getattr(self, name))
+                                                  for name in self.__slots__))
+
+
+_stats = RenderStats()
+_callback: Union[Callable[[RenderStats], None], None] = None
+# original functions replaced while enabled. empty if disabled
+_originals = {}
+
+
+def enable_stats(callback: Union[Callable[[RenderStats], None], None] = None) -> RenderStats:
+    """
+    Start collecting counters of rendering.
+    Counting functions are swapped in only while enabled, so disabled instrumentation costs nothing.
+    :param callback: called after each `Iro.paint`, `Iro.iter_paint` (and `Iro.write_to`), `Iro.paint_into`,
+        `Iro.iter_segments` (and `HtmlWriter.write` of `Iro`), `Iro.paint_parallel` and `Iro.compile` with the counters
+        of that render. renders stopped before the end are counted up to there. counters of the worker processes of
+        `Iro.paint_parallel` are not collected
+    :return: counters accumulated over all renders. same object is returned until `disable_stats`
+    """
+    global _callback
+    _callback = callback
+    if _originals:
+        return _stats
+
+    _stats.reset()
+    _originals.update({
+        (StyleState, 'copy_with'): StyleState.copy_with,
+        (StyleState, 'diff_sequence'): StyleState.diff_sequence,
+        (Iro, 'paint'): Iro.paint,
+        (Iro, 'iter_paint'): Iro.iter_paint,
+        (Iro, 'paint_into'): Iro.paint_into,
+        (Iro, 'iter_segments'): Iro.iter_segments,
+        (Iro, 'paint_parallel'): Iro.paint_parallel,
+        (Iro, 'compile'): Iro.compile,
+        (_iro, '_enter'): _iro._enter,
+    })
+    StyleState.copy_with = _counting_copy_with
+    StyleState.diff_sequence = _counting_diff_sequence
+    Iro.paint = _measured_paint
+    Iro.iter_paint = _measured_iter_paint
+    Iro.paint_into = _measured_paint_into
+    Iro.iter_segments = _measured_iter_segments
+    Iro.paint_parallel = _measured_paint_parallel
+    Iro.compile = _measured_compile
+    _iro._enter = _counting_enter
+    return _stats
+
+
+def disable_stats() -> RenderStats:
+    """
+    Stop collecting counters of rendering, and restore the functions.
+    :return: counters accumulated while enabled
+    """
+    global _callback
+    for (owner, name), original in _originals.items():
+        setattr(owner, name, original)
+    _originals.clear()
+    _callback = None
+    return _stats
+
+
+def stats_enabled() -> bool:
+    return bool(_originals)
+
+
+def _counting_copy_with(self, style):
+    _stats.copy_with_calls += 1
+    return _originals[StyleState, 'copy_with'](self, style)
+
+
+def _counting_diff_sequence(self, after, coalesce=False, minimize=False):
+    _stats.diff_sequence_calls += 1
+    return _originals[StyleState, 'diff_sequence'](self, after, coalesce, minimize)
+
+
+def _counting_enter(owner, value, values, given_style, depth, result, store, profile):
+    entered = _originals[_iro, '_enter'](owner, value, values, given_style, depth, result, store, profile)
+    _stats.nodes += 1
+    if isinstance(value, Iro) and value._cacheable:
+        if isinstance(entered, _Frame):
+            _stats.cache_misses += 1
+        else:
+            _stats.cache_hits += 1
+    return entered
+
+
+def _count_output(painted: str):
+    escape_chars = sum(map(len, _ESCAPE_SEQUENCE.findall(painted)))
+    _stats.escape_chars += escape_chars
+    _stats.text_chars += len(painted) - escape_chars
+
+
+def _finish(before: RenderStats, elapsed: float):
+    _stats.renders += 1
+    _stats.seconds += elapsed
+    if _callback is not None:
+        _callback(_stats - before)
+
+
+def _measured_paint(self, *args, **kwargs) -> str:
+    before = _stats.copy()
+    start = time.perf_counter()
+    painted = _originals[Iro, 'paint'](self, *args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _count_output(painted)
+    _finish(before, elapsed)
+    return painted
+
+
+def _measured_paint_parallel(self, *args, **kwargs) -> str:
+    before = _stats.copy()
+    start = time.perf_counter()
+    painted = _originals[Iro, 'paint_parallel'](self, *args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _count_output(painted)
+    _finish(before, elapsed)
+    return painted
+
+
+def _measured_iter_paint(self, *args, **kwargs) -> Iterator[str]:
+    before = _stats.copy()
+    elapsed = 0.0
+    pieces = _originals[Iro, 'iter_paint'](self, *args, **kwargs)
+    # time taken by the consumer is excluded. recorded even if the consumer stops early
+    try:
+        while True:
+            start = time.perf_counter()
+            piece = next(pieces, None)
+            elapsed += time.perf_counter() - start
+            if piece is None:
+                break
+            _count_output(piece)
+            yield piece
+    finally:
+        _finish(before, elapsed)
+
+
+def _measured_iter_segments(self, *args, **kwargs) -> Iterator[Tuple[str, StyleState]]:
+    before = _stats.copy()
+    elapsed = 0.0
+    segments = _originals[Iro, 'iter_segments'](self, *args, **kwargs)
+    # no sequence is painted, so only texts are counted
+    try:
+        while True:
+            start = time.perf_counter()
+            segment = next(segments, None)
+            elapsed += time.perf_counter() - start
+            if segment is None:
+                break
+            _stats.text_chars += len(segment[0])
+            yield segment
+    finally:
+        _finish(before, elapsed)
+
+
+def _measured_paint_into(self, buffer, offset=None, *args, **kwargs) -> int:
+    before = _stats.copy()
+    start = len(buffer) if offset is None and isinstance(buffer, bytearray) else offset or 0
+    started = time.perf_counter()
+    written = _originals[Iro, 'paint_into'](self, buffer, offset, *args, **kwargs)
+    elapsed = time.perf_counter() - started
+    # written bytes are decoded to count characters, same as the other renders
+    encoding = args[2] if len(args) > 2 else kwargs.get('encoding', 'utf-8')
+    with memoryview(buffer) as view, view.cast('B') as data:
+        _count_output(bytes(data[start:start + written]).decode(encoding))
+    _finish(before, elapsed)
+    return written
+
+
+def _measured_compile(self, *args, **kwargs):
+    before = _stats.copy()
+    start = time.perf_counter()
+    template = _originals[Iro, 'compile'](self, *args, **kwargs)
+    elapsed = time.perf_counter() - start
+    for part in template._parts:
+        _count_output(part)
+    _finish(before, elapsed)
+    return template
@@ -1,13 +1,21 @@
-import dataclasses
-import math
+from __future__ import annotations
+
+import itertools
+import weakref
 from abc import abstractmethod
-from dataclasses import dataclass
+from bisect import bisect_left
 from enum import Enum
-from typing import Union
+from functools import lru_cache
 from warnings import warn
 
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Iterable, Sequence, Tuple, Union
+
 
 class IroElement:
+    __slots__ = ()
+
     @property
     @abstractmethod
     def open(self) -> str:
@@ -19,8 +27,23 @@ class IroElement:
         raise NotImplementedError
 
 
+def _immutable(self, name: str, value=None):
+    raise AttributeError('{} is immutable.'.format(type(self).__name__))
+
+
 class Font(IroElement):
-    def __init__(self, font_number: int):
+    """
+    Immutable font. Equal fonts are the same object, and the sequences are made once.
+    """
+    __slots__ = ('font_number', 'open', 'close')
+
+    _instances: Dict[Tuple[type, int], "Font"] = {}
+
+    def __new__(cls, font_number: int):
+        font = cls._instances.get((cls, font_number))
+        if font is not None:
+            return font
+
         if not isinstance(font_number, int):
             try:
                 font_number = int(font_number)
@@ -30,15 +53,20 @@ class Font(IroElement):
                 warn('given `font_number` is not instance of int. Conversion failed.')
         if not 0 <= font_number <= 10:
             raise ValueError('`font_number` must be between 0 and 10. given: {}'.format(font_number))
-        self.font_number = font_number
+        font = cls._instances.get((cls, font_number))
+        if font is None:
+            font = object.__new__(cls)
+            set_attr = object.__setattr__
+            set_attr(font, 'font_number', font_number)
+            set_attr(font, 'open', '\033[{}m'.format(font_number + 10))
+            set_attr(font, 'close', '\033[10m')
+            cls._instances[cls, font_number] = font
+        return font
 
-    @property
-    def open(self):
-        return '\033[{}m'.format(self.font_number + 10)
+    __setattr__ = __delattr__ = _immutable
 
-    @property
-    def close(self):
-        return '\033[10m'
+    def __reduce__(self):
+        return type(self), (self.font_number,)
 
     def __repr__(self):
         return 'Font(font_number={})'.format(self.font_number)
@@ -78,98 +106,82 @@ class Style(IroElement, Enum):
     OFF_FG_COLOR = (-1, -14)
     OFF_BG_COLOR = (-1, -15)
 
+    def __init__(self, open_parameter: int, close_parameter: int):
+        # sequences are made once. OFF styles have none
+        self._open = None if open_parameter == -1 else '\033[{}m'.format(open_parameter)
+        self._close = None if open_parameter == -1 else '\033[{}m'.format(close_parameter)
+
     @property
     def open(self):
-        if self.value[0] == -1:
+        if self._open is None:
             raise ValueError('Cannot open with OFF style. Used style: {}'.format(self.name))
-        return '\033[{}m'.format(self.value[0])
+        return self._open
 
     @property
     def close(self):
-        if self.value[0] == -1:
+        if self._close is None:
             raise ValueError('Cannot close with OFF style. Used style: {}'.format(self.name))
-        return '\033[{}m'.format(self.value[1])
+        return self._close
+
+
+# colors of 0-15. these vary by terminal, so the ones of xterm are used
+_SYSTEM_COLORS = ((0x00, 0x00, 0x00), (0x80, 0x00, 0x00), (0x00, 0x80, 0x00), (0x80, 0x80, 0x00),
+                  (0x00, 0x00, 0x80), (0x80, 0x00, 0x80), (0x00, 0x80, 0x80), (0xc0, 0xc0, 0xc0),
+                  (0x80, 0x80, 0x80), (0xff, 0x00, 0x00), (0x00, 0xff, 0x00), (0xff, 0xff, 0x00),
+                  (0x00, 0x00, 0xff), (0xff, 0x00, 0xff), (0x00, 0xff, 0xff), (0xff, 0xff, 0xff))
+# levels of each channel in the 6x6x6 color cube (16-231)
+_CUBE_LEVELS = (0x00, 0x5f, 0x87, 0xaf, 0xd7, 0xff)
+# channel values up to which each level is the closest. lower level wins on tie
+_CUBE_THRESHOLDS = (47, 115, 155, 195, 235)
+
+
+class _Palette:
+    """
+    `Color256.color_map`, which maps color number to (r, g, b). Generated on first access.
+    """
+
+    def __get__(self, instance, owner) -> Dict[int, Tuple[int, int, int]]:
+        color_map = dict(enumerate(_SYSTEM_COLORS))
+        for r, g, b in itertools.product(_CUBE_LEVELS, repeat=3):
+            color_map[len(color_map)] = (r, g, b)
+        for gray in range(8, 248, 10):
+            color_map[len(color_map)] = (gray, gray, gray)
+        owner.color_map = color_map
+        return color_map
 
 
 class Color256(IroElement):
-    color_map = {0: (0x00, 0x00, 0x00), 1: (0x80, 0x00, 0x00), 2: (0x00, 0x80, 0x00), 3: (0x80, 0x80, 0x00),
-                 4: (0x00, 0x00, 0x80), 5: (0x80, 0x00, 0x80), 6: (0x00, 0x80, 0x80), 7: (0xc0, 0xc0, 0xc0),
-                 8: (0x80, 0x80, 0x80), 9: (0xff, 0x00, 0x00), 10: (0x00, 0xff, 0x00), 11: (0xff, 0xff, 0x00),
-                 12: (0x00, 0x00, 0xff), 13: (0xff, 0x00, 0xff), 14: (0x00, 0xff, 0xff), 15: (0xff, 0xff, 0xff),
-                 16: (0x00, 0x00, 0x00), 17: (0x00, 0x00, 0x5f), 18: (0x00, 0x00, 0x87), 19: (0x00, 0x00, 0xaf),
-                 20: (0x00, 0x00, 0xd7), 21: (0x00, 0x00, 0xff), 22: (0x00, 0x5f, 0x00), 23: (0x00, 0x5f, 0x5f),
-                 24: (0x00, 0x5f, 0x87), 25: (0x00, 0x5f, 0xaf), 26: (0x00, 0x5f, 0xd7), 27: (0x00, 0x5f, 0xff),
-                 28: (0x00, 0x87, 0x00), 29: (0x00, 0x87, 0x5f), 30: (0x00, 0x87, 0x87), 31: (0x00, 0x87, 0xaf),
-                 32: (0x00, 0x87, 0xd7), 33: (0x00, 0x87, 0xff), 34: (0x00, 0xaf, 0x00), 35: (0x00, 0xaf, 0x5f),
-                 36: (0x00, 0xaf, 0x87), 37: (0x00, 0xaf, 0xaf), 38: (0x00, 0xaf, 0xd7), 39: (0x00, 0xaf, 0xff),
-                 40: (0x00, 0xd7, 0x00), 41: (0x00, 0xd7, 0x5f), 42: (0x00, 0xd7, 0x87), 43: (0x00, 0xd7, 0xaf),
-                 44: (0x00, 0xd7, 0xd7), 45: (0x00, 0xd7, 0xff), 46: (0x00, 0xff, 0x00), 47: (0x00, 0xff, 0x5f),
-                 48: (0x00, 0xff, 0x87), 49: (0x00, 0xff, 0xaf), 50: (0x00, 0xff, 0xd7), 51: (0x00, 0xff, 0xff),
-                 52: (0x5f, 0x00, 0x00), 53: (0x5f, 0x00, 0x5f), 54: (0x5f, 0x00, 0x87), 55: (0x5f, 0x00, 0xaf),
-                 56: (0x5f, 0x00, 0xd7), 57: (0x5f, 0x00, 0xff), 58: (0x5f, 0x5f, 0x00), 59: (0x5f, 0x5f, 0x5f),
-                 60: (0x5f, 0x5f, 0x87), 61: (0x5f, 0x5f, 0xaf), 62: (0x5f, 0x5f, 0xd7), 63: (0x5f, 0x5f, 0xff),
-                 64: (0x5f, 0x87, 0x00), 65: (0x5f, 0x87, 0x5f), 66: (0x5f, 0x87, 0x87), 67: (0x5f, 0x87, 0xaf),
-                 68: (0x5f, 0x87, 0xd7), 69: (0x5f, 0x87, 0xff), 70: (0x5f, 0xaf, 0x00), 71: (0x5f, 0xaf, 0x5f),
-                 72: (0x5f, 0xaf, 0x87), 73: (0x5f, 0xaf, 0xaf), 74: (0x5f, 0xaf, 0xd7), 75: (0x5f, 0xaf, 0xff),
-                 76: (0x5f, 0xd7, 0x00), 77: (0x5f, 0xd7, 0x5f), 78: (0x5f, 0xd7, 0x87), 79: (0x5f, 0xd7, 0xaf),
-                 80: (0x5f, 0xd7, 0xd7), 81: (0x5f, 0xd7, 0xff), 82: (0x5f, 0xff, 0x00), 83: (0x5f, 0xff, 0x5f),
-                 84: (0x5f, 0xff, 0x87), 85: (0x5f, 0xff, 0xaf), 86: (0x5f, 0xff, 0xd7), 87: (0x5f, 0xff, 0xff),
-                 88: (0x87, 0x00, 0x00), 89: (0x87, 0x00, 0x5f), 90: (0x87, 0x00, 0x87), 91: (0x87, 0x00, 0xaf),
-                 92: (0x87, 0x00, 0xd7), 93: (0x87, 0x00, 0xff), 94: (0x87, 0x5f, 0x00), 95: (0x87, 0x5f, 0x5f),
-                 96: (0x87, 0x5f, 0x87), 97: (0x87, 0x5f, 0xaf), 98: (0x87, 0x5f, 0xd7), 99: (0x87, 0x5f, 0xff),
-                 100: (0x87, 0x87, 0x00), 101: (0x87, 0x87, 0x5f), 102: (0x87, 0x87, 0x87), 103: (0x87, 0x87, 0xaf),
-                 104: (0x87, 0x87, 0xd7), 105: (0x87, 0x87, 0xff), 106: (0x87, 0xaf, 0x00), 107: (0x87, 0xaf, 0x5f),
-                 108: (0x87, 0xaf, 0x87), 109: (0x87, 0xaf, 0xaf), 110: (0x87, 0xaf, 0xd7), 111: (0x87, 0xaf, 0xff),
-                 112: (0x87, 0xd7, 0x00), 113: (0x87, 0xd7, 0x5f), 114: (0x87, 0xd7, 0x87), 115: (0x87, 0xd7, 0xaf),
-                 116: (0x87, 0xd7, 0xd7), 117: (0x87, 0xd7, 0xff), 118: (0x87, 0xff, 0x00), 119: (0x87, 0xff, 0x5f),
-                 120: (0x87, 0xff, 0x87), 121: (0x87, 0xff, 0xaf), 122: (0x87, 0xff, 0xd7), 123: (0x87, 0xff, 0xff),
-                 124: (0xaf, 0x00, 0x00), 125: (0xaf, 0x00, 0x5f), 126: (0xaf, 0x00, 0x87), 127: (0xaf, 0x00, 0xaf),
-                 128: (0xaf, 0x00, 0xd7), 129: (0xaf, 0x00, 0xff), 130: (0xaf, 0x5f, 0x00), 131: (0xaf, 0x5f, 0x5f),
-                 132: (0xaf, 0x5f, 0x87), 133: (0xaf, 0x5f, 0xaf), 134: (0xaf, 0x5f, 0xd7), 135: (0xaf, 0x5f, 0xff),
-                 136: (0xaf, 0x87, 0x00), 137: (0xaf, 0x87, 0x5f), 138: (0xaf, 0x87, 0x87), 139: (0xaf, 0x87, 0xaf),
-                 140: (0xaf, 0x87, 0xd7), 141: (0xaf, 0x87, 0xff), 142: (0xaf, 0xaf, 0x00), 143: (0xaf, 0xaf, 0x5f),
-                 144: (0xaf, 0xaf, 0x87), 145: (0xaf, 0xaf, 0xaf), 146: (0xaf, 0xaf, 0xd7), 147: (0xaf, 0xaf, 0xff),
-                 148: (0xaf, 0xd7, 0x00), 149: (0xaf, 0xd7, 0x5f), 150: (0xaf, 0xd7, 0x87), 151: (0xaf, 0xd7, 0xaf),
-                 152: (0xaf, 0xd7, 0xd7), 153: (0xaf, 0xd7, 0xff), 154: (0xaf, 0xff, 0x00), 155: (0xaf, 0xff, 0x5f),
-                 156: (0xaf, 0xff, 0x87), 157: (0xaf, 0xff, 0xaf), 158: (0xaf, 0xff, 0xd7), 159: (0xaf, 0xff, 0xff),
-                 160: (0xd7, 0x00, 0x00), 161: (0xd7, 0x00, 0x5f), 162: (0xd7, 0x00, 0x87), 163: (0xd7, 0x00, 0xaf),
-                 164: (0xd7, 0x00, 0xd7), 165: (0xd7, 0x00, 0xff), 166: (0xd7, 0x5f, 0x00), 167: (0xd7, 0x5f, 0x5f),
-                 168: (0xd7, 0x5f, 0x87), 169: (0xd7, 0x5f, 0xaf), 170: (0xd7, 0x5f, 0xd7), 171: (0xd7, 0x5f, 0xff),
-                 172: (0xd7, 0x87, 0x00), 173: (0xd7, 0x87, 0x5f), 174: (0xd7, 0x87, 0x87), 175: (0xd7, 0x87, 0xaf),
-                 176: (0xd7, 0x87, 0xd7), 177: (0xd7, 0x87, 0xff), 178: (0xd7, 0xaf, 0x00), 179: (0xd7, 0xaf, 0x5f),
-                 180: (0xd7, 0xaf, 0x87), 181: (0xd7, 0xaf, 0xaf), 182: (0xd7, 0xaf, 0xd7), 183: (0xd7, 0xaf, 0xff),
-                 184: (0xd7, 0xd7, 0x00), 185: (0xd7, 0xd7, 0x5f), 186: (0xd7, 0xd7, 0x87), 187: (0xd7, 0xd7, 0xaf),
-                 188: (0xd7, 0xd7, 0xd7), 189: (0xd7, 0xd7, 0xff), 190: (0xd7, 0xff, 0x00), 191: (0xd7, 0xff, 0x5f),
-                 192: (0xd7, 0xff, 0x87), 193: (0xd7, 0xff, 0xaf), 194: (0xd7, 0xff, 0xd7), 195: (0xd7, 0xff, 0xff),
-                 196: (0xff, 0x00, 0x00), 197: (0xff, 0x00, 0x5f), 198: (0xff, 0x00, 0x87), 199: (0xff, 0x00, 0xaf),
-                 200: (0xff, 0x00, 0xd7), 201: (0xff, 0x00, 0xff), 202: (0xff, 0x5f, 0x00), 203: (0xff, 0x5f, 0x5f),
-                 204: (0xff, 0x5f, 0x87), 205: (0xff, 0x5f, 0xaf), 206: (0xff, 0x5f, 0xd7), 207: (0xff, 0x5f, 0xff),
-                 208: (0xff, 0x87, 0x00), 209: (0xff, 0x87, 0x5f), 210: (0xff, 0x87, 0x87), 211: (0xff, 0x87, 0xaf),
-                 212: (0xff, 0x87, 0xd7), 213: (0xff, 0x87, 0xff), 214: (0xff, 0xaf, 0x00), 215: (0xff, 0xaf, 0x5f),
-                 216: (0xff, 0xaf, 0x87), 217: (0xff, 0xaf, 0xaf), 218: (0xff, 0xaf, 0xd7), 219: (0xff, 0xaf, 0xff),
-                 220: (0xff, 0xd7, 0x00), 221: (0xff, 0xd7, 0x5f), 222: (0xff, 0xd7, 0x87), 223: (0xff, 0xd7, 0xaf),
-                 224: (0xff, 0xd7, 0xd7), 225: (0xff, 0xd7, 0xff), 226: (0xff, 0xff, 0x00), 227: (0xff, 0xff, 0x5f),
-                 228: (0xff, 0xff, 0x87), 229: (0xff, 0xff, 0xaf), 230: (0xff, 0xff, 0xd7), 231: (0xff, 0xff, 0xff),
-                 232: (0x08, 0x08, 0x08), 233: (0x12, 0x12, 0x12), 234: (0x1c, 0x1c, 0x1c), 235: (0x26, 0x26, 0x26),
-                 236: (0x30, 0x30, 0x30), 237: (0x3a, 0x3a, 0x3a), 238: (0x44, 0x44, 0x44), 239: (0x4e, 0x4e, 0x4e),
-                 240: (0x58, 0x58, 0x58), 241: (0x62, 0x62, 0x62), 242: (0x6c, 0x6c, 0x6c), 243: (0x76, 0x76, 0x76),
-                 244: (0x80, 0x80, 0x80), 245: (0x8a, 0x8a, 0x8a), 246: (0x94, 0x94, 0x94), 247: (0x9e, 0x9e, 0x9e),
-                 248: (0xa8, 0xa8, 0xa8), 249: (0xb2, 0xb2, 0xb2), 250: (0xbc, 0xbc, 0xbc), 251: (0xc6, 0xc6, 0xc6),
-                 252: (0xd0, 0xd0, 0xd0), 253: (0xda, 0xda, 0xda), 254: (0xe4, 0xe4, 0xe4), 255: (0xee, 0xee, 0xee)}
+    """
+    Immutable color of 256 colors. Equal colors are the same object, and the sequences are made once.
+    """
+    __slots__ = ('color', 'bg', 'open', 'close')
 
-    @property
-    def open(self):
-        return '\033[{}8;5;{}m'.format(4 if self.bg else 3, self.color)
+    color_map = _Palette()
+    _instances: Dict[Tuple[type, int, bool], "Color256"] = {}
 
-    @property
-    def close(self):
-        return '\033[{}9m'.format(4 if self.bg else 3)
+    def __new__(cls, color: int, bg=False):
+        instance = cls._instances.get((cls, color, bg))
+        if instance is not None:
+            return instance
 
-    def __init__(self, color: int, bg=False):
         if not 0 <= color <= 255:
             raise ValueError("`color` must be between 0 and 255. given: {}".format(color))
-        self.color = color
-        self.bg = bg
+        bg = bool(bg)
+        instance = cls._instances.get((cls, color, bg))
+        if instance is None:
+            instance = object.__new__(cls)
+            set_attr = object.__setattr__
+            set_attr(instance, 'color', color)
+            set_attr(instance, 'bg', bg)
+            set_attr(instance, 'open', '\033[{}8;5;{}m'.format(4 if bg else 3, color))
+            set_attr(instance, 'close', '\033[{}9m'.format(4 if bg else 3))
+            cls._instances[cls, color, bg] = instance
+        return instance
+
+    __setattr__ = __delattr__ = _immutable
+
+    def __reduce__(self):
+        return type(self), (self.color, self.bg)
 
     def __repr__(self):
         return 'Color256(color={}, value="#{:02x}{:02x}{:02x}", bg={})'.format(self.color,
@@ -179,15 +191,83 @@ class Color256(IroElement):
                                                                                self.bg)
 
 
+
+def _color_distance(rgb, r: int, g: int, b: int) -> int:
+    # squared version of the distance `ColorRGB.to_close_c256` has always used
+    return 2 * (rgb[0] - r) ** 2 + 4 * (rgb[1] - g) ** 2 + 3 * (rgb[2] - b) ** 2
+
+
+@lru_cache(maxsize=4096)
+def _close_c256_index(r: int, g: int, b: int) -> int:
+    """
+    Index of `Color256` closest to given rgb.
+    Instead of scanning all 256 colors, only the 16 system colors, the closest color in the cube and
+    the closest gray are compared. Since the distance is a weighted sum of each channel,
+    the closest cube color is made of the closest level of each channel,
+    and the closest gray is one of the two grays around the weighted mean.
+    Ties are resolved to the lower index, same as the linear scan.
+    """
+    index = 0
+    min_diff = _color_distance(_SYSTEM_COLORS[0], r, g, b)
+    for i in range(1, 16):
+        diff = _color_distance(_SYSTEM_COLORS[i], r, g, b)
+        if diff < min_diff:
+            index, min_diff = i, diff
+
+    r_level, g_level, b_level = (bisect_left(_CUBE_THRESHOLDS, r), bisect_left(_CUBE_THRESHOLDS, g),
+                                 bisect_left(_CUBE_THRESHOLDS, b))
+    diff = _color_distance((_CUBE_LEVELS[r_level], _CUBE_LEVELS[g_level], _CUBE_LEVELS[b_level]), r, g, b)
+    if diff < min_diff:
+        index, min_diff = 16 + 36 * r_level + 6 * g_level + b_level, diff
+
+    # gray of 232 + k is 8 + 10k. distance is minimized at (2r + 4g + 3b) / 9
+    gray = min(max((2 * r + 4 * g + 3 * b - 72) // 90, 0), 23)
+    for k in (gray, gray + 1) if gray < 23 else (gray,):
+        value = 8 + 10 * k
+        diff = _color_distance((value, value, value), r, g, b)
+        if diff < min_diff:
+            index, min_diff = 232 + k, diff
+    return index
+
+
 class ColorRGB(IroElement):
-    def __init__(self, r: int, g: int, b: int, bg: bool = False):
-        self.r = round(r)
-        self.g = round(g)
-        self.b = round(b)
-        self.bg = bg
-        if not 0 <= self.r <= 255 or not 0 <= self.g <= 255 or not 0 <= self.b <= 255:
+    """
+    Immutable 24-bit color. Equal colors are the same object while any of them is alive, so a grid of many cells
+    holds only as many colors as it has distinct ones. The sequences are made once.
+    """
+    __slots__ = ('r', 'g', 'b', 'bg', 'open', 'close', '__weakref__')
+
+    # there are too many colors to keep all of them
+    _instances: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+    def __new__(cls, r: int, g: int, b: int, bg: bool = False):
+        instance = cls._instances.get((cls, r, g, b, bg))
+        if instance is not None:
+            return instance
+
+        rounded = round(r), round(g), round(b)
+        if not 0 <= rounded[0] <= 255 or not 0 <= rounded[1] <= 255 or not 0 <= rounded[2] <= 255:
             raise ValueError(
                 'Given number is invalid. must be between 0 and 255. given: r={}, g={}, b={}'.format(r, g, b))
+        bg = bool(bg)
+        key = (cls, *rounded, bg)
+        instance = cls._instances.get(key)
+        if instance is None:
+            instance = object.__new__(cls)
+            set_attr = object.__setattr__
+            set_attr(instance, 'r', rounded[0])
+            set_attr(instance, 'g', rounded[1])
+            set_attr(instance, 'b', rounded[2])
+            set_attr(instance, 'bg', bg)
+            set_attr(instance, 'open', '\033[{}8;2;{};{};{}m'.format(4 if bg else 3, *rounded))
+            set_attr(instance, 'close', '\033[{}9m'.format(4 if bg else 3))
+            cls._instances[key] = instance
+        return instance
+
+    __setattr__ = __delattr__ = _immutable
+
+    def __reduce__(self):
+        return type(self), (self.r, self.g, self.b, self.bg)
 
     @classmethod
     def from_color_code(cls, color_code: str, bg: bool = False):
@@ -198,22 +278,30 @@ class ColorRGB(IroElement):
         return ColorRGB(r, g, b, bg)
 
     def to_close_c256(self) -> Color256:
-        min_diff = float('inf')
-        color = None
-        for i, v in Color256.color_map.items():
-            diff = math.sqrt(2 * (v[0] - self.r) ** 2 + 4 * (v[1] - self.g) ** 2 + 3 * (v[2] - self.b) ** 2)
-            if diff < min_diff:
-                min_diff = diff
-                color = i
-        return Color256(color, self.bg)
-
-    @property
-    def open(self):
-        return '\033[{}8;2;{};{};{}m'.format(4 if self.bg else 3, self.r, self.g, self.b)
-
-    @property
-    def close(self):
-        return '\033[{}9m'.format(4 if self.bg else 3)
+        return Color256(_close_c256_index(self.r, self.g, self.b), self.bg)
+
+    @staticmethod
+    def close_c256_indices(colors: Union[Iterable[Union["ColorRGB", Sequence[int]]], bytes, bytearray, memoryview]
+                           ) -> bytearray:
+        """
+        Convert many colors to the index of closest `Color256` at once.
+        :param colors: `ColorRGB`s, `(r, g, b)`s, or bytes-like object of packed r, g, b values
+        :return: index of `Color256` for each color
+        """
+        if isinstance(colors, (bytes, bytearray, memoryview)):
+            colors = memoryview(colors).cast('B')
+            if len(colors) % 3:
+                raise ValueError('length of `colors` must be multiple of 3. given: {}'.format(len(colors)))
+            colors = zip(colors[0::3], colors[1::3], colors[2::3])
+
+            return bytearray(_close_c256_index(r, g, b) for r, g, b in colors)
+
+        result = bytearray()
+        for color in colors:
+            if not isinstance(color, ColorRGB):
+                color = ColorRGB(*color)
+            result.append(_close_c256_index(color.r, color.g, color.b))
+        return result
 
     def __repr__(self):
         return 'ColorRGB(r={}, g={}, b={}, bg={})'.format(self.r, self.g, self.b, self.bg)
@@ -238,9 +326,12 @@ class FGColor(IroElement, Enum):
     BRIGHT_CYAN = 96
     BRIGHT_WHITE = 97
 
+    def __init__(self, parameter: int):
+        self._open = '\033[{}m'.format(parameter)
+
     @property
     def open(self):
-        return '\033[{}m'.format(self.value)
+        return self._open
 
     @property
     def close(self):
@@ -266,9 +357,12 @@ class BGColor(IroElement, Enum):
     BRIGHT_CYAN = 106
     BRIGHT_WHITE = 107
 
+    def __init__(self, parameter: int):
+        self._open = '\033[{}m'.format(parameter)
+
     @property
     def open(self):
-        return '\033[{}m'.format(self.value)
+        return self._open
 
     @property
     def close(self):
@@ -279,13 +373,17 @@ class _Blink(IroElement, Enum):
     SLOW = (5, 25)
     RAPID = (6, 25)
 
+    def __init__(self, open_parameter: int, close_parameter: int):
+        self._open = '\033[{}m'.format(open_parameter)
+        self._close = '\033[{}m'.format(close_parameter)
+
     @property
     def open(self):
-        return '\033[{}m'.format(self.value[0])
+        return self._open
 
     @property
     def close(self):
-        return '\033[{}m'.format(self.value[1])
+        return self._close
 
 
 class _Intensity(IroElement, Enum):
@@ -293,13 +391,15 @@ class _Intensity(IroElement, Enum):
     DIM = (2, 22)
     BOLD_DIM = ((1, 2), 22)
 
+    def __init__(self, open_parameters: Union[int, Tuple[int, ...]], close_parameter: int):
+        if not isinstance(open_parameters, tuple):
+            open_parameters = (open_parameters,)
+        self._open = ''.join('\033[{}m'.format(parameter) for parameter in open_parameters)
+        self._close = '\033[{}m'.format(close_parameter)
+
     @property
     def open(self):
-        if self.value[0] == -1:
-            raise ValueError('Cannot open with OFF style. Used style: {}'.format(self.name))
-        if isinstance(self.value[0], tuple):
-            return ''.join('\033[{}m'.format(value) for value in self.value[0])
-        return '\033[{}m'.format(self.value[0])
+        return self._open
 
     def open_from(self, before: Union["_Intensity", None]) -> str:
         if self.value[0] == -1:
@@ -312,117 +412,294 @@ class _Intensity(IroElement, Enum):
                 return _Intensity.DIM.open
             return _Intensity.BOLD_DIM.open
         if before is None:
-            return self.open
-        return "{}{}".format(self.close, self.open)
+            return self._open
+        return self._close + self._open
 
     @property
     def close(self):
-        if self.value[0] == -1:
-            raise ValueError('Cannot close with OFF style. Used style: {}'.format(self.name))
-        return '\033[{}m'.format(self.value[1])
+        return self._close
+
+
+_STATE_CACHE_SIZE = 4096
+_TRANSITION_CACHE_SIZE = 256
+_DIFF_CACHE_SIZE = 1024
+
+# on/off styles packed in `StyleState._flags`, in the order of `StyleState.FIELDS`
+_FLAG_FIELDS = ('ITALIC', 'UNDERLINE', 'INVERT', 'HIDE', 'STRIKE', 'OVERLINE', 'GOTHIC', 'DOUBLY_UNDERLINE')
+_FLAGS = {name: 1 << i for i, name in enumerate(_FLAG_FIELDS)}
 
 
-@dataclass
 class StyleState:
-    INTENSITY: Union[_Intensity, None] = None
-    ITALIC: bool = False
-    UNDERLINE: bool = False
-    BLINK: Union[_Blink, None] = None
-    INVERT: bool = False
-    HIDE: bool = False
-    STRIKE: bool = False
-    OVERLINE: bool = False
-    GOTHIC: bool = False
-    DOUBLY_UNDERLINE: bool = False
-
-    FG_COLOR: Union[Color256, ColorRGB, FGColor, None] = None
-    BG_COLOR: Union[Color256, ColorRGB, BGColor, None] = None
-    FONT: Union[Font, None] = None
+    """
+    Immutable set of styles applied at some point of rendering.
+    Equal states are interned to the same object, and `copy_with` is looked up from the cached transitions,
+    so walking through styles allocates nothing once the states are known.
+    """
+    __slots__ = ('INTENSITY', 'BLINK', 'FG_COLOR', 'BG_COLOR', 'FONT', '_flags', '_key', '_hash', '_transitions',
+                 '__weakref__')
+
+    FIELDS = ('INTENSITY', 'ITALIC', 'UNDERLINE', 'BLINK', 'INVERT', 'HIDE', 'STRIKE', 'OVERLINE', 'GOTHIC',
+              'DOUBLY_UNDERLINE', 'FG_COLOR', 'BG_COLOR', 'FONT')
+
+    _interned = {}
+
+    INTENSITY: Union[_Intensity, None]
+    BLINK: Union[_Blink, None]
+    FG_COLOR: Union[Color256, ColorRGB, FGColor, None]
+    BG_COLOR: Union[Color256, ColorRGB, BGColor, None]
+    FONT: Union[Font, None]
+
+    def __new__(cls, INTENSITY: Union[_Intensity, None] = None, ITALIC: bool = False, UNDERLINE: bool = False,
+                BLINK: Union[_Blink, None] = None, INVERT: bool = False, HIDE: bool = False, STRIKE: bool = False,
+                OVERLINE: bool = False, GOTHIC: bool = False, DOUBLY_UNDERLINE: bool = False,
+                FG_COLOR: Union[Color256, ColorRGB, FGColor, None] = None,
+                BG_COLOR: Union[Color256, ColorRGB, BGColor, None] = None,
+                FONT: Union[Font, None] = None) -> "StyleState":
+        flags = 0
+        for name, value in (('ITALIC', ITALIC), ('UNDERLINE', UNDERLINE), ('INVERT', INVERT), ('HIDE', HIDE),
+                            ('STRIKE', STRIKE), ('OVERLINE', OVERLINE), ('GOTHIC', GOTHIC),
+                            ('DOUBLY_UNDERLINE', DOUBLY_UNDERLINE)):
+            if value:
+                flags |= _FLAGS[name]
+        return cls._intern(INTENSITY or None, flags, BLINK or None, FG_COLOR or None, BG_COLOR or None, FONT or None)
+
+    @classmethod
+    def _intern(cls, intensity, flags: int, blink, fg_color, bg_color, font) -> "StyleState":
+        key = (intensity, flags, blink, fg_color, bg_color, font)
+        state = cls._interned.get(key)
+        if state is not None:
+            return state
+
+        state = object.__new__(cls)
+        set_attr = object.__setattr__
+        set_attr(state, 'INTENSITY', intensity)
+        set_attr(state, 'BLINK', blink)
+        set_attr(state, 'FG_COLOR', fg_color)
+        set_attr(state, 'BG_COLOR', bg_color)
+        set_attr(state, 'FONT', font)
+        set_attr(state, '_flags', flags)
+        set_attr(state, '_key', key)
+        set_attr(state, '_hash', hash(key))
+        set_attr(state, '_transitions', {})
+        if len(cls._interned) >= _STATE_CACHE_SIZE:
+            cls._interned.clear()
+        cls._interned[key] = state
+        return state
+
+    def _replace(self, **changes) -> "StyleState":
+        intensity, flags, blink, fg_color, bg_color, font = self._key
+        return self._intern(changes.get('INTENSITY', intensity), changes.get('_flags', flags),
+                            changes.get('BLINK', blink), changes.get('FG_COLOR', fg_color),
+                            changes.get('BG_COLOR', bg_color), changes.get('FONT', font))
+
+    def __getattr__(self, name: str):
+        # on/off styles are stored as bits
+        flag = _FLAGS.get(name)
+        if flag is None:
+            raise AttributeError("'StyleState' object has no attribute '{}'".format(name))
+        return bool(self._flags & flag)
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError('StyleState is immutable. use `copy_with` to get a new state.')
+
+    def __delattr__(self, name: str):
+        raise AttributeError('StyleState is immutable. use `copy_with` to get a new state.')
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, StyleState):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self):
+        return StyleState, tuple(getattr(self, name) for name in self.FIELDS)
+
+    def __repr__(self):
+        return 'StyleState({})'.format(', '.join('{}={!r}'.format(name, getattr(self, name)) for name in self.FIELDS))
 
     @property
     def is_empty(self) -> bool:
-        return all(not getattr(self, key) for key in self.__annotations__)
+        return self is _EMPTY_STATE or self._key == _EMPTY_STATE._key
 
     def copy(self) -> "StyleState":
-        return dataclasses.replace(self)
+        return self
+
+    def to_elements(self) -> Tuple[IroElement, ...]:
+        """
+        Get the styles which make this state from the empty state with `copy_with`.
+        """
+        elements = []
+        if self.INTENSITY is not None:
+            if self.INTENSITY is not _Intensity.DIM:
+                elements.append(Style.BOLD)
+            if self.INTENSITY is not _Intensity.BOLD:
+                elements.append(Style.DIM)
+        for name in _FLAG_FIELDS:
+            if self._flags & _FLAGS[name]:
+                elements.append(Style[name])
+        if self.BLINK is not None:
+            elements.append(Style.SLOW_BLINK if self.BLINK is _Blink.SLOW else Style.RAPID_BLINK)
+        elements.extend(value for value in (self.FG_COLOR, self.BG_COLOR, self.FONT) if value is not None)
+        return tuple(elements)
 
     def copy_with(self, style: IroElement) -> "StyleState":
+        state = self._transitions.get(style)
+        if state is None:
+            state = self._transition(style)
+            if len(self._transitions) >= _TRANSITION_CACHE_SIZE:
+                self._transitions.clear()
+            self._transitions[style] = state
+        return state
+
+    def _transition(self, style: IroElement) -> "StyleState":
         if isinstance(style, Style):
             if style == Style.RESET:
-                return StyleState()
+                return _EMPTY_STATE
             if style == Style.OFF_FG_COLOR:
-                return dataclasses.replace(self, FG_COLOR=None)
+                return self._replace(FG_COLOR=None)
             if style == Style.OFF_BG_COLOR:
-                return dataclasses.replace(self, BG_COLOR=None)
+                return self._replace(BG_COLOR=None)
             if style == Style.OFF_INTENSITY:
-                return dataclasses.replace(self, INTENSITY=None)
+                return self._replace(INTENSITY=None)
             if style == Style.OFF_BOLD:
                 if self.INTENSITY == _Intensity.BOLD:
-                    return dataclasses.replace(self, INTENSITY=None)
+                    return self._replace(INTENSITY=None)
                 if self.INTENSITY == _Intensity.BOLD_DIM:
-                    return dataclasses.replace(self, INTENSITY=_Intensity.DIM)
-                return dataclasses.replace(self)
+                    return self._replace(INTENSITY=_Intensity.DIM)
+                return self
             if style == Style.OFF_DIM:
                 if self.INTENSITY == _Intensity.DIM:
-                    return dataclasses.replace(self, INTENSITY=None)
+                    return self._replace(INTENSITY=None)
                 if self.INTENSITY == _Intensity.BOLD_DIM:
-                    return dataclasses.replace(self, INTENSITY=_Intensity.BOLD)
-                return dataclasses.replace(self)
+                    return self._replace(INTENSITY=_Intensity.BOLD)
+                return self
             if style == Style.BOLD:
                 if self.INTENSITY == _Intensity.DIM:
-                    return dataclasses.replace(self, INTENSITY=_Intensity.BOLD_DIM)
-                return dataclasses.replace(self, INTENSITY=_Intensity.BOLD)
+                    return self._replace(INTENSITY=_Intensity.BOLD_DIM)
+                return self._replace(INTENSITY=_Intensity.BOLD)
             if style == Style.DIM:
                 if self.INTENSITY == _Intensity.BOLD:
-                    return dataclasses.replace(self, INTENSITY=_Intensity.BOLD_DIM)
-                return dataclasses.replace(self, INTENSITY=_Intensity.DIM)
+                    return self._replace(INTENSITY=_Intensity.BOLD_DIM)
+                return self._replace(INTENSITY=_Intensity.DIM)
             if style == Style.SLOW_BLINK:
-                return dataclasses.replace(self, BLINK=_Blink.SLOW)
+                return self._replace(BLINK=_Blink.SLOW)
             if style == Style.RAPID_BLINK:
-                return dataclasses.replace(self, BLINK=_Blink.RAPID)
+                return self._replace(BLINK=_Blink.RAPID)
+            if style == Style.OFF_BLINK:
+                return self._replace(BLINK=None)
+            if style == Style.OFF_FONT:
+                return self._replace(FONT=None)
 
             is_on = not style.name.startswith('OFF_')
-            member_name = style.name if is_on else style.name[4:]
-            return dataclasses.replace(self, **{member_name: is_on})
+            flag = _FLAGS[style.name if is_on else style.name[4:]]
+            return self._replace(_flags=self._flags | flag if is_on else self._flags & ~flag)
         if isinstance(style, (ColorRGB, Color256)):
             if style.bg:
-                return dataclasses.replace(self, BG_COLOR=style)
-            return dataclasses.replace(self, FG_COLOR=style)
+                return self._replace(BG_COLOR=style)
+            return self._replace(FG_COLOR=style)
         if isinstance(style, FGColor):
-            return dataclasses.replace(self, FG_COLOR=style)
+            return self._replace(FG_COLOR=style)
         if isinstance(style, BGColor):
-            return dataclasses.replace(self, BG_COLOR=style)
+            return self._replace(BG_COLOR=style)
         if isinstance(style, Font):
-            return dataclasses.replace(self, FONT=style)
-
-    def diff_sequence(self, after: "StyleState") -> str:
+            return self._replace(FONT=style)
+        raise TypeError('unsupported style: {!r}'.format(style))
+
+    def diff_sequence(self, after: "StyleState", coalesce: bool = False, minimize: bool = False) -> str:
+        """
+        Get the sequence to change styles from this state to `after`.
+        Results are kept in the LRU cache which is configured with `set_diff_cache_size`.
+        :param after: state to change into
+        :param coalesce: if True, every parameter is combined into single sequence like `\\033[1;31m`
+        :param minimize: if True, resetting all styles and opening styles of `after` is used when it is shorter
+        :return: sequence
+        """
+        if self is after:
+            return ''
+        return _cached_diff_sequence(self, after, coalesce, minimize)
+
+    @staticmethod
+    def set_diff_cache_size(maxsize: Union[int, None]):
+        """
+        Set the number of (before, after) pairs kept by `diff_sequence`. `None` for unbounded, `0` to disable.
+        Cached results are dropped.
+        """
+        global _cached_diff_sequence
+        _cached_diff_sequence = lru_cache(maxsize=maxsize)(StyleState._diff_sequence)
+
+    @staticmethod
+    def diff_cache_info():
+        """
+        Get hits, misses, maxsize and currsize of the cache of `diff_sequence`.
+        """
+        return _cached_diff_sequence.cache_info()
+
+    @staticmethod
+    def clear_diff_cache():
+        _cached_diff_sequence.cache_clear()
+
+    def _diff_sequence(self, after: "StyleState", coalesce: bool, minimize: bool) -> str:
+        sequence = self._changing_sequence(after, coalesce)
+        if minimize and not after.is_empty:
+            # closing many styles one by one may be longer than reset and opening remaining styles
+            reopening_sequence = Style.RESET.open + _EMPTY_STATE._changing_sequence(after, False)
+            if coalesce:
+                reopening_sequence = _coalesce_sequence(reopening_sequence)
+            if len(reopening_sequence) < len(sequence):
+                return reopening_sequence
+        return sequence
+
+    def _changing_sequence(self, after: "StyleState", coalesce: bool) -> str:
         result = []
-        for key in self.__annotations__:
+        before_intensity, after_intensity = self.INTENSITY, after.INTENSITY
+        if before_intensity != after_intensity:
+            if after_intensity:
+                # intensity needs to be closed before opening new intensity
+                # since it shares same close sequence
+                result.append(after_intensity.open_from(before_intensity))
+            else:
+                result.append(before_intensity.close)
+
+        changed_flags = self._flags ^ after._flags
+        for key, flag, open_sequence, close_sequence in _DIFF_FIELDS:
+            if flag:
+                if changed_flags & flag:
+                    result.append(open_sequence if after._flags & flag else close_sequence)
+                continue
             before_value = getattr(self, key)
             after_value = getattr(after, key)
-            if not before_value and not after_value:  # both are not set
+            if before_value == after_value:  # same value, or both are not set
                 continue
-            if before_value == after_value:  # same value
-                continue
-            if before_value and after_value:  # change to new value
-                # both before_value and after_value are IroElement
-                if key == 'INTENSITY':
-                    # intensity needs to be closed before opening new intensity
-                    # since it shares same close sequence
-                    result.append(after_value.open_from(before_value))
-                else:
-                    result.append(after_value.open)
-            else:
-                value = before_value or after_value
-                if isinstance(value, bool):
-                    value = Style[key]
-                if before_value:  # reset value
-                    result.append(value.close)
-                elif after_value:  # set value
-                    if isinstance(value, _Intensity):
-                        result.append(value.open_from(before_value))
-                    else:
-                        result.append(value.open)
+            if after_value:  # set new value
+                result.append(after_value.open)
+            else:  # reset value
+                result.append(before_value.close)
         if result and after.is_empty:
             return Style.RESET.open
+        if coalesce and result:
+            return _coalesce_sequence(''.join(result))
         return ''.join(result)
+
+
+def _coalesce_sequence(sequence: str) -> str:
+    """
+    Combine consecutive SGR sequences into one. `\\033[1m\\033[31m` will be `\\033[1;31m`.
+    :param sequence: consecutive SGR sequences only
+    :return: combined sequence
+    """
+    return sequence.replace('m\033[', ';')
+
+
+_cached_diff_sequence = lru_cache(maxsize=_DIFF_CACHE_SIZE)(StyleState._diff_sequence)
+
+_EMPTY_STATE = StyleState()
+StyleState.EMPTY = _EMPTY_STATE
+# fields after INTENSITY in diffing order. on/off styles carry their flag and sequences
+_DIFF_FIELDS = tuple(
+    (name, _FLAGS[name], Style[name].open, Style[name].close) if name in _FLAGS else (name, 0, None, None)
+    for name in StyleState.FIELDS[1:]
+)
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any, Iterable, List, Tuple
+
+
+class Placeholder(str):
+    """
+    Named slot of `Iro` to be filled by `Template.render`.
+    Rendered as `{name}` when painted as it is.
+    """
+
+    def __new__(cls, name: str):
+        placeholder = super().__new__(cls, '{' + name + '}')
+        placeholder.name = name
+        return placeholder
+
+    def __reduce__(self):
+        return type(self), (self.name,)
+
+    def __repr__(self):
+        return 'Placeholder(name={})'.format(repr(self.name))
+
+
+class Template:
+    """
+    `Iro` compiled with `Iro.compile`.
+    Sequences and texts are rendered in advance, and only the `Placeholder`s are filled on `render`.
+    """
+
+    def __init__(self, parts: Iterable[str]):
+        self._parts: List[str] = []
+        self._slots: List[Tuple[int, str]] = []
+
+        constant: List[str] = []
+        for part in parts:
+            if isinstance(part, Placeholder):
+                if constant:
+                    self._parts.append(''.join(constant))
+                    constant = []
+                self._slots.append((len(self._parts), part.name))
+                self._parts.append(part)
+            else:
+                constant.append(part)
+        if constant:
+            self._parts.append(''.join(constant))
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(name for _, name in self._slots))
+
+    def render(self, **values: Any) -> str:
+        """
+        Render with `Placeholder`s substituted by given values.
+        :param values: text for each name of `Placeholder`. converted with `str`.
+        :return: painted text
+        """
+        parts = self._parts.copy()
+        for index, name in self._slots:
+            try:
+                parts[index] = str(values[name])
+            except KeyError:
+                raise TypeError('missing value for placeholder: {}'.format(repr(name))) from None
+        return ''.join(parts)
+
+    def __repr__(self):
+        return 'Template(parts={})'.format(repr(self._parts))
@@ -1,4 +1,30 @@
-from src.iro import Iro, Color256, ColorRGB, Style, FGColor, BGColor, Font
+import asyncio
+import gc
+import io
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import tracemalloc
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src.iro import Iro, IroBuilder, Color256, ColorRGB, Style, FGColor, BGColor, Font, Placeholder, Profile
+from src.iro.profile import detect_profile
+from src.iro.ansi import parse_ansi
+from src.iro import gradient as gradient_module
+from src.iro.gradient import colormap, gradient
+from src.iro.html import HtmlWriter, to_html
+from src.iro import layout as layout_module
+from src.iro.layout import StyledText, display_width
+from src.iro.live import Live
+from src.iro.log import IroFormatter, IroQueueHandler
+from src.iro.stats import enable_stats, disable_stats, stats_enabled
+from src.iro.styles import StyleState
 
 
 class Test:
@@ -185,3 +211,1109 @@ class Test:
     class TestStyle:
         def test_normal_reset_integrity(self):
             assert Style.RESET is Style.NORMAL
+
+    class TestRenderCache:
+        def test_cached_result_is_reused(self):
+            iro = Iro(FGColor.RED, "red", Iro(Style.BOLD, "bold"))
+            painted = iro.str
+            assert [cached for cached, _ in iro._cache.values()] == [painted]
+            assert iro.str is iro.str
+
+        def test_values_modification_invalidates(self):
+            iro = Iro(FGColor.RED, "red")
+            assert iro.str == f"{FGColor.RED.open}red{Style.RESET.open}"
+            iro.values.append("!")
+            assert iro.str == f"{FGColor.RED.open}red!{Style.RESET.open}"
+            iro.values[0] = FGColor.BLUE
+            assert iro.str == f"{FGColor.BLUE.open}red!{Style.RESET.open}"
+            iro.sep = " "
+            assert iro.str == f"{FGColor.BLUE.open}red !{Style.RESET.open}"
+
+        def test_child_modification_invalidates_parent_only(self):
+            child = Iro(Style.BOLD, "bold")
+            sibling = Iro(Style.ITALIC, "italic")
+            parent = Iro(FGColor.RED, child, sibling, sep=" ")
+            before = parent.str
+            sibling_cache = dict(sibling._cache)
+            child.values.append("!")
+            assert parent.str == before.replace("bold", "bold!")
+            assert sibling._cache == sibling_cache
+
+        def test_collected_parents_are_dropped(self):
+            badge = Iro(FGColor.RED, "[ERROR]")
+            kept = []
+            for i in range(100):
+                line = Iro(badge, " msg ", str(i))
+                line.str
+                if i % 10 == 0:
+                    kept.append(line)
+            del line
+            gc.collect()
+            assert len(badge._parents) == len(kept)
+            badge.values.append("!")
+            assert all("[ERROR]!" in line.str for line in kept)
+
+        def test_nested_list_is_not_cached(self):
+            nested = ["a"]
+            iro = Iro(nested)
+            assert iro.str == f"a{Style.RESET.open}"
+            nested.append("b")
+            assert iro.str == f"ab{Style.RESET.open}"
+
+    class TestColorRGB:
+        @staticmethod
+        def linear_scan(r, g, b):
+            return min(Color256.color_map,
+                       key=lambda i: 2 * (Color256.color_map[i][0] - r) ** 2 +
+                                     4 * (Color256.color_map[i][1] - g) ** 2 +
+                                     3 * (Color256.color_map[i][2] - b) ** 2)
+
+        def test_to_close_c256_matches_linear_scan(self):
+            for r in range(0, 256, 29):
+                for g in range(0, 256, 29):
+                    for b in range(0, 256, 29):
+                        assert ColorRGB(r, g, b).to_close_c256().color == self.linear_scan(r, g, b)
+
+        def test_to_close_c256_tie(self):
+            assert ColorRGB(0, 0, 0).to_close_c256().color == 0
+            assert ColorRGB(0x80, 0x80, 0x80).to_close_c256().color == 8
+            assert ColorRGB(115, 115, 115, bg=True).to_close_c256().bg
+
+        def test_close_c256_indices(self):
+            colors = [(255, 0, 0), ColorRGB(1, 2, 3), (0x5f, 0x87, 0xaf)]
+            expected = bytearray(ColorRGB(*color).to_close_c256().color if isinstance(color, tuple)
+                                 else color.to_close_c256().color for color in colors)
+            assert ColorRGB.close_c256_indices(colors) == expected
+            assert ColorRGB.close_c256_indices(bytes([255, 0, 0, 1, 2, 3, 0x5f, 0x87, 0xaf])) == expected
+
+        def test_close_c256_indices_invalid_buffer(self):
+            with pytest.raises(ValueError):
+                ColorRGB.close_c256_indices(b'\x00\x00')
+
+    class TestInterning:
+        def test_colors_are_interned(self):
+            assert ColorRGB(1, 2, 3) is ColorRGB(1, 2, 3)
+            assert ColorRGB(1.2, 2, 3) is ColorRGB(1, 2, 3)
+            assert ColorRGB(1, 2, 3, bg=True) is not ColorRGB(1, 2, 3)
+            assert ColorRGB.from_color_code('#010203') is ColorRGB(1, 2, 3)
+            assert Color256(9) is Color256(9)
+            assert Color256(9, bg=1) is Color256(9, bg=True)
+            assert Font(3) is Font(3)
+            assert ColorRGB(255, 0, 0).to_close_c256() is Color256(9)
+
+        def test_distinct_colors_only(self):
+            colors = [ColorRGB(i % 10, 0, 0) for i in range(10000)]
+            assert len(set(map(id, colors))) == 10
+            assert len({colors[0], ColorRGB(0, 0, 0)}) == 1
+
+        def test_immutable(self):
+            for element in (ColorRGB(1, 2, 3), Color256(9), Font(3)):
+                with pytest.raises(AttributeError):
+                    element.bg = True
+                with pytest.raises(AttributeError):
+                    element.foo = 1
+
+        def test_sequences(self):
+            assert ColorRGB(1, 2, 3).open == '\033[38;2;1;2;3m'
+            assert ColorRGB(1, 2, 3, bg=True).close == '\033[49m'
+            assert Color256(9, bg=True).open == '\033[48;5;9m'
+            assert Font(3).open == '\033[13m'
+            assert Style.BOLD.open == '\033[1m' and Style.BOLD.close == '\033[22m'
+            assert FGColor.RED.open == '\033[31m' and BGColor.RED.close == '\033[49m'
+            with pytest.raises(ValueError):
+                Style.OFF_BOLD.open
+
+        def test_pickle_and_copy(self):
+            import copy
+            import pickle
+            for element in (ColorRGB(1, 2, 3, bg=True), Color256(9), Font(3)):
+                assert pickle.loads(pickle.dumps(element)) is element
+                assert copy.copy(element) is element
+                assert copy.deepcopy(element) is element
+
+        def test_separately_created_colors_give_same_state(self):
+            assert StyleState.EMPTY.copy_with(ColorRGB(1, 2, 3)) == StyleState.EMPTY.copy_with(ColorRGB(1, 2, 3))
+
+    class TestStyleState:
+        def test_interned(self):
+            assert StyleState() is StyleState()
+            assert StyleState(ITALIC=True, FG_COLOR=FGColor.RED) is StyleState().copy_with(Style.ITALIC).copy_with(
+                FGColor.RED)
+            assert StyleState().copy_with(Style.ITALIC).copy_with(Style.OFF_ITALIC) is StyleState()
+
+        def test_flags(self):
+            state = StyleState(UNDERLINE=True, STRIKE=True)
+            assert state.UNDERLINE and state.STRIKE and not state.ITALIC
+            assert not state.is_empty
+            assert state.copy_with(Style.RESET).is_empty
+
+        def test_immutable_and_hashable(self):
+            state = StyleState(BLINK=None, FONT=Font(1))
+            with pytest.raises(AttributeError):
+                state.ITALIC = True
+            assert {state: 1}[state] == 1
+
+        def test_transition_is_cached(self):
+            state = StyleState(INTENSITY=None).copy_with(Style.BOLD)
+            assert state.copy_with(Style.DIM) is state.copy_with(Style.DIM)
+            assert state._transitions[Style.DIM] is state.copy_with(Style.DIM)
+
+        def test_diff_sequence_cache(self):
+            StyleState.set_diff_cache_size(2)
+            try:
+                before, after = StyleState(), StyleState(FG_COLOR=FGColor.RED)
+                assert before.diff_sequence(after) == FGColor.RED.open
+                assert before.diff_sequence(after) == FGColor.RED.open
+                info = StyleState.diff_cache_info()
+                assert (info.hits, info.misses, info.maxsize, info.currsize) == (1, 1, 2, 1)
+                StyleState.clear_diff_cache()
+                assert StyleState.diff_cache_info().currsize == 0
+            finally:
+                StyleState.set_diff_cache_size(1024)
+
+    class TestTemplate:
+        def test_render_same_as_paint(self):
+            def layout(level, message):
+                return Iro(Style.DIM, "[", Iro(FGColor.RED, Style.BOLD, level), "] ", [FGColor.BLUE, message], sep="")
+
+            template = layout(Placeholder("level"), Placeholder("message")).compile()
+            assert template.names == ("level", "message")
+            for level, message in (("ERROR", "failed"), ("", "")):
+                assert template.render(level=level, message=message) == str(layout(level, message))
+
+        def test_sep_iro(self):
+            def layout(value):
+                return Iro(FGColor.GREEN, "a", value, [Style.UNDERLINE, value], sep=Iro(Style.BOLD, "|"))
+
+            assert layout(Placeholder("v")).compile().render(v=1) == str(layout("1"))
+
+        def test_sep_placeholder(self):
+            iro = Iro(FGColor.RED, "a", "b", sep=Placeholder("sep"))
+            assert iro.str == str(Iro(FGColor.RED, "a", "b", sep="{sep}"))
+            template = iro.compile()
+            assert template.names == ("sep",)
+            assert template.render(sep="-") == str(Iro(FGColor.RED, "a", "b", sep="-"))
+            assert iro.compile().render(sep="+") == str(Iro(FGColor.RED, "a", "b", sep="+"))
+
+        def test_paint_placeholder(self):
+            assert str(Iro(Placeholder("name"))) == f"{{name}}{Style.RESET.open}"
+
+        def test_missing_value(self):
+            with pytest.raises(TypeError):
+                Iro(Placeholder("name")).compile().render()
+
+    class TestStreaming:
+        @staticmethod
+        def document():
+            return Iro(FGColor.RED, "red", [Style.BOLD, "bold", Iro(FGColor.BLUE, "blue")], "red", sep=Iro(
+                Style.UNDERLINE, "_"))
+
+        def test_iter_paint(self):
+            pieces = list(self.document().iter_paint())
+            assert len(pieces) > 1
+            assert ''.join(pieces) == str(self.document())
+
+        def test_iter_paint_does_not_store_cache(self):
+            iro = Iro(FGColor.RED, "red")
+            assert ''.join(iro.iter_paint()) == str(Iro(FGColor.RED, "red"))
+            assert not iro._cache
+
+        def test_paint_into(self):
+            document = self.document()
+            for profile in Profile:
+                buffer = bytearray(b"head ")
+                written = document.paint_into(buffer, profile=profile)
+                assert buffer == b"head " + document.paint(profile=profile).encode()
+                assert written == len(buffer) - len(b"head ")
+
+            large = Iro(*(Iro(FGColor.RED, "ü", i) for i in map(str, range(1000))))
+            buffer = bytearray()
+            large.paint_into(buffer, encoding="utf-16")
+            assert buffer.decode("utf-16") == large.str
+
+        def test_paint_into_buffer(self):
+            document = self.document()
+            expected = document.str.encode()
+            buffer = bytearray(len(expected) + 10)
+            assert document.paint_into(memoryview(buffer), 10) == len(expected)
+            assert buffer[10:] == expected
+            with pytest.raises(ValueError):
+                document.paint_into(bytearray(5), 0)
+
+        def test_paint_into_cache(self):
+            child = Iro(Style.BOLD, "bold")
+            document = Iro(FGColor.RED, "red", child)
+            document.paint_into(bytearray())
+            assert any(len(key) == 4 for key in document._cache)
+            buffer = bytearray()
+            document.paint_into(buffer)
+            assert buffer == document.str.encode()
+            child.values.append("!")
+            buffer.clear()
+            document.paint_into(buffer)
+            assert buffer == document.str.encode() and b"!" in buffer
+
+        def test_write_to(self):
+            class Writer(io.StringIO):
+                def __init__(self):
+                    super().__init__()
+                    self.sizes = []
+
+                def write(self, s):
+                    self.sizes.append(len(s))
+                    return super().write(s)
+
+            fp = Writer()
+            written = self.document().write_to(fp, buffer_size=8, profile=Profile.TRUECOLOR)
+            assert fp.getvalue() == str(self.document())
+            assert written == len(fp.getvalue())
+            assert len(fp.sizes) > 1
+
+        def test_write_to_async(self):
+            events = []
+
+            class Writer:
+                def __init__(self):
+                    self.data = bytearray()
+
+                def write(self, data):
+                    self.data += data
+                    events.append("write")
+
+                async def drain(self):
+                    events.append("drain")
+
+            async def other():
+                for _ in range(3):
+                    events.append("other")
+                    await asyncio.sleep(0)
+
+            iro = Iro(*(Iro(FGColor.RED, "あ" * 10) for _ in range(100)))
+
+            async def main():
+                writer = Writer()
+                task = asyncio.ensure_future(other())
+                written = await iro.write_to_async(writer, buffer_size=300)
+                await task
+                return writer, written
+
+            writer, written = asyncio.run(main())
+            assert writer.data.decode() == iro.str
+            assert written == len(writer.data)
+            assert events[:2] == ["write", "drain"] and events.count("write") > 3
+            # other task runs between writes
+            assert events.index("other") < len(events) - 1 - events[::-1].index("write")
+
+    class TestParallel:
+        @staticmethod
+        def document(collect_styles_first=True):
+            rows = [Iro(Iro(FGColor.CYAN, str(i)), Style.BOLD if i % 3 else Style.OFF_BOLD, " row ",
+                        [Style.UNDERLINE, "u", Iro(BGColor.RED, "r")], "\n") for i in range(40)]
+            return Iro(Style.RESET, FGColor.RED, *rows, Style.OFF_FG_COLOR, ColorRGB(1, 2, 3), "tail",
+                       sep=Iro(Style.DIM, "|"), collect_styles_first=collect_styles_first)
+
+        @staticmethod
+        def serial(iro, **kwargs):
+            return Iro(*iro.values, sep=iro.sep, collect_styles_first=iro.collect_styles_first).paint(**kwargs)
+
+        def test_same_as_paint(self):
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                for collect_styles_first in (True, False):
+                    for profile in (Profile.TRUECOLOR, Profile.COLOR16, Profile.NONE):
+                        for workers in (1, 2, 3, 8):
+                            iro = self.document(collect_styles_first)
+                            assert (iro.paint_parallel(workers, profile=profile, executor=executor)
+                                    == self.serial(iro, profile=profile))
+                given_style = StyleState.EMPTY.copy_with(Style.ITALIC)
+                iro = self.document(False)
+                assert (iro.paint_parallel(2, given_style, executor=executor)
+                        == self.serial(iro, given_style=given_style))
+
+        def test_child_at_boundary(self):
+            from concurrent.futures import ThreadPoolExecutor
+            iro = Iro(*(Iro(FGColor.BLUE, str(i), Style.BOLD) for i in range(16)), FGColor.RED, "end",
+                      collect_styles_first=False)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                assert iro.paint_parallel(4, executor=executor) == self.serial(iro)
+
+        def test_process_pool(self):
+            iro = self.document(False)
+            assert iro.paint_parallel(2) == self.serial(iro)
+            # result is cached same as `paint`
+            iro = Iro(*(Iro(FGColor.BLUE, str(i)) for i in range(8)), sep=" ")
+            assert iro.paint_parallel(2) == self.serial(iro)
+            assert iro._cache
+
+        def test_pickle(self):
+            import pickle
+            from src.iro import Placeholder
+            iro = self.document()
+            iro.str
+            loaded = pickle.loads(pickle.dumps(iro))
+            assert loaded.str == iro.str
+            assert not loaded._cache
+            loaded.values.append("more")
+            assert loaded.str != iro.str
+            assert pickle.loads(pickle.dumps(Placeholder("name"))).name == "name"
+
+    class TestBuilder:
+        values = ["a", FGColor.RED, "b", Iro(Style.BOLD, "c"), Style.UNDERLINE, ("d", BGColor.BLUE), "e"]
+
+        def test_same_as_iro(self):
+            for options in ({}, {"sep": Iro(Style.DIM, "|")}, {"collect_styles_first": False, "coalesce": True}):
+                builder = IroBuilder(**options)
+                for value in self.values:
+                    builder.append(value)
+                assert list(builder) == self.values and len(builder) == len(self.values)
+                assert builder.str == Iro(*self.values, **options).str
+                assert IroBuilder(**options).extend(self.values).str == Iro(*self.values, **options).str
+
+        def test_shared_versions(self):
+            base = IroBuilder("a", FGColor.RED)
+            first = base + "b"
+            second = base + "c"
+            base.append("d")
+            first += Style.BOLD
+            assert list(base) == ["a", FGColor.RED, "d"]
+            assert list(first) == ["a", FGColor.RED, "b", Style.BOLD]
+            assert list(second) == ["a", FGColor.RED, "c"]
+            both = first + second
+            assert list(both) == list(first) + list(second)
+            assert list("x" + both) == ["x"] + list(both)
+            assert both.str == Iro(*both).str
+            first.extend(first)
+            assert list(first) == ["a", FGColor.RED, "b", Style.BOLD] * 2
+
+        def test_deep(self):
+            builder = IroBuilder()
+            for i in range(100000):
+                builder = builder + IroBuilder(str(i % 10))
+            assert len(builder) == 100000
+            assert builder.build().values[-1] == "9"
+            assert builder.paint(profile=Profile.NONE) == "0123456789" * 10000
+
+        def test_build(self):
+            child = Iro(FGColor.RED, "red")
+            builder = IroBuilder("a", child)
+            iro = builder.build()
+            assert builder.build() is iro
+            assert Iro(Style.BOLD, iro).str == Iro(Style.BOLD, Iro("a", Iro(FGColor.RED, "red"))).str
+            painted = iro.str
+            child.values.append("!")
+            assert iro.str != painted
+            builder.append("b")
+            assert builder.build() is not iro
+            with pytest.raises(AttributeError):
+                iro.values.append("c")
+
+        def test_iro_add(self):
+            assert isinstance(Iro("a") + "b", Iro)
+            assert (Iro(FGColor.RED, "a") + "b").str == Iro(FGColor.RED, "a", "b").str
+            assert ("b" + Iro(FGColor.RED, "a")).str == Iro("b", FGColor.RED, "a").str
+            assert (Iro("a") + Iro(Style.BOLD, "b")).str == Iro("a", Style.BOLD, "b").str
+            assert list((Iro("a") + IroBuilder("b")).values) == ["a", "b"]
+            with pytest.raises(TypeError):
+                Iro("a") + 1
+            with pytest.raises(TypeError):
+                IroBuilder() + 1
+
+        def test_iro_add_nested(self):
+            added = Iro("a", "b") + Iro("c", "d")
+            parent = Iro(added, "z", sep=" ")
+            assert parent.str == f"abcd z{Style.RESET.open}"
+            assert parent._is_cacheable()
+            assert parent.str is parent.str
+            red = Iro(FGColor.RED, "a") + "b"
+            assert to_html(red) == to_html(Iro(FGColor.RED, "a", "b"))
+            fp = io.StringIO()
+            with HtmlWriter(fp) as writer:
+                writer.write(red)
+            assert fp.getvalue() == to_html(red)
+            fp = io.StringIO()
+            Live(fp, max_fps=0, profile=Profile.TRUECOLOR, interactive=True, hide_cursor=False).update(red)
+            assert fp.getvalue() == "\033[31mab"
+
+        def test_iro_add_chain(self):
+            iro = Iro()
+            for i in range(100000):
+                iro = iro + str(i % 10)
+            assert len(iro.values) == 100000
+            assert iro.str == "0123456789" * 10000 + Style.RESET.open
+
+    class TestDeepNesting:
+        def test_deep_list(self):
+            values = "text"
+            for _ in range(10000):
+                values = [values]
+            values = [Style.BOLD, values]
+            assert str(Iro(values)) == f"{Style.BOLD.open}text{Style.RESET.open}"
+
+        def test_deep_iro_sep(self):
+            sep = Iro(FGColor.RED, "|")
+            for _ in range(2000):
+                sep = Iro(Style.BOLD, "a", "b", sep=sep)
+            result = str(Iro("x", "y", sep=sep))
+            assert result == (f"x{Style.BOLD.open}{'a' * 2000}{FGColor.RED.open}|{FGColor.RED.close}{'b' * 2000}"
+                              f"{Style.RESET.open}y{Style.RESET.open}")
+            assert ''.join(Iro("x", "y", sep=sep).iter_paint()) == result
+
+        def test_deep_iro_chain_memory(self):
+            node = Iro(FGColor.RED, "leaf")
+            for i in range(4000):
+                node = Iro(Style.BOLD if i % 2 else FGColor.BLUE, "x", node)
+            tracemalloc.start()
+            try:
+                painted = node.str
+                kept, _ = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            assert node.str == painted and node.str is node.str
+            # nodes and their parent references take about 2 MB. each nested result copying its subtree kept 40 MB
+            assert kept < 8 * 1024 * 1024
+
+    class TestCoalesce:
+        def test_coalesce(self):
+            result = str(Iro(Style.BOLD, FGColor.RED, Color256(200, bg=True), "text", coalesce=True))
+            assert result == f"\033[1;31;48;5;200mtext{Style.RESET.open}"
+
+        def test_coalesce_nested(self):
+            values = (FGColor.RED, "red", [Style.BOLD, Style.UNDERLINE, "bold"], "red")
+            assert str(Iro(*values, coalesce=True)) == f"\033[31mred\033[1;4mbold\033[22;24mred{Style.RESET.open}"
+            assert str(Iro(*values)) == f"\033[31mred\033[1m\033[4mbold\033[22m\033[24mred{Style.RESET.open}"
+
+        def test_coalesce_intensity(self):
+            result = str(Iro(Style.BOLD, "bold", [Style.OFF_BOLD, Style.DIM, FGColor.RED, "dim"], coalesce=True))
+            assert result == f"\033[1mbold\033[22;2;31mdim{Style.RESET.open}"
+
+        def test_coalesce_setter_invalidates(self):
+            iro = Iro(Style.BOLD, Style.ITALIC, "text")
+            assert str(iro) == f"\033[1m\033[3mtext{Style.RESET.open}"
+            iro.coalesce = True
+            assert str(iro) == f"\033[1;3mtext{Style.RESET.open}"
+
+    class TestMinimize:
+        values = (Style.BOLD, Style.ITALIC, Style.UNDERLINE, Style.STRIKE, FGColor.RED, "a",
+                  [Style.OFF_BOLD, Style.OFF_ITALIC, Style.OFF_UNDERLINE, Style.OFF_STRIKE, "b"], "c")
+
+        def test_reset_and_reopen_when_shorter(self):
+            result = str(Iro(*self.values, minimize=True))
+            assert result == (f"\033[1m\033[3m\033[4m\033[9m\033[31ma"
+                              f"{Style.RESET.open}\033[31mb"
+                              f"\033[1m\033[3m\033[4m\033[9mc{Style.RESET.open}")
+            assert len(result) < len(str(Iro(*self.values)))
+
+        def test_minimize_with_coalesce(self):
+            result = str(Iro(*self.values, minimize=True, coalesce=True))
+            assert result == f"\033[1;3;4;9;31ma\033[0;31mb\033[1;3;4;9mc{Style.RESET.open}"
+
+        def test_keep_incremental_when_not_shorter(self):
+            values = (Style.BOLD, FGColor.RED, "bold", [Style.OFF_BOLD, Style.DIM, "dim"])
+            assert str(Iro(*values, minimize=True)) == str(Iro(*values))
+
+        def test_diff_sequence(self):
+            before = StyleState(ITALIC=True, UNDERLINE=True, STRIKE=True, FG_COLOR=FGColor.RED)
+            after = StyleState(FG_COLOR=FGColor.RED)
+            assert before.diff_sequence(after) == "\033[23m\033[24m\033[29m"
+            assert before.diff_sequence(after, minimize=True) == "\033[0m\033[31m"
+            assert before.diff_sequence(StyleState(), minimize=True) == Style.RESET.open
+
+    class TestProfile:
+        values = (FGColor.RED, "red", [ColorRGB(0xff, 0x87, 0x00, bg=True), "rgb", [Color256(196), "256"]], "red")
+
+        def test_truecolor(self):
+            assert Iro(*self.values).paint(profile=Profile.TRUECOLOR) == str(Iro(*self.values))
+
+        def test_color256(self):
+            result = Iro(*self.values).paint(profile=Profile.COLOR256)
+            assert result == (f"{FGColor.RED.open}red{Color256(208, bg=True).open}rgb{Color256(196).open}256"
+                              f"{FGColor.RED.open}{BGColor.RED.close}red{Style.RESET.open}")
+
+        def test_color16(self):
+            result = Iro(*self.values).paint(profile=Profile.COLOR16)
+            assert result == (f"{FGColor.RED.open}red{BGColor.YELLOW.open}rgb{FGColor.BRIGHT_RED.open}256"
+                              f"{FGColor.RED.open}{BGColor.RED.close}red{Style.RESET.open}")
+
+        def test_none(self):
+            iro = Iro(Style.RESET, FGColor.RED, "a", ["b", Iro(Style.BOLD, "c", "d", sep=Iro(FGColor.BLUE, "+"))],
+                      sep=Iro(Style.UNDERLINE, "-"))
+            assert iro.paint(profile=Profile.NONE) == "a-b-c+d"
+            assert ''.join(iro.iter_paint(profile=Profile.NONE)) == "a-b-c+d"
+
+        def test_profile_is_part_of_cache_key(self):
+            iro = Iro(ColorRGB(0xff, 0x87, 0x00), "rgb")
+            assert iro.paint(profile=Profile.COLOR256) != iro.paint()
+
+        def test_detect(self, monkeypatch):
+            class Terminal(io.StringIO):
+                def isatty(self):
+                    return True
+
+            monkeypatch.delenv("NO_COLOR", raising=False)
+            monkeypatch.delenv("COLORTERM", raising=False)
+            monkeypatch.setenv("TERM", "xterm-256color")
+            assert detect_profile(io.StringIO()) is Profile.NONE
+            assert detect_profile(Terminal()) is Profile.COLOR256
+            monkeypatch.setenv("COLORTERM", "truecolor")
+            assert detect_profile(Terminal()) is Profile.TRUECOLOR
+            monkeypatch.setenv("NO_COLOR", "1")
+            assert detect_profile(Terminal()) is Profile.NONE
+
+        def test_default_profile(self, monkeypatch):
+            monkeypatch.delenv("NO_COLOR", raising=False)
+            iro = Iro(ColorRGB(0xff, 0x87, 0x01), "rgb")
+            fp = io.StringIO()
+            iro.write_to(fp)
+            buffer = bytearray()
+            iro.paint_into(buffer)
+            assert fp.getvalue() == buffer.decode() == ''.join(iro.iter_paint()) == iro.paint() == str(iro)
+            assert iro.paint() == iro.paint(profile=Profile.TRUECOLOR)
+
+            fp = io.StringIO()
+            Iro(FGColor.RED, "red").write_to(fp, profile=detect_profile(fp))
+            assert fp.getvalue() == "red"
+
+        def test_write_to_same_as_paint(self, monkeypatch):
+            class Terminal(io.StringIO):
+                def isatty(self):
+                    return True
+
+            monkeypatch.delenv("NO_COLOR", raising=False)
+            monkeypatch.setenv("COLORTERM", "truecolor")
+            iro = Iro(ColorRGB(0xff, 0x87, 0x01), "rgb")
+            fp = Terminal()
+            iro.write_to(fp)
+            # `disable_rgb` is `True` by default, and it is not applied by any paint method
+            assert fp.getvalue() == iro.paint() == str(iro)
+
+    class TestImport:
+        # sum of `python -X importtime` of iro modules, in microseconds
+        IMPORT_TIME_BUDGET = 50000
+
+        @staticmethod
+        def run(code):
+            source = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+            env = dict(os.environ, PYTHONPATH=source)
+            return subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env, capture_output=True,
+                                  text=True, check=True)
+
+        def test_no_side_effect(self):
+            result = self.run("import locale, sys\n"
+                              "before, modules = locale.setlocale(locale.LC_ALL), set(sys.modules)\n"
+                              "import iro\n"
+                              "iro.Iro(iro.FGColor.RED, 'red').str\n"
+                              "print(locale.setlocale(locale.LC_ALL) == before)\n"
+                              "print(' '.join(sorted(set(sys.modules) - modules)))")
+            same_locale, imported = result.stdout.splitlines()
+            assert same_locale == "True"
+            assert "typing" not in imported.split()
+
+        def test_import_time(self):
+            result = self.run("from iro import Iro, FGColor, Style")
+            total = 0
+            for line in result.stderr.splitlines():
+                _, cumulative, name = line.split("|")
+                if name == " iro" or name.startswith(" iro."):  # top level imports only
+                    total += int(cumulative)
+            assert 0 < total < self.IMPORT_TIME_BUDGET
+
+    class TestPaintMany:
+        rows = [
+            ["plain", " text"],
+            [FGColor.RED, "red", [Style.BOLD, "bold", " red"], " red"],
+            [Style.RESET, [BGColor.BLUE, "blue"], ColorRGB(10, 20, 30), [Color256(100)]],
+            ["nested", Iro(Style.UNDERLINE, "underline", [FGColor.GREEN, "green"])],
+            [],
+        ]
+
+        @pytest.mark.parametrize("profile", list(Profile))
+        @pytest.mark.parametrize("options", [{}, {"sep": ", "}, {"sep": Iro(FGColor.BLUE, "|")},
+                                             {"coalesce": True, "minimize": True}])
+        def test_same_as_iro(self, profile, options):
+            expected = [Iro(*row, **options).paint(profile=profile) for row in self.rows]
+            assert list(Iro.iter_paint_many(self.rows, profile=profile, **options)) == expected
+            assert Iro.paint_many(self.rows, profile=profile, **options) == "\n".join(expected)
+
+        @pytest.mark.parametrize("profile", list(Profile))
+        def test_column_styles(self, profile):
+            column_styles = [[FGColor.RED], [Style.BOLD, BGColor.BLUE], []]
+            rows = [("1", "init", "S", "extra"), ("2", "sh"), ("3", ["la", "st"], "R")]
+            expected = [Iro(*[[*styles, value] for styles, value in zip(column_styles, row)],
+                            *row[len(column_styles):], sep=" ").paint(profile=profile) for row in rows]
+            assert Iro.paint_many(rows, row_sep="", sep=" ", column_styles=column_styles,
+                                  profile=profile) == "".join(expected)
+
+        def test_iro_rows(self):
+            row = Iro(FGColor.RED, "red", coalesce=True)
+            assert Iro.paint_many([row, ["text"]]) == row.str + "\n" + Iro("text").str
+
+    class TestLogging:
+        @staticmethod
+        def record(level=logging.WARNING, msg="hello %s", args=("world",)):
+            return logging.LogRecord("app", level, __file__, 1, msg, args, None)
+
+        @pytest.mark.parametrize("fmt, style", [("%(levelname)-8s %(name)s: %(message)s %%", "%"),
+                                                ("{levelname:<8} {name}: {message} %", "{"),
+                                                ("${levelname} ${name}: $message %", "$")])
+        def test_same_as_iro(self, fmt, style):
+            formatter = IroFormatter(fmt, style=style, field_styles={"name": [Style.UNDERLINE]})
+            record = self.record()
+            plain = logging.Formatter(fmt, style=style).format(record)
+            levelname, rest = plain.split(" app: ")
+            assert formatter.format(record) == Iro([FGColor.YELLOW, levelname], " ", [Style.UNDERLINE, "app"],
+                                                   ": " + rest).str
+
+        @pytest.mark.parametrize("fmt, style", [("%(missing)s", "%"), ("{missing}", "{"), ("${missing}", "$")])
+        def test_missing_field(self, fmt, style):
+            with pytest.raises(ValueError) as expected:
+                logging.Formatter(fmt, style=style).format(self.record())
+            with pytest.raises(ValueError) as raised:
+                IroFormatter(fmt, style=style).format(self.record())
+            assert str(raised.value) == str(expected.value)
+
+        def test_escaped_percent(self):
+            fmt = "100%%(levelname)s %%%(levelname)s %(message)s"
+            record = self.record()
+            plain = logging.Formatter(fmt).format(record)
+            assert plain == "100%(levelname)s %WARNING hello world"
+            assert IroFormatter(fmt, profile=Profile.NONE).format(record) == plain
+            assert IroFormatter(fmt).format(record) == Iro("100%(levelname)s %", [FGColor.YELLOW, "WARNING"],
+                                                           " hello world").str
+
+        def test_level_styles(self):
+            formatter = IroFormatter("%(levelname)s", level_styles={logging.INFO: [FGColor.GREEN],
+                                                                    logging.ERROR: [FGColor.RED]})
+            assert formatter.format(self.record(logging.ERROR)) == Iro(FGColor.RED, "ERROR").str
+            # closest lower level
+            assert formatter.format(self.record(25)) == Iro(FGColor.GREEN, "Level 25").str
+            assert formatter.format(self.record(logging.DEBUG)) == Iro("DEBUG").str
+
+        def test_profile(self):
+            formatter = IroFormatter("%(levelname)s:%(message)s", profile=Profile.NONE)
+            assert formatter.format(self.record()) == "WARNING:hello world"
+
+        def test_queue_handler(self):
+            threads = []
+
+            class Formatter(IroFormatter):
+                def formatMessage(self, record):
+                    threads.append(threading.current_thread())
+                    return super().formatMessage(record)
+
+            stream = io.StringIO()
+            handler = logging.StreamHandler(stream)
+            handler.setFormatter(Formatter("%(levelname)s:%(message)s"))
+            records = queue.Queue()
+            listener = logging.handlers.QueueListener(records, handler)
+            logger = logging.getLogger("test_queue_handler")
+            logger.addHandler(IroQueueHandler(records))
+            logger.propagate = False
+            listener.start()
+            try:
+                values = ["first"]
+                logger.error("%s", values)
+                values.append("second")  # merged into the message at the call site
+            finally:
+                listener.stop()
+            assert stream.getvalue() == Iro([FGColor.RED, "ERROR"], ":['first']").str + "\n"
+            assert threads and threading.current_thread() not in threads
+
+    class TestAnsi:
+        def test_parse_painted(self):
+            painted = Iro(FGColor.RED, "red ", [Style.BOLD, BGColor.BLUE, "bold"], " red").str
+            red = StyleState().copy_with(FGColor.RED)
+            bold = red.copy_with(Style.BOLD).copy_with(BGColor.BLUE)
+            assert parse_ansi(painted) == [("red ", red), ("bold", bold), (" red", red)]
+            assert parse_ansi("\033[1mbold\033[0m", red) == [("bold", red.copy_with(Style.BOLD))]
+
+        def test_fonts(self):
+            for number in range(11):
+                font = Font(number)
+                painted = Iro("a", [font, "b"], "c").str
+                assert parse_ansi(painted) == [("a", StyleState()), ("b", StyleState().copy_with(font)),
+                                               ("c", StyleState())]
+                assert Iro.from_ansi(painted).str == painted
+            # `Style.GOTHIC` is painted same as `Font(10)`
+            assert parse_ansi(Iro(Style.GOTHIC, "g").str) == [("g", StyleState().copy_with(Font(10)))]
+
+        def test_colors(self):
+            runs = parse_ansi("\033[38;5;100;48;2;1;2;3mc\033[39;49mp")
+            fg, bg = runs[0][1].FG_COLOR, runs[0][1].BG_COLOR
+            assert (fg.color, fg.bg) == (100, False)
+            assert (bg.r, bg.g, bg.b, bg.bg) == (1, 2, 3, True)
+            assert runs[1] == ("p", StyleState())
+
+        def test_other_sequences(self):
+            # cursor movement, hyperlinks and character sets are removed
+            text = "\033[2K\033]8;;https://example.com\033\\link\033]8;;\a\033(B \033[4:3mx\033[1mb"
+            assert parse_ansi(text) == [("link x", StyleState()), ("b", StyleState().copy_with(Style.BOLD))]
+
+        def test_join_same_styles(self):
+            assert parse_ansi("a\033[1m\033[22mb\033[31mc\033[31md") == [
+                ("ab", StyleState()), ("cd", StyleState().copy_with(FGColor.RED))]
+
+        def test_from_ansi(self):
+            blue_and = Iro(FGColor.BLUE, Style.UNDERLINE, " and ")
+            assert Iro(FGColor.RED, "red", Iro.from_ansi(blue_and.str), "red").str == \
+                   Iro(FGColor.RED, "red", blue_and, "red").str
+            assert Iro.from_ansi(blue_and.str, sep="-").sep == "-"
+
+        def test_to_elements(self):
+            state = StyleState()
+            for style in (Style.BOLD, Style.DIM, Style.ITALIC, Style.RAPID_BLINK, Style.GOTHIC, FGColor.RED,
+                          ColorRGB(1, 2, 3, bg=True)):
+                state = state.copy_with(style)
+            result = StyleState()
+            for element in state.to_elements():
+                result = result.copy_with(element)
+            assert result == state
+            assert StyleState().to_elements() == ()
+
+    class TestLayout:
+        red = StyleState().copy_with(FGColor.RED)
+        bold = StyleState().copy_with(Style.BOLD)
+
+        def test_segments(self):
+            iro = Iro(Style.RESET, FGColor.RED, "a", ["b", Iro(Style.BOLD, "c", "", "d", sep=Iro(FGColor.BLUE, "+"))],
+                      [FGColor.GREEN, "e"], sep=" ")
+            segments = StyledText(iro.iter_segments())
+            assert segments == StyledText.from_ansi(iro.str)
+            assert segments.plain == iro.paint(profile=Profile.NONE)
+
+        def test_sequential_style_after_child(self):
+            iro = Iro("a", [["x"], FGColor.RED], "b", collect_styles_first=False)
+            assert iro.str == "ax\033[31m\033[0mb\033[0m"
+            assert StyledText(iro.iter_segments()) == StyledText([("axb", StyleState())])
+
+        def test_reset_first(self):
+            assert Iro(Style.RESET, FGColor.RED, "a").str == "\033[0m\033[31ma\033[0m"
+            assert Iro(Style.RESET, FGColor.RED, "a").paint(StyleState().copy_with(Style.BOLD)) == \
+                   "\033[0m\033[31ma\033[0m"
+            assert Iro.paint_many([[Style.RESET, FGColor.RED, "a"]]) == "\033[0m\033[31ma\033[0m"
+
+        def test_width(self):
+            assert display_width("abc") == 3
+            assert display_width("あいう!") == 7
+            assert StyledText([("あ", self.red), ("b", self.bold)]).width == 3
+
+        def test_zero_width(self):
+            assert display_width("e\u0301") == 1
+            assert display_width("a\u200b") == 1
+            assert display_width("\u20dd") == 0
+            text = StyledText([("cafe\u0301", self.red), ("!!", self.bold)])
+            assert text.width == 7 - 1
+            assert text.truncate(5) == StyledText([("cafe\u0301", self.red), ("…", self.bold)])
+            assert text.ljust(8).plain == "cafe\u0301!!  "
+            assert text.center(8).plain == " cafe\u0301!! "
+            assert [line.plain for line in StyledText([("e\u0301e\u0301 e\u0301", self.red)]).wrap(2)] == \
+                   ["e\u0301e\u0301", "e\u0301"]
+
+        def test_width_cache(self):
+            assert display_width("あ" * 100) == 200
+            # long texts are not kept alive by the cache
+            text = "あ" * 10000
+            size = layout_module._measure_cached.cache_info().currsize
+            assert display_width(text) == 20000
+            assert layout_module._measure_cached.cache_info().currsize == size
+
+        def test_truncate(self):
+            text = StyledText([("abc", self.red), ("あいう", self.bold)])
+            assert text.truncate(9) is text
+            assert text.truncate(6) == StyledText([("abc", self.red), ("あ…", self.bold)])
+            assert text.truncate(5) == StyledText([("abc", self.red), ("…", self.bold)])
+            assert text.truncate(3) == StyledText([("ab…", self.red)])
+            assert text.truncate(0) == StyledText()
+
+        def test_pad(self):
+            text = StyledText([("ab", self.red)])
+            assert text.ljust(5) == StyledText([("ab", self.red), ("   ", StyleState())])
+            assert text.rjust(5, "-") == StyledText([("---", StyleState()), ("ab", self.red)])
+            for width in range(2, 9):
+                for plain in ["a", "ab"]:
+                    assert StyledText([(plain, self.red)]).center(width).plain == plain.center(width)
+            assert text.ljust(1) is text
+            for fillchar in ["", "ab"]:
+                with pytest.raises(TypeError):
+                    text.ljust(5, fillchar)
+            with pytest.raises(TypeError):
+                text.center(5, 1)
+            with pytest.raises(ValueError):
+                text.rjust(5, "\u200b")
+
+        def test_wrap(self):
+            text = StyledText([("  hello wor", self.red), ("ld, wrapped\nあいうえ", self.bold)])
+            assert [line.plain for line in text.wrap(7)] == ["  hello", "world,", "wrapped", "あいう", "え"]
+            assert text.wrap(7)[1] == StyledText([("wor", self.red), ("ld,", self.bold)])
+            assert [line.plain for line in StyledText([("abcdefg", self.red)]).wrap(3)] == ["abc", "def", "g"]
+            assert [line.plain for line in StyledText([("あ", self.red)]).wrap(1)] == ["あ"]
+            assert StyledText().wrap(3) == [StyledText()]
+            with pytest.raises(ValueError):
+                text.wrap(0)
+
+        def test_paint(self):
+            text = StyledText([("a", self.red), ("b", StyleState()), ("c", self.bold)])
+            assert text.paint() == "\033[31ma\033[0mb\033[1mc\033[0m"
+            assert text.paint(profile=Profile.NONE) == "abc"
+            assert StyledText([("x", StyleState().copy_with(ColorRGB(255, 0, 0)))]).paint(profile=Profile.COLOR16) == \
+                   "\033[91mx\033[0m"
+            assert Iro(FGColor.BLUE, "<", text.to_iro(), ">").str == \
+                   Iro(FGColor.BLUE, "<", [FGColor.RED, "a"], "b", [Style.BOLD, "c"], ">").str
+
+    class TestGradient:
+        def test_gradient(self):
+            assert gradient("abc", "#ff0000", (0, 0, 255)).str == \
+                   "\033[38;2;255;0;0ma\033[38;2;128;0;128mb\033[38;2;0;0;255mc\033[0m"
+            # lines share the colors of each column
+            assert gradient("ab\nc", ColorRGB(0, 0, 0), "#ffffff", bg=True).str == \
+                   "\033[48;2;0;0;0ma\033[48;2;255;255;255mb\033[0m\n\033[48;2;0;0;0mc\033[0m"
+            assert gradient("", "#ffffff").str == Iro().str
+            with pytest.raises(ValueError):
+                gradient("abc")
+
+        def test_runs(self):
+            # adjacent characters of the same color are painted as one text
+            assert gradient("abcdef", "#000000", "#000001", "#000000").str == \
+                   "\033[38;2;0;0;0mab\033[38;2;0;0;1mcd\033[38;2;0;0;0mef\033[0m"
+            painted = gradient("#" * 100, "#ff0000", "#ff0808", profile=Profile.COLOR256).paint(
+                profile=Profile.COLOR256)
+            assert painted == f"{Color256(9).open}{'#' * 100}{Style.RESET.open}"
+
+        @pytest.mark.parametrize("profile", list(Profile))
+        def test_profile(self, profile):
+            text = "gradient\ntext"
+            expected = Iro(*([ColorRGB(*color), char] for color, char in
+                             zip([(0, 0, 0), (36, 36, 36), (73, 73, 73), (109, 109, 109), (146, 146, 146),
+                                  (182, 182, 182), (219, 219, 219), (255, 255, 255)] * 2,
+                                 "gradient" + "text")))
+            painted = gradient(text, "#000000", "#ffffff", profile=profile).paint(profile=profile)
+            assert StyledText.from_ansi(painted).plain == text
+            assert [(char, repr(state)) for segment, state in StyledText.from_ansi(painted).segments
+                    for char in segment if char != "\n"] == \
+                   [(char, repr(state)) for segment, state in
+                    StyledText.from_ansi(expected.paint(profile=profile)).segments for char in segment]
+
+        def test_colormap(self):
+            assert colormap([[0, 5, 10], [20]], "#000000", "#ffffff", vmax=10, cell="x", bg=False).str == \
+                   "\033[38;2;0;0;0mx\033[38;2;128;128;128mx\033[38;2;255;255;255mx\033[0m\n" \
+                   "\033[38;2;255;255;255mx\033[0m"
+            assert colormap([[1, 1]], "#ff0000").str == "\033[48;2;255;0;0m    \033[0m"
+
+        def test_numpy(self, monkeypatch):
+            pytest.importorskip("numpy")
+            positions = [i / 4999 for i in range(5000)]
+            stops = [(0, 0, 0), (255, 128, 3), (10, 200, 255)]
+            with_numpy = gradient_module._interpolate(stops, positions)
+            monkeypatch.setattr(gradient_module, "_numpy", False)
+            assert gradient_module._interpolate(stops, positions) == with_numpy
+
+    class TestHtml:
+        def test_one_class_per_style(self):
+            html = to_html(Iro(FGColor.RED, "a<b", [Style.BOLD, "c"], "d", [Style.BOLD, "e"], [ColorRGB(1, 2, 3), "f"]))
+            assert html == ('<pre class="iro"><style>.iro-1{color:#800000}</style><span class="iro-1">a&lt;b</span>'
+                            '<style>.iro-2{color:#800000;font-weight:bold}</style><span class="iro-2">c</span>'
+                            '<span class="iro-1">d</span><span class="iro-2">e</span>'
+                            '<style>.iro-3{color:#010203}</style><span class="iro-3">f</span></pre>')
+            assert to_html(Iro("plain & text")) == '<pre class="iro">plain &amp; text</pre>'
+
+        def test_ansi(self):
+            fp = io.StringIO()
+            with HtmlWriter(fp, class_prefix="log") as writer:
+                writer.write("\033[31mred")
+                writer.write(" still red\033[0m plain ")
+                writer.write(Iro(FGColor.RED, "iro"))
+            assert fp.getvalue() == ('<pre class="log"><style>.log-1{color:#800000}</style>'
+                                     '<span class="log-1">red still red</span> plain <span class="log-1">iro</span>'
+                                     '</pre>')
+            with pytest.raises(ValueError):
+                writer.write("closed")
+
+        @pytest.mark.parametrize("class_prefix", ["", "1st", 'x"><script>', "a b", "a{}", None])
+        def test_invalid_class_prefix(self, class_prefix):
+            with pytest.raises(ValueError):
+                HtmlWriter(io.StringIO(), class_prefix=class_prefix)
+
+        def test_declarations(self):
+            html = to_html(Iro([Style.INVERT, "a"], [Style.DOUBLY_UNDERLINE, Style.SLOW_BLINK, "b"]))
+            assert ".iro-1{color:Canvas;background-color:CanvasText}" in html
+            assert ".iro-2{text-decoration:underline;text-decoration-style:double;animation:iro-blink 1s" in html
+            assert html.count("@keyframes") == 1
+
+        def test_dim(self):
+            html = to_html(Iro(BGColor.BLUE, [Style.DIM, "a", [FGColor.RED, "b"]], [Style.BOLD, Style.DIM, "c"]))
+            assert ".iro-1{color:color-mix(in srgb,currentColor 50%,transparent);background-color:#000080}" in html
+            assert ".iro-2{color:color-mix(in srgb,#800000 50%,transparent);background-color:#000080}" in html
+            assert "background-color:#000080;font-weight:bold}" in html
+            assert "opacity" not in html
+
+        def test_streaming(self):
+            class Output(io.StringIO):
+                def __init__(self):
+                    super().__init__()
+                    self.chunks = []
+
+                def write(self, text):
+                    self.chunks.append(text)
+                    return super().write(text)
+
+            fp = Output()
+            with HtmlWriter(fp, buffer_size=64) as writer:
+                written = writer.write(Iro(*([FGColor.RED, "x" * 10], [FGColor.BLUE, "y" * 10]) * 100))
+            html = fp.getvalue()
+            assert written + len("</span></pre>") == len(html)
+            assert len(fp.chunks) > 10 and max(map(len, fp.chunks)) < 64 + 100
+            assert html.count("<style>") == 2
+
+    class TestLive:
+        @staticmethod
+        def live(**options):
+            fp = io.StringIO()
+            options = dict(dict(max_fps=0, profile=Profile.TRUECOLOR, interactive=True, hide_cursor=False), **options)
+            return fp, Live(fp, **options)
+
+        def test_changed_cells_only(self):
+            fp, live = self.live()
+            live.update(Iro(FGColor.RED, "abc\ndef"))
+            # style is reset before newline, since the new line may be filled with the background color
+            assert fp.getvalue() == "\033[31mabc\033[0m\r\n\033[31mdef"
+
+            for content, written in [(Iro(FGColor.RED, "abc\ndef"), ""),
+                                     (Iro(FGColor.RED, "abc\nd", [Style.BOLD, "X"], "f"), "\033[2G\033[1mX"),
+                                     (Iro(FGColor.RED, "a\nd", [Style.BOLD, "X"], "f"), "\033[1A\033[2G\033[0m\033[K"),
+                                     (Iro("a\nd", [Style.BOLD, "X"], "f"), "\ra\033[1B\rd\033[1mX\033[0mf"),
+                                     (Iro("あ"), "\033[1A\rあ\033[1B\r\033[K")]:
+                fp.seek(0)
+                fp.truncate()
+                live.update(content)
+                assert fp.getvalue() == written
+
+            fp.seek(0)
+            fp.truncate()
+            live.close()
+            assert fp.getvalue() == "\r\n"
+
+        def test_unused(self):
+            fp, live = self.live(hide_cursor=True)
+            with live:
+                pass
+            assert fp.getvalue() == ""
+
+        def test_combining_marks(self):
+            fp, live = self.live()
+            live.update("cafe\u0301!")
+            fp.seek(0)
+            fp.truncate()
+            live.update("cafe\u0301?")
+            # the mark is kept in the cell of `e`, so `?` is at the 5th column
+            assert fp.getvalue() == "\033[5G?"
+
+        def test_new_lines(self):
+            fp, live = self.live(hide_cursor=True)
+            live.update("a")
+            live.update("a\nb\nc")
+            live.close()
+            assert fp.getvalue() == "\033[?25la\r\nb\r\nc\r\n\033[?25h"
+
+        def test_max_fps(self):
+            now = [0.0]
+            fp, live = self.live(max_fps=10, clock=lambda: now[0])
+            assert live.update("1")
+            assert not live.update("2")
+            assert not live.update("3")
+            assert not live.refresh()
+            now[0] = 0.1
+            assert live.refresh()
+            assert not live.refresh()
+            assert fp.getvalue() == "1\r3"
+
+        def test_not_interactive(self):
+            fp, live = self.live(interactive=False, profile=Profile.NONE)
+            with live:
+                for i in range(3):
+                    live.update(Iro(FGColor.RED, str(i)))
+            assert fp.getvalue() == "2\n"  # no cursor movement
+
+    class TestStats:
+        def test_counters(self):
+            renders = []
+            stats = enable_stats(renders.append)
+            try:
+                inner = Iro(Style.BOLD, "b")
+                outer = Iro(FGColor.RED, "a", inner, "c")
+                painted = outer.str
+                assert "".join(outer.iter_paint()) == painted
+            finally:
+                disable_stats()
+
+            first, second = renders
+            assert first.renders == 1
+            assert first.nodes == 2
+            assert first.cache_misses == 2 and first.cache_hits == 0
+            assert first.copy_with_calls == 2 and first.diff_sequence_calls == 3
+            assert first.escape_chars + first.text_chars == len(painted)
+            assert first.text_chars == len("abc")
+            # painted from the cache of `outer`
+            assert second.cache_hits == 1 and second.copy_with_calls == 0
+
+            assert stats.renders == 2
+            assert stats.cache_hit_rate == pytest.approx(1 / 3)
+            assert stats.as_dict()["escape_chars"] == 2 * first.escape_chars
+
+        def test_stopped_early(self):
+            renders = []
+            enable_stats(renders.append)
+            try:
+                pieces = Iro(FGColor.RED, "a", Iro(Style.BOLD, "b")).iter_paint()
+                first = next(pieces)
+                pieces.close()
+                for _ in Iro(Style.BOLD, "c").iter_segments():
+                    break
+            finally:
+                disable_stats()
+            assert len(renders) == 2
+            assert renders[0].escape_chars + renders[0].text_chars == len(first)
+
+        def test_other_entry_points(self):
+            renders = []
+            enable_stats(renders.append)
+            try:
+                iro = Iro(FGColor.RED, "abc")
+                painted = iro.str
+                buffer = bytearray(b"head")
+                assert iro.paint_into(buffer, encoding="utf-16") == len(buffer) - 4
+                segments = list(Iro(Style.BOLD, "de").iter_segments())
+                html = io.StringIO()
+                with HtmlWriter(html) as writer:
+                    writer.write(Iro("fg"))
+            finally:
+                disable_stats()
+
+            _, into, segment, written = renders
+            assert (into.escape_chars, into.text_chars) == (len(painted) - 3, 3)
+            assert segment.text_chars == 2 and segment.escape_chars == 0 and segments
+            assert written.text_chars == 2
+
+        def test_disabled(self):
+            paint = Iro.paint
+            copy_with = StyleState.copy_with
+            stats = enable_stats()
+            assert stats_enabled() and Iro.paint is not paint
+            assert disable_stats() is stats
+            assert not stats_enabled()
+            assert Iro.paint is paint and StyleState.copy_with is copy_with
+
+            Iro(FGColor.RED, "red").str
+            assert stats.renders == 0
+
+    class TestBenchmark:
+        def test_quick(self, tmp_path):
+            root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            saved = tmp_path / "baseline.json"
+            subprocess.run([sys.executable, os.path.join(root, "benchmarks", "bench.py"), "--quick", "--save",
+                            str(saved), "flat", "diff"], capture_output=True, check=True)
+            result = subprocess.run([sys.executable, os.path.join(root, "benchmarks", "bench.py"), "--quick",
+                                     "--compare", str(saved), "flat"], capture_output=True, text=True, check=True)
+            assert "flat" in result.stdout and "vs base" in result.stdout
+
+            results = json.loads(saved.read_text())["results"]
+            assert set(results) == {"flat", "diff_sequence"}
+            assert results["flat"]["nodes"] > 0 and results["flat"]["peak_bytes"] > 0